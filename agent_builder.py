@@ -0,0 +1,983 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import tomllib
+import argparse
+import functools
+import importlib
+import threading
+from langgraph.graph import MessagesState, StateGraph, START, END
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from ollama_client import OPTION_NAMES, get_model, add_observer, remove_observer, set_residency_manager, set_scheduler
+from long_term_memory import LongTermMemory, memory_prompt
+from semantic_cache import SemanticCache, EMBEDDING_MODEL, SIMILARITY_THRESHOLD
+from response_cache import ResponseCache, CachedLLM
+from residency import ResidencyManager, current_session
+from memory import ConversationMemory
+from router import QueryRouter, CategoryRouter, CATEGORIES, normalize_label
+from specialists import SpecialistRegistry, TrafficShifter, TOOLS
+from constrained import label_model, parse_label, label_stats
+from reasoning import is_reasoning_model, find_label, stream_label, astream_label, strip_reasoning, token_savings
+from quality_gate import QualityGate
+from chat_history_store import ChatHistoryStore
+from streaming import generate, agenerate, report_revision, stream_turn
+from prompts import system_prompt, stable_message
+from scheduler import RequestScheduler, prioritized
+from speculative import Speculator, BOTH, LIKELY
+from tool_calling import tool, ToolExecutor
+from glossary import Glossary
+from tracing import get_tracer
+
+# Agents described by a TOML config instead of a copy of the script.
+#
+# A config lists the graph's nodes (classify / answer / check), the model and
+# Ollama options of each node (num_ctx, num_predict, keep_alive, temperature,
+# ...), their prompts and the edges between them; build_agent() turns it into
+# the StateGraph. Tuning a context size or a token limit is an edit to a config,
+# not another fork of the script. A config can `extends` another one and only
+# override what differs, and --ab runs the same queries through two configs
+# side by side (latency percentiles, model calls and tokens per turn). With a
+# [memory] table the answer nodes also get the most similar past exchanges of
+# the history store (long_term_memory.py) along with the question. Classifiers
+# answer through a JSON schema that only admits the category labels
+# (constrained.py); with `constrained = false` they write free text, and
+# reasoning models (deepseek-r1) then classify through a stream that stops at
+# the label. Their <think> blocks never reach the response or the history
+# (reasoning.py); `reasoning = false` on a node turns that off.
+#
+# Beyond code / natural_language, a config can list [categories.<name>]
+# specialists (specialists.py): a "specialists" node then becomes one answer
+# node per category, the classifier's conditional edges go to them, and each
+# category's traffic shifts to its cheapest model of equal quality.
+#
+# More node kinds: a semantic_cache node answers near-duplicates of earlier
+# first questions (semantic_cache.py), a tools node offers the model native
+# tool calls (tool_calling.py; the tools of specialists.py, and slang_checker
+# with a [glossary]), and a speculate node runs a classify and an answer node
+# together, the branches racing the classifier (speculative.py). Edges leaving
+# a node are tried in order: the first whose `when` holds is taken, and the
+# turn ends when none does. [runtime] installs the residency manager and the
+# request scheduler for every Ollama request of the process.
+#
+#   python agent_builder.py configs/ollama_agent6.toml              # chat
+#   python agent_builder.py configs/specialists.toml                # SQL / math / translation / ... specialists
+#   python agent_builder.py --ab configs/ollama_agent6.toml configs/ollama_agent6_fast.toml --queries q.jsonl
+
+FOLDER_NAME = "IA_assistant_history"
+CONFIG_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configs")
+AB_RESULTS_PATH = os.path.join(FOLDER_NAME, "ab_results.jsonl")
+
+MODEL_SETTINGS = OPTION_NAMES + ("keep_alive",)      # Per-node keys that go to get_model()
+TOP_LEVEL_KEYS = {"name", "description", "path", "stream", "history", "memory", "defaults", "categories", "nodes",
+                  "edges", "runtime", "glossary"}
+HISTORY_KEYS = {"max_tokens", "trim_to", "store"}
+MEMORY_KEYS = {"top_k", "min_score", "nprobe"}          # LongTermMemory settings
+RUNTIME_KEYS = {"residency", "scheduler"}                # ResidencyManager / RequestScheduler for every request
+GLOSSARY_KEYS = {"seed"}                                 # Terms added to the glossary store the first time it is opened
+NODE_KEYS = {
+    "classify": {"kind", "model", "prompt", "router", "constrained", "reasoning"},
+    "answer": {"kind", "model", "prompt", "branches", "history", "cache"},
+    "check": {"kind", "model", "prompt", "request", "history", "reasoning"},
+    "specialists": {"kind", "history"},    # One answer node per [categories] entry
+    "semantic_cache": {"kind", "threshold"},
+    "tools": {"kind", "model", "prompt", "tools", "hint", "history"},
+    "speculate": {"kind", "classify", "answer", "mode"},    # Runs those two nodes as one
+}
+BRANCH_KEYS = {"model", "prompt"}
+CATEGORY_KEYS = {"description", "keywords", "models", "prompt", "tools", "default"}
+PRIORITIES = {"classify": "classify", "answer": "process", "check": "check",    # scheduler priority per node kind
+              "specialists": "process", "semantic_cache": "process", "tools": "tools", "speculate": "process"}
+# Conditional edges: needs_check (the quality gate asks for the checker), unanswered (no node
+# answered yet: a semantic cache miss, or no tool answer), tool_hint (unanswered, and the query
+# matches the hint of the tools node the edge goes to)
+CONDITIONS = ("needs_check", "unanswered", "tool_hint")
+GLOSSARY_TOOLS = ("slang_checker",)     # Tools of a tools node that look terms up in the [glossary]
+ENDPOINTS = {"start": START, "end": END}
+
+# The draft is already the last message of the history: ask about it instead of repeating it
+CHECK_REQUEST = """
+    Check the last assistant response above. Reply with the improved response,
+    or with the same response if it is already fine.
+"""
+
+
+# ---------- config ----------
+
+def config_path(name):
+    """Path of configs/<name>.toml."""
+    return os.path.join(CONFIG_FOLDER, f"{name}.toml")
+
+
+def _merge(base, override):
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value      # Lists (edges) are replaced, not appended to
+    return merged
+
+
+def load_config(path):
+    """Parsed and checked config; the file named by `extends` (relative to this one) is merged in first."""
+    with open(path, "rb") as file:
+        config = tomllib.load(file)
+    name = config.pop("name", os.path.splitext(os.path.basename(path))[0])
+    parent = config.pop("extends", None)
+    if parent is not None:
+        config = _merge(load_config(os.path.join(os.path.dirname(path), parent)), config)
+    config["name"] = name
+    config["path"] = path
+    validate(config)
+    return config
+
+
+def _check_keys(where, table, allowed):
+    unknown = set(table) - set(allowed) - set(MODEL_SETTINGS)
+    if unknown:
+        raise ValueError(f"{where}: unknown key(s) {', '.join(sorted(unknown))}")
+
+
+def validate(config):
+    """Raise ValueError naming the file and table of the first mistake."""
+    path = config.get("path", "<config>")
+    unknown = set(config) - TOP_LEVEL_KEYS
+    if unknown:
+        raise ValueError(f"{path}: unknown key(s) {', '.join(sorted(unknown))}")
+    _check_keys(f"{path}: [history]", config.get("history", {}), HISTORY_KEYS)
+    unknown = set(config.get("memory", {})) - MEMORY_KEYS
+    if unknown:
+        raise ValueError(f"{path}: [memory]: unknown key(s) {', '.join(sorted(unknown))}")
+    if "memory" in config and not config.get("history", {}).get("store"):
+        raise ValueError(f"{path}: [memory] searches the history store, set store = true in [history]")
+    _check_keys(f"{path}: [defaults]", config.get("defaults", {}), ())
+    for table, allowed in (("runtime", RUNTIME_KEYS), ("glossary", GLOSSARY_KEYS)):
+        unknown = set(config.get(table, {})) - allowed
+        if unknown:
+            raise ValueError(f"{path}: [{table}]: unknown key(s) {', '.join(sorted(unknown))}")
+    categories = config.get("categories", {})
+    for category, table in categories.items():
+        where = f"{path}: [categories.{category}]"
+        _check_keys(where, table, CATEGORY_KEYS)
+        if not table.get("models"):
+            raise ValueError(f"{where}: needs models (the candidates, cheapest first)")
+        unknown = set(table.get("tools", [])) - set(TOOLS)
+        if unknown:
+            raise ValueError(f"{where}: unknown tool(s) {', '.join(sorted(unknown))} (tools: {', '.join(TOOLS)})")
+    if sum(bool(table.get("default")) for table in categories.values()) > 1:
+        raise ValueError(f"{path}: only one category can be the default")
+
+    nodes = config.get("nodes", {})
+    for name, node in nodes.items():
+        where = f"{path}: [nodes.{name}]"
+        kind = node.get("kind")
+        if kind not in NODE_KEYS:
+            raise ValueError(f"{where}: kind must be one of {', '.join(NODE_KEYS)}")
+        _check_keys(where, node, NODE_KEYS[kind])
+        branches = node.get("branches", {})
+        for category, branch in branches.items():
+            if category not in CATEGORIES:
+                raise ValueError(f"{where}: unknown branch {category!r} (categories: {', '.join(CATEGORIES)})")
+            _check_keys(f"{where}.branches.{category}", branch, BRANCH_KEYS)
+        if kind == "specialists":
+            if not categories:
+                raise ValueError(f"{where}: a specialists node needs [categories]")
+            continue
+        if kind == "semantic_cache":
+            continue
+        if kind == "speculate":
+            _validate_speculate(where, node, nodes, categories)
+            continue
+        if kind == "tools":
+            _validate_tools(where, node, config)
+        if "model" not in node and not (kind == "answer" and set(branches) == set(CATEGORIES)):
+            raise ValueError(f"{where}: needs a model" + (" (or a branch per category)" if kind == "answer" else ""))
+
+    for number, edge in enumerate(config.get("edges", []), start=1):
+        where = f"{path}: edge {number}"
+        for end in ("from", "to"):
+            if edge.get(end) not in nodes and edge.get(end) not in ENDPOINTS:
+                raise ValueError(f"{where}: {end} = {edge.get(end)!r} is not a node")
+        if edge.get("when") not in (None,) + CONDITIONS:
+            raise ValueError(f"{where}: when must be one of {', '.join(CONDITIONS)}")
+        if edge.get("when") == "tool_hint" and not nodes[edge["to"]].get("hint"):
+            raise ValueError(f"{where}: tool_hint needs a tools node with a hint as `to`")
+        if edge.get("when") in ("unanswered", "tool_hint") and \
+                nodes.get(edge["from"], {}).get("kind") not in ("semantic_cache", "tools"):
+            raise ValueError(f"{where}: {edge['when']} edges leave a semantic_cache or tools node")
+
+
+def _validate_speculate(where, node, nodes, categories):
+    classify, answer = nodes.get(node.get("classify"), {}), nodes.get(node.get("answer"), {})
+    if classify.get("kind") != "classify" or answer.get("kind") != "answer":
+        raise ValueError(f"{where}: classify and answer must name a classify and an answer node")
+    if categories or not classify.get("router"):
+        raise ValueError(f"{where}: speculation needs the router (router = true) and no [categories]")
+    if node.get("mode", BOTH) not in (BOTH, LIKELY):
+        raise ValueError(f"{where}: mode must be {BOTH} or {LIKELY}")
+
+
+def _validate_tools(where, node, config):
+    if not node.get("tools"):
+        raise ValueError(f"{where}: needs tools")
+    unknown = set(node["tools"]) - set(TOOLS) - set(GLOSSARY_TOOLS)
+    if unknown:
+        raise ValueError(f"{where}: unknown tool(s) {', '.join(sorted(unknown))} "
+                         f"(tools: {', '.join(list(TOOLS) + list(GLOSSARY_TOOLS))})")
+    if set(node["tools"]) & set(GLOSSARY_TOOLS) and "glossary" not in config:
+        raise ValueError(f"{where}: {', '.join(GLOSSARY_TOOLS)} look terms up in the [glossary], add the table")
+    try:
+        re.compile(node.get("hint", ""))
+    except re.error as error:
+        raise ValueError(f"{where}: hint is not a valid regular expression ({error})")
+
+
+def node_model(config, node, category=None):
+    """Shared model handle of a node (or of one of its branches): [defaults] < node < branch settings."""
+    table = config["nodes"][node]
+    branch = table.get("branches", {}).get(category, {})
+    settings = {}
+    for layer in (config.get("defaults", {}), table, branch):
+        settings.update((key, value) for key, value in layer.items() if key in MODEL_SETTINGS)
+    return get_model(branch.get("model", table.get("model")), **settings)
+
+
+def node_prompt(config, node, category=None):
+    """System message of a node (or branch), or None when the config gives no prompt."""
+    table = config["nodes"][node]
+    text = table.get("branches", {}).get(category, {}).get("prompt", table.get("prompt"))
+    return system_prompt(text) if text else None
+
+
+# ---------- agent ----------
+
+class State(MessagesState):
+    query: str
+    category: str = None
+    response: str = None
+    model: str = None      # Specialist model that wrote the response
+    history: list = []     # Chat history
+    query_vector: object = None  # Query embedding (semantic cache, long-term memory)
+    cacheable: bool = False      # Asked without earlier history: the semantic cache may answer and keep it
+
+
+class ConfiguredAgent:
+    """
+    The graph of one config plus what assistant_server / batch_runner expect
+    from an agent module: builder, graph, new_state(), record_turn(), shutdown().
+    Building it only wires the graph: the history store, long-term memory and the
+    caches and glossary open their files on first use.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.__name__ = config["name"]
+        history = config.get("history", {})
+        self.history_tokens = history.get("max_tokens", 0)       # 0: every turn starts without history
+        self.trim_to = history.get("trim_to", 1.0)
+        self.embedder = get_model(EMBEDDING_MODEL)
+        self._open = {}                 # store / memory, once a turn needed them
+        self._open_lock = threading.RLock()
+        self.router = None
+        self.registry = self.shifter = None
+        if "categories" in config:
+            self.registry = SpecialistRegistry(config["categories"], config.get("defaults"), MODEL_SETTINGS)
+            self.shifter = TrafficShifter()
+        self.glossary = Glossary(seed=config["glossary"].get("seed")) if "glossary" in config else None
+        self.response_cache = None
+        if any(node.get("cache") for node in config["nodes"].values()):
+            self.response_cache = ResponseCache()
+        self.semantic_cache = self.speculator = None
+        self.tool_executors = {}        # tools node -> ToolExecutor
+        self.hints = {}                 # tools node -> compiled hint
+        self.residency = self.scheduler = None
+        runtime = config.get("runtime", {})
+        if runtime.get("residency"):
+            # Keep the busy models loaded, pre-warm the next one, batch requests per model
+            self.residency = ResidencyManager()
+            set_residency_manager(self.residency)
+        if runtime.get("scheduler"):
+            # Requests of all sessions queue per model: classification first, checks last
+            self.scheduler = RequestScheduler()
+            set_scheduler(self.scheduler)
+        self.gate = QualityGate()
+        self.tracer = get_tracer()
+
+        if not config.get("edges"):
+            raise ValueError(f"{config.get('path', config['name'])}: no edges")
+        self.builder = StateGraph(State)
+        self.specialist_nodes = {}      # specialists node -> {category: its answer node}
+        self._nodes = {}                # node -> (func, afunc)
+        self._branch_messages = {}      # answer node -> branch_messages(category, state, question)
+        on_edges = {edge[end] for edge in config["edges"] for end in ("from", "to")}
+        # Speculate nodes use the functions of the classify and answer nodes they run, so they are built last
+        for name, node in sorted(config["nodes"].items(), key=lambda item: item[1]["kind"] == "speculate"):
+            if node["kind"] == "specialists":
+                self.specialist_nodes[name] = {category: f"{name}_{category}" for category in self.registry.categories}
+                for category, node_name in self.specialist_nodes[name].items():
+                    self._add_node(node_name, "specialists", *self._specialist_node(name, category))
+                continue
+            self._nodes[name] = getattr(self, f"_{node['kind']}_node")(name)
+            if name in on_edges or node["kind"] == "speculate":
+                self._add_node(name, node["kind"], *self._nodes[name])    # Not the ones only a speculate node runs
+
+        edges_from = {}
+        for edge in config["edges"]:
+            edges_from.setdefault(edge["from"], []).append(edge)
+        for name, edges in edges_from.items():
+            destinations = []
+            for edge in edges:
+                destinations += self.specialist_nodes.get(edge["to"], {None: ENDPOINTS.get(edge["to"], edge["to"])}).values()
+            if all("when" in edge for edge in edges):
+                destinations.append(END)    # No edge taken: the turn ends
+            # Edges out of a specialists node leave from each of its answer nodes
+            for source in self.specialist_nodes.get(name, {None: ENDPOINTS.get(name, name)}).values():
+                if len(edges) == 1 and len(destinations) == 1:
+                    self.builder.add_edge(source, destinations[0])
+                else:
+                    self.builder.add_conditional_edges(source, functools.partial(self._next_node, edges),
+                                                       list(dict.fromkeys(destinations)))
+
+    def _add_node(self, name, kind, func, afunc):
+        priority = PRIORITIES[kind]
+        self.builder.add_node(name, RunnableLambda(self.tracer.node(name, prioritized(priority, func)),
+                                                   afunc=self.tracer.node(name, prioritized(priority, afunc))))
+
+    @functools.cached_property
+    def graph(self):
+        return self.builder.compile()
+
+    @property
+    def store(self):
+        """Chat history store of [history] store = true (opened, and the legacy file migrated, on first use)."""
+        return self._lazy("store", lambda: ChatHistoryStore(FOLDER_NAME)
+                          if self.config.get("history", {}).get("store") else None)
+
+    @property
+    def memory(self):
+        """Long-term memory of [memory], over the store."""
+        if "memory" not in self.config:
+            return None
+        return self._lazy("memory", lambda: LongTermMemory(self.store, self.embedder.embed_many, **self.config["memory"]))
+
+    def _lazy(self, name, create):
+        # Sessions run turns in threads: the first use creates the component exactly once
+        with self._open_lock:
+            if name not in self._open:
+                self._open[name] = create()
+            return self._open[name]
+
+    def _opened(self, name):
+        """store / memory if a turn already opened it, else None (stats and shutdown don't open them)."""
+        return self._open.get(name)
+
+    # ---------- nodes ----------
+
+    def _classify_node(self, name):
+        table = self.config["nodes"][name]
+        model = node_model(self.config, name)
+        labels = self.registry.categories if self.registry is not None else CATEGORIES
+        prompt = node_prompt(self.config, name)
+        if prompt is None and self.registry is not None:
+            prompt = self.registry.classifier_prompt()
+
+        def messages(query):
+            print(f"🧠 Using AI Assistant (Classifier): {model.model}")  # Log model used
+            return ([prompt] if prompt else []) + [HumanMessage(content=query)]
+
+        if table.get("constrained", True):
+            model = label_model(model, labels)      # Can only write {"category": <label>}
+
+            def llm_classify(query):
+                return parse_label(model.invoke(messages(query)), labels)
+
+            async def allm_classify(query):
+                return parse_label(await model.ainvoke(messages(query)), labels)
+        elif table.get("reasoning", is_reasoning_model(model.model)):
+            def llm_classify(query):
+                return stream_label(model, messages(query), labels=labels)   # Stops generating at the label
+
+            async def allm_classify(query):
+                return await astream_label(model, messages(query), labels=labels)
+        elif self.registry is not None:
+            def llm_classify(query):
+                return find_label(model.invoke(messages(query)), labels) or self.registry.default
+
+            async def allm_classify(query):
+                return find_label(await model.ainvoke(messages(query)), labels) or self.registry.default
+        else:
+            def llm_classify(query):
+                return model.invoke(messages(query))
+
+            async def allm_classify(query):
+                return await model.ainvoke(messages(query))
+
+        if self.registry is not None:
+            if table.get("router", False):
+                # Category keywords -> classifier LLM (only when no category's keywords win)
+                self.router = CategoryRouter(labels, self.registry.keywords(), llm_classify, allm_classify)
+                route, aroute = self.router.route, self.router.aroute
+            else:
+                route, aroute = llm_classify, allm_classify
+        elif table.get("router", False):
+            # Keywords -> local scorer -> classifier LLM (only below the confidence threshold)
+            self.router = QueryRouter(llm_classify, allm_classify=allm_classify)
+            route, aroute = self.router.route, self.router.aroute
+        else:
+            def route(query):
+                return normalize_label(llm_classify(query))
+
+            async def aroute(query):
+                return normalize_label(await allm_classify(query))
+
+        def classify_query(state: State) -> State:
+            return self._classified(state, route(state["query"]))
+
+        async def aclassify_query(state: State) -> State:
+            return self._classified(state, await aroute(state["query"]))
+
+        return classify_query, aclassify_query
+
+    def _classified(self, state, category, detail=""):
+        state["category"] = category
+        tier = f" (by {self.router.last_tier}{detail})" if self.router is not None else ""
+        print(f"✅ The query has been classified as: {category}{tier}.")  # Log classification result
+        return state
+
+    def _answer_node(self, name):
+        table = self.config["nodes"][name]
+        branches = {category: (node_model(self.config, name, category), node_prompt(self.config, name, category))
+                    for category in table.get("branches", {})}
+        default = (node_model(self.config, name), node_prompt(self.config, name)) if "model" in table else None
+        if table.get("cache"):
+            # Repeated queries are answered from the response cache (deterministic answers only:
+            # a branch that samples, temperature > 0, is never replayed)
+            branches = {category: (CachedLLM(model, self.response_cache), prompt)
+                        for category, (model, prompt) in branches.items()}
+            default = default and (CachedLLM(default[0], self.response_cache), default[1])
+        use_history = table.get("history", False) and self.history_tokens
+
+        def branch_messages(category, state, question):
+            model, prompt = branches.get(category) or default
+            history = list(state["history"]) if use_history else []
+            return model, ([prompt] if prompt else []) + history + [HumanMessage(content=question)]
+
+        self._branch_messages[name] = branch_messages
+
+        def messages(state, question):
+            model, prompt = branch_messages(state.get("category"), state, question)
+            print(f"🛠️ Using Model: {model.model}")
+            return model, prompt
+
+        def answer_query(state: State, config: RunnableConfig) -> State:
+            model, prompt = messages(state, self._question(state))
+            return self._answered(state, generate(model, prompt, config))  # Streams tokens when the turn is streamed
+
+        async def aanswer_query(state: State, config: RunnableConfig) -> State:
+            model, prompt = messages(state, await self._aquestion(state))
+            return self._answered(state, await agenerate(model, prompt, config))
+
+        return answer_query, aanswer_query
+
+    def _specialist_node(self, name, category):
+        specialist = self.registry[category]
+        use_history = self.config["nodes"][name].get("history", False) and self.history_tokens
+
+        def messages(state, question):
+            model = self.shifter.choose(category, specialist.models)
+            print(f"🛠️ Using Model: {model.model} ({category} specialist)")
+            history = list(state["history"]) if use_history else []
+            return model, specialist.messages(history, HumanMessage(content=question))
+
+        def answered(state, model, usage, start, response):
+            state["model"] = model.model
+            state = self._answered(state, response)
+            self.shifter.answered(category, model.model, usage, time.perf_counter() - start, state["response"])
+            return state
+
+        def answer_query(state: State, config: RunnableConfig) -> State:
+            model, prompt = messages(state, self._question(state))
+            start = time.perf_counter()
+            with self.shifter.measure(category, model.model) as usage:
+                response = None
+                if specialist.tools is not None:
+                    prompt, response = specialist.call_tools(model, prompt)    # Answered without tools: done
+                if response is None:
+                    response = generate(model, prompt, config)
+            return answered(state, model, usage, start, strip_reasoning(response))
+
+        async def aanswer_query(state: State, config: RunnableConfig) -> State:
+            model, prompt = messages(state, await self._aquestion(state))
+            start = time.perf_counter()
+            with self.shifter.measure(category, model.model) as usage:
+                response = None
+                if specialist.tools is not None:
+                    prompt, response = await specialist.acall_tools(model, prompt)
+                if response is None:
+                    response = await agenerate(model, prompt, config)
+            return answered(state, model, usage, start, strip_reasoning(response))
+
+        return answer_query, aanswer_query
+
+    def _answered(self, state, response):
+        state["response"] = strip_reasoning(response).strip()    # No <think> block in the history
+        if self.history_tokens:
+            state["history"].append(HumanMessage(content=state["query"]))
+            state["history"].append(AIMessage(content=state["response"]))
+        return state
+
+    def _check_node(self, name):
+        table = self.config["nodes"][name]
+        model = node_model(self.config, name)
+        prompt = node_prompt(self.config, name)
+        request = stable_message(table.get("request", CHECK_REQUEST))
+        use_history = table.get("history", False) and self.history_tokens
+        clean = strip_reasoning if table.get("reasoning", True) else str
+
+        def messages(state):
+            print(f"\n🔍 Using Checker Model: {model.model}")  # Log model used
+            system = [prompt] if prompt else []
+            if use_history:
+                return system + list(state["history"]) + [request]     # The draft is the last message already
+            return system + [HumanMessage(content=state["response"])]
+
+        def checked(state, response, config):
+            response = clean(response).strip()
+            if self.shifter is not None and state.get("model") and " ".join(response.split()) != " ".join(
+                    state["response"].split()):
+                self.shifter.revised(state["category"], state["model"])    # Counts against the specialist's quality
+            # The draft was already shown while streaming: only show the checker's version if it changed
+            report_revision(state["response"], response, config)
+            state["response"] = response
+            return state
+
+        def check_response(state: State, config: RunnableConfig) -> State:
+            prompt_messages = messages(state)
+            with self.gate.timing():
+                response = model.invoke(prompt_messages)
+            return checked(state, response, config)
+
+        async def acheck_response(state: State, config: RunnableConfig) -> State:
+            prompt_messages = messages(state)
+            with self.gate.timing():
+                response = await model.ainvoke(prompt_messages)
+            return checked(state, response, config)
+
+        return check_response, acheck_response
+
+    def _semantic_cache_node(self, name):
+        table = self.config["nodes"][name]
+        self.semantic_cache = cache = SemanticCache(self.embedder.embed,
+                                                    threshold=table.get("threshold", SIMILARITY_THRESHOLD))
+
+        def lookup(state, session):
+            # Follow-ups (the history isn't empty) are never answered from the cache:
+            # they only make sense with their own conversation
+            state["cacheable"] = not state["history"]
+            if not state["cacheable"]:
+                return None, cache.vector(state["query"])    # Still used by long-term memory
+            return cache.lookup(state["query"], session)
+
+        def cached(state, response):
+            state["response"] = response
+            if response is not None:
+                print("♻️ Answered from the semantic cache")
+                state["category"] = "cached"
+                if self.history_tokens:
+                    state["history"].append(HumanMessage(content=state["query"]))
+                    state["history"].append(AIMessage(content=response))
+            return state
+
+        def semantic_lookup(state: State) -> State:
+            response, state["query_vector"] = lookup(state, current_session())
+            return cached(state, response)
+
+        async def asemantic_lookup(state: State) -> State:
+            response, state["query_vector"] = await asyncio.to_thread(lookup, state, current_session())
+            return cached(state, response)
+
+        return semantic_lookup, asemantic_lookup
+
+    def _tools_node(self, name):
+        table = self.config["nodes"][name]
+        model = node_model(self.config, name)
+        prompt = node_prompt(self.config, name)
+        use_history = table.get("history", False) and self.history_tokens
+        executor = self.tool_executors[name] = ToolExecutor(
+            [TOOLS[tool_name] if tool_name in TOOLS else self._glossary_tool() for tool_name in table["tools"]])
+        if table.get("hint"):
+            self.hints[name] = re.compile(table["hint"], re.IGNORECASE)
+
+        def messages(state):
+            print(f"🧰 Offering tools to: {model.model}")
+            history = list(state["history"]) if use_history else []
+            return ([prompt] if prompt else []) + history + [HumanMessage(content=state["query"])]
+
+        def direct(answer, config):
+            # Answered without calling a tool: that answer is the response (None if empty)
+            answer = strip_reasoning(answer or "").strip()
+            on_token = ((config or {}).get("configurable") or {}).get("on_token")
+            if answer and on_token is not None:
+                on_token(answer)
+            return answer or None
+
+        def answered(state, answer):
+            if answer is None:
+                state["response"] = None    # Not the previous turn's: the next edges go by it
+                return state
+            state["category"] = "tools"
+            return self._answered(state, answer)
+
+        # If the model calls tools, run them and stream its follow-up answer; if it
+        # answers right away that answer is kept (no second generation further on)
+        def call_tools(state: State, config: RunnableConfig) -> State:
+            followup, answer = executor.call(model, messages(state))
+            if followup is None:
+                return answered(state, direct(answer, config))
+            return answered(state, generate(model, followup, config))
+
+        async def acall_tools(state: State, config: RunnableConfig) -> State:
+            followup, answer = await executor.acall(model, messages(state))
+            if followup is None:
+                return answered(state, direct(answer, config))
+            return answered(state, await agenerate(model, followup, config))
+
+        return call_tools, acall_tools
+
+    def _glossary_tool(self):
+        glossary = self.glossary
+
+        @tool
+        def slang_checker(term: str) -> str:
+            """Meaning of a slang word or domain term, from the glossary."""
+            found = glossary.find(term)
+            return found[0][1] if found else f"'{term}' is not in the glossary."
+        return slang_checker
+
+    def _speculate_node(self, name):
+        table = self.config["nodes"][name]
+        self.speculator = speculator = Speculator(table.get("mode", BOTH))
+        answer, aanswer = self._nodes[table["answer"]]
+        branch_messages = self._branch_messages[table["answer"]]
+        router = self.router
+
+        def branches(state, question):    # One long-term memory recall for every branch
+            return {category: branch_messages(category, state, question) for category in CATEGORIES}
+
+        def done(state, category, response):
+            self._classified(state, category, f", speculative hit ratio {speculator.stats()['hit_ratio']:.0%}")
+            return self._answered(state, response)
+
+        def speculate_query(state: State, config: RunnableConfig) -> State:
+            query = state["query"]
+            category = router.fast_route(query)
+            if category is not None:    # Keywords or scorer decided: nothing to speculate on
+                return answer(self._classified(state, category), config)
+            on_token = ((config or {}).get("configurable") or {}).get("on_token")
+            category, response = speculator.run(lambda: router.route(query), branches(state, self._question(state)),
+                                                router.prior(query), on_token)
+            return done(state, category, response)
+
+        async def aspeculate_query(state: State, config: RunnableConfig) -> State:
+            query = state["query"]
+            category = router.fast_route(query)
+            if category is not None:
+                return await aanswer(self._classified(state, category), config)
+            on_token = ((config or {}).get("configurable") or {}).get("on_token")
+            category, response = await speculator.arun(lambda: router.aroute(query),
+                                                       branches(state, await self._aquestion(state)),
+                                                       router.prior(query), on_token)
+            return done(state, category, response)
+
+        return speculate_query, aspeculate_query
+
+    def _question(self, state):
+        """The query, after the past exchanges long-term memory recalls for it."""
+        if self.memory is None:
+            return state["query"]
+        vector = state.get("query_vector")
+        if vector is None:
+            vector = self.embedder.embed(state["query"])
+        recent = {message.content for message in state["history"] if message.type == "human"}
+        recalled = self.memory.recall(vector, current_session(), skip=recent)
+        return memory_prompt(state["query"], recalled)
+
+    async def _aquestion(self, state):
+        """_question() off the event loop: embedding the query and reading the index and store block."""
+        if self.memory is None:
+            return state["query"]
+        return await asyncio.to_thread(self._question, state)
+
+    def _to_specialist(self, path, state):
+        return path.get(state["category"]) or path[self.registry.default]
+
+    def _next_node(self, edges, state):
+        """Target of the first of a node's edges whose condition holds (END if none does)."""
+        for edge in edges:
+            if self._holds(edge, state):
+                if edge["to"] in self.specialist_nodes:
+                    return self._to_specialist(self.specialist_nodes[edge["to"]], state)
+                return ENDPOINTS.get(edge["to"], edge["to"])
+        return END
+
+    def _holds(self, edge, state):
+        when = edge.get("when")
+        if when is None:
+            return True
+        if state.get("response") is None:
+            return when == "unanswered" or (when == "tool_hint" and bool(self.hints[edge["to"]].search(state["query"])))
+        if when != "needs_check":
+            return False
+        # Only send the draft to the checker when the cheap local checks fail (or it is sampled)
+        if self.gate.needs_check(state["response"]):
+            print(f"🚦 Checker needed: {', '.join(self.gate.last_problems) or 'random sample'}")
+            return True
+        return False
+
+    # ---------- session ----------
+
+    def new_state(self) -> State:
+        """Fresh conversation state (one per REPL / server session)."""
+        if not self.history_tokens:
+            return State(history=[])
+        return State(history=ConversationMemory(max_tokens=self.history_tokens, trim_to=self.trim_to))
+
+    def record_turn(self, user_input, final_state, session_id=None):
+        """Bookkeeping after a turn: semantic cache, history store (+ long-term memory index)."""
+        if self.semantic_cache is not None and final_state.get("category") != "cached" and final_state.get("cacheable"):
+            # Only answers that didn't depend on earlier turns, for the same session
+            self.semantic_cache.add(user_input, final_state["response"], final_state.get("query_vector"),
+                                    session=session_id if session_id is not None else current_session())
+        if self.store is None:
+            return
+        record = {"user": user_input, "assistant": final_state["response"]}
+        if session_id is not None:
+            record["session"] = session_id
+        turn = self.store.append(record)
+        if self.memory is not None:
+            self.memory.remember(turn, record)  # Embedded and indexed in the background
+
+    def stats(self):
+        stats = {"checker_gate": self.gate.metrics(), "nodes": self.tracer.stats(),
+                 "labels": label_stats.stats(), "reasoning": token_savings.stats()}
+        if self.router is not None:
+            stats["router"] = self.router.stats()
+        if self._opened("memory") is not None:
+            stats["long_term_memory"] = self.memory.stats()
+        if self.shifter is not None:
+            stats["specialists"] = self.shifter.stats()
+        for name, component in self._components().items():
+            stats[name] = component.stats()
+        return stats
+
+    def _components(self):
+        """The optional parts this config uses, by stats name."""
+        components = {"response_cache": self.response_cache, "semantic_cache": self.semantic_cache,
+                      "residency": self.residency, "scheduler": self.scheduler, "glossary": self.glossary,
+                      "speculative": self.speculator}
+        components.update((f"tools/{name}", executor) for name, executor in self.tool_executors.items())
+        return {name: component for name, component in components.items() if component is not None}
+
+    def explain_terms(self, text):
+        """Print the definitions of the [glossary] terms found in text."""
+        if self.glossary is None:
+            return
+        for word, definition in self.glossary.find(text):
+            print(f"\n🛠️Assistant Tool: The word '{word}' means:\n   {definition}\n")
+
+    def print_stats(self):
+        if self.router is not None:
+            print(f"📊 Router decisions: {self.router.stats()}")
+        if any(edge.get("when") == "needs_check" for edge in self.config["edges"]):
+            print(f"📊 Checker gate: {self.gate.metrics()}")
+        if self._opened("memory") is not None:
+            print(f"📊 Long-term memory: {self.memory.stats()}")
+        if token_savings.stats()["label_streams"] or token_savings.stats()["reasoning_tokens_stripped"]:
+            print(f"📊 Reasoning: {token_savings.stats()}")
+        if self.shifter is not None:
+            for category, models in self.shifter.stats().items():
+                print(f"📊 Specialists / {category}: {models}")
+        for name, component in self._components().items():
+            print(f"📊 {name.replace('_', ' ').capitalize()}: {component.stats()}")
+
+    def shutdown(self):
+        if self.semantic_cache is not None:
+            self.semantic_cache.save()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self.glossary is not None:
+            self.glossary.close()
+        for executor in self.tool_executors.values():
+            executor.close()
+        if self.shifter is not None:
+            self.shifter.save()  # Keep the per-model stats for the next run
+            self.registry.close()
+        if self._opened("memory") is not None:
+            self.memory.close()  # Finish indexing before the store closes
+        if self._opened("store") is not None:
+            self.store.close()  # fsync any turns still pending
+        self.tracer.flush()  # Traces are written in the background
+
+
+def build_agent(config):
+    """ConfiguredAgent of a config dict (see load_config)."""
+    return ConfiguredAgent(config)
+
+
+@functools.lru_cache(maxsize=None)
+def load_agent(path):
+    """The agent of a config file, built once per process."""
+    return build_agent(load_config(path))
+
+
+def import_agent(name):
+    """The agent of a config file (*.toml) or an agent module such as pruebaollama7."""
+    if name.endswith(".toml"):
+        return load_agent(os.path.abspath(name))
+    return importlib.import_module(name)
+
+
+# ---------- running ----------
+
+def chat(agent):
+    """Continuous conversation loop."""
+    state = agent.new_state()
+    first_time = True  # Flag to track the first interaction
+
+    while True:
+        if first_time:
+            user_input = input("\nAI Assistant: How can I assist you today?\n> ")
+            first_time = False
+        else:
+            user_input = input("\nDo you need anything else?\n> ")
+
+        if user_input.lower() in ["exit", "quit", "bye"]:
+            print("\n👋 Goodbye!")
+            agent.print_stats()
+            break
+
+        agent.explain_terms(user_input)    # Definitions of the glossary terms in the question
+        if not agent.history_tokens:
+            state = agent.new_state()
+        state["query"] = user_input
+        savings = token_savings.snapshot()
+        with agent.tracer.turn(agent=agent.__name__):
+            if agent.config.get("stream", False):
+                final_state, timings = stream_turn(agent.graph, state)
+                print(f"⏱️ First token after {timings['ttft_s']}s, turn finished in {timings['total_s']}s")
+            else:
+                final_state = agent.graph.invoke(state)
+                print("\nAI Assistant Response:", final_state["response"])
+        if agent.tracer.enabled and (breakdown := agent.tracer.breakdown()):
+            print(f"🔬 {breakdown}")
+        if report := token_savings.report(savings):
+            print(f"🧹 {report}")
+        agent.record_turn(user_input, final_state)
+
+    agent.shutdown()
+    if agent.store is not None:
+        print(f"\n📄 History saved in: {agent.store.path}")
+
+
+def summarize(rows):
+    from load_test import percentile
+    seconds = [row["seconds"] for row in rows]
+    turns = len(rows) or 1
+    return {"turns": len(rows),
+            "p50_s": round(percentile(seconds, 50), 3),
+            "p95_s": round(percentile(seconds, 95), 3),
+            "mean_s": round(sum(seconds) / turns, 3),
+            "calls_per_turn": round(sum(row["calls"] for row in rows) / turns, 2),
+            "prompt_tokens_per_turn": round(sum(row["prompt_tokens"] for row in rows) / turns, 1),
+            "eval_tokens_per_turn": round(sum(row["eval_tokens"] for row in rows) / turns, 1)}
+
+
+def ab_test(paths, queries, output=AB_RESULTS_PATH):
+    """
+    Run every query through each config's agent (each keeps its own conversation)
+    and compare latency, model calls and tokens. The arms take turns going first,
+    so neither always finds the models loaded by the other.
+    """
+    agents = [build_agent(load_config(path)) for path in paths]
+    states = [agent.new_state() for agent in agents]
+    results = [[] for _ in agents]
+    usage = {"calls": 0, "prompt_tokens": 0, "eval_tokens": 0}
+
+    def observe(model, stats, seconds):
+        usage["calls"] += 1
+        usage["prompt_tokens"] += stats.get("prompt_eval_count", 0)
+        usage["eval_tokens"] += stats.get("eval_count", 0)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    add_observer(observe)
+    try:
+        with open(output, "a", encoding="utf-8") as file:
+            for number, (query_id, query) in enumerate(queries):
+                order = range(len(agents)) if number % 2 == 0 else reversed(range(len(agents)))
+                for arm in order:
+                    agent = agents[arm]
+                    if not agent.history_tokens:
+                        states[arm] = agent.new_state()
+                    states[arm]["query"] = query
+                    before = dict(usage)
+                    start = time.perf_counter()
+                    final_state = agent.graph.invoke(states[arm])
+                    row = {"id": query_id, "config": agent.config["path"], "seconds": round(time.perf_counter() - start, 3),
+                           "category": final_state.get("category"), "response": final_state["response"]}
+                    row.update((key, usage[key] - before[key]) for key in usage)
+                    results[arm].append(row)
+                    file.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        remove_observer(observe)
+        for agent in agents:
+            agent.shutdown()
+
+    summaries = [summarize(rows) for rows in results]
+    baseline = summaries[0]
+    for agent, summary in zip(agents, summaries):
+        print(f"\n🅰️🅱️ {agent.config['name']} ({agent.config['path']})")
+        for key, value in summary.items():
+            change = ""
+            if summary is not baseline and key != "turns" and baseline[key]:
+                change = f"  ({100 * (value - baseline[key]) / baseline[key]:+.0f}%)"
+            print(f"   {key:<24}{value}{change}")
+    print(f"\n📄 Per-turn results appended to: {output}")
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an agent described by a TOML config")
+    parser.add_argument("config", nargs="?", help="config to chat with")
+    parser.add_argument("--ab", nargs=2, metavar=("A", "B"), help="compare two configs on --queries")
+    parser.add_argument("--queries", help="JSONL / CSV of queries for --ab (same format as batch_runner)")
+    parser.add_argument("--output", default=AB_RESULTS_PATH, help="per-turn results of --ab (JSONL, appended)")
+    parser.add_argument("--draw", metavar="IMAGE", help="save a picture of the graph (needs graphviz) and exit")
+    parser.add_argument("--profile-startup", action="store_true", help="show where the import time goes and exit")
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        from bootstrap import profile_startup
+        return profile_startup("agent_builder")
+    if args.ab:
+        if not args.queries:
+            parser.error("--ab needs --queries")
+        from batch_runner import read_queries
+        ab_test(args.ab, read_queries(args.queries), args.output)
+        return 0
+    if not args.config:
+        parser.error("give a config (e.g. configs/ollama_agent6.toml) or --ab A B")
+    agent = build_agent(load_config(args.config))
+    if args.draw:
+        from visualize import draw_graph
+        print(f"🖼️ Graph saved in: {draw_graph(agent.graph, args.draw)}")
+        return 0
+    chat(agent)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
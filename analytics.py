@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import codecs
+import hashlib
+import argparse
+import numpy as np
+
+# Offline analytics over the raw Ollama responses logged by consulta_ollama.py.
+#
+# The log (a JSON array, or JSON lines) is streamed record by record into
+# NumPy columns, which are cached next to the log in a .npz file. With
+# --incremental only the records appended since the last run are parsed; the
+# rest of the columns come from the cache. Statistics are per-group
+# percentiles of load time, eval rate, prompt size and total duration.
+#
+#   python analytics.py                              # all records, grouped by model
+#   python analytics.py --group-by model,date --since 7d
+#   python analytics.py --incremental --model qwen2.5:0.5b
+#   python analytics.py --parquet respuestas.parquet # columnar copy (needs pyarrow)
+
+LOG_PATH = "respuestas_acumuladas.json"
+CHUNK_SIZE = 1 << 20          # Bytes read at a time while streaming the log
+HEAD_BYTES = 4096             # Bytes hashed to notice that the log was rewritten, not appended to
+PERCENTILES = (50, 95, 99)
+
+# Column -> (dtype, value taken from a record)
+COLUMNS = {
+    "load_duration": np.int64,
+    "prompt_eval_count": np.int64,
+    "prompt_eval_duration": np.int64,
+    "eval_count": np.int64,
+    "eval_duration": np.int64,
+    "total_duration": np.int64,
+}
+
+# Reported metric -> function of the columns
+METRICS = {
+    "load_s": lambda c: c["load_duration"] / 1e9,
+    "eval_tok_s": lambda c: np.divide(c["eval_count"], c["eval_duration"] / 1e9,
+                                      out=np.zeros(len(c["eval_count"])), where=c["eval_duration"] > 0),
+    "prompt_tokens": lambda c: c["prompt_eval_count"].astype(np.float64),
+    "total_s": lambda c: c["total_duration"] / 1e9,
+}
+
+
+def cache_path(log_path):
+    return os.path.splitext(log_path)[0] + ".analytics.npz"
+
+
+def head_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read(HEAD_BYTES)).hexdigest()
+
+
+def iter_records(path, offset=0):
+    """
+    Stream the records of a JSON array (or JSON lines) file starting at a byte
+    offset. Yields (record, byte offset just after it). A truncated last record
+    (log being written) is left for the next run.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as file:
+        file.seek(offset)
+        text = ""
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            text += utf8.decode(chunk, final=not chunk)
+            position = counted = 0      # counted: characters of text already added to offset
+            while True:
+                # Skip what separates records: whitespace, "[", ",", and the closing "]"
+                while position < len(text) and text[position] in " \t\r\n,[]":
+                    position += 1
+                if position >= len(text):
+                    break
+                try:
+                    record, position = decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    break    # Incomplete record: needs the next chunk
+                offset += len(text[counted:position].encode("utf-8"))
+                counted = position
+                yield record, offset
+            text = text[counted:]
+            if not chunk:
+                return
+
+
+def parse_records(path, offset=0):
+    """Read records from offset into a dict of NumPy columns; also returns the new offset."""
+    values = {name: [] for name in COLUMNS}
+    models, created = [], []
+    end = offset
+    for record, end in iter_records(path, offset):
+        if not isinstance(record, dict):
+            continue
+        models.append(record.get("model", ""))
+        created.append((record.get("created_at") or "1970-01-01T00:00:00")[:19])   # Server local time, to the second
+        for name, column in values.items():
+            column.append(record.get(name) or 0)
+
+    columns = {name: np.array(column, dtype=COLUMNS[name]) for name, column in values.items()}
+    columns["model"] = np.array(models, dtype=object)
+    columns["created_at"] = np.array(created, dtype="datetime64[s]")
+    return columns, end
+
+
+def concat(old, new):
+    return {name: np.concatenate([old[name], new[name]]) for name in new}
+
+
+def load_columns(log_path=LOG_PATH, incremental=True):
+    """Columns of the whole log, parsing only the records added since the cached run when possible."""
+    cache = cache_path(log_path)
+    size = os.path.getsize(log_path)
+    head = head_hash(log_path)
+    if incremental and os.path.exists(cache):
+        with np.load(cache, allow_pickle=True) as stored:
+            state = json.loads(str(stored["state"]))
+            cached = {name: stored[name] for name in stored.files if name != "state"}
+        if state["head"] == head and state["offset"] <= size:
+            added, offset = parse_records(log_path, state["offset"])
+            columns = concat(cached, added)
+            if offset != state["offset"]:
+                save_columns(cache, columns, offset, head)
+            return columns, len(added["model"])
+
+    columns, offset = parse_records(log_path)
+    save_columns(cache, columns, offset, head)
+    return columns, len(columns["model"])
+
+
+def save_columns(path, columns, offset, head):
+    temporary = path + ".tmp.npz"
+    np.savez(temporary, state=json.dumps({"offset": offset, "head": head}), **columns)
+    os.replace(temporary, path)
+
+
+def parse_time(value, now=None):
+    """"7d", "12h", "30m" (ago) or an ISO date/time -> numpy datetime64[s]."""
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if value[-1:] in units and value[:-1].isdigit():
+        now = time.time() if now is None else now
+        return np.datetime64(int(now - int(value[:-1]) * units[value[-1]]), "s")
+    return np.datetime64(value, "s")
+
+
+def select(columns, since=None, until=None, model=None):
+    mask = np.ones(len(columns["model"]), dtype=bool)
+    if since is not None:
+        mask &= columns["created_at"] >= parse_time(since)
+    if until is not None:
+        mask &= columns["created_at"] < parse_time(until)
+    if model is not None:
+        mask &= columns["model"] == model
+    return {name: column[mask] for name, column in columns.items()}
+
+
+def group_keys(columns, group_by):
+    parts = []
+    for field in group_by:
+        if field == "model":
+            parts.append(columns["model"].astype(str))
+        elif field == "date":
+            parts.append(columns["created_at"].astype("datetime64[D]").astype(str))
+        else:
+            raise ValueError(f"cannot group by {field!r} (use model and/or date)")
+    keys = parts[0]
+    for part in parts[1:]:
+        keys = np.char.add(np.char.add(keys, " "), part)
+    return keys
+
+
+def summarize(columns, group_by=("model",)):
+    """{group: {"count": n, metric: {"p50": .., "p95": .., "p99": ..}}}"""
+    if not len(columns["model"]):
+        return {}
+    metrics = {name: compute(columns) for name, compute in METRICS.items()}
+    keys = group_keys(columns, group_by)
+    groups, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse))[:-1]
+
+    summary = {}
+    for group, rows in zip(groups, np.split(order, bounds)):
+        entry = {"count": int(len(rows))}
+        for name, values in metrics.items():
+            points = np.percentile(values[rows], PERCENTILES)
+            entry[name] = {f"p{q}": round(float(p), 4) for q, p in zip(PERCENTILES, points)}
+        summary[str(group)] = entry
+    return summary
+
+
+def export_parquet(columns, path):
+    """Columnar copy of the log for other tools (pyarrow is an optional dependency)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("❌ --parquet needs pyarrow: pip install pyarrow")
+    table = pa.table({name: column.astype(str) if name == "model" else column for name, column in columns.items()})
+    pq.write_table(table, path)
+
+
+def print_table(summary):
+    header = f"{'group':<32}{'n':>8}" + "".join(f"{name + ' p50/p95/p99':>30}" for name in METRICS)
+    print(header)
+    for group, entry in summary.items():
+        cells = "".join(f"{'/'.join(str(entry[name][f'p{q}']) for q in PERCENTILES):>30}" for name in METRICS)
+        print(f"{group:<32}{entry['count']:>8}{cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Percentiles of load time, eval rate, prompt size and duration")
+    parser.add_argument("log", nargs="?", default=LOG_PATH)
+    parser.add_argument("--group-by", default="model", help="model, date or model,date")
+    parser.add_argument("--since", help='start of the window: "7d", "24h" or an ISO date')
+    parser.add_argument("--until", help="end of the window (exclusive)")
+    parser.add_argument("--model")
+    parser.add_argument("--incremental", action="store_true", help="only parse records added since the last run")
+    parser.add_argument("--parquet", help="also write the columns to this Parquet file")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"❌ The file '{args.log}' does not exist.")
+        return 1
+
+    start = time.perf_counter()
+    columns, parsed = load_columns(args.log, incremental=args.incremental)
+    loaded = time.perf_counter()
+    if args.parquet:
+        export_parquet(columns, args.parquet)
+    summary = summarize(select(columns, args.since, args.until, args.model), args.group_by.split(","))
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_table(summary)
+        print(f"\n📊 {len(columns['model'])} records ({parsed} parsed) loaded in {loaded - start:.2f}s, "
+              f"summarised in {time.perf_counter() - loaded:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
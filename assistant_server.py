@@ -0,0 +1,305 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from ollama_client import transport_stats, get_scheduler
+from residency import set_session
+from tracing import get_tracer
+
+# Multi-session HTTP server around the agent graph.
+#
+# One process holds a State per session id and runs turns with graph.ainvoke,
+# so many conversations share the same models, caches and event loop.
+#
+#   POST /chat      {"session_id": "...", "query": "...", "stream": false}
+#                   -> {"response": ..., "category": ..., "timings": {...}}
+#                   with "stream": true the reply is NDJSON: {"token": ...}, {"revision": ...}, {"done": {...}}
+#   DELETE /session?id=...   forget a session
+#   GET  /metrics   server counters (sessions, queue depth, rejections, latency)
+#   GET  /metrics/prometheus   per-node / per-model histograms, checker gate counters and scheduler
+#                              queue depth (Prometheus text)
+#
+#   python assistant_server.py [--port 8800] [--agent pruebaollama7 | configs/ollama_agent6.toml]
+
+DEFAULT_PORT = 8800
+DEFAULT_AGENT = "pruebaollama7"       # Module exposing graph, new_state() and record_turn()
+
+MAX_CONCURRENT_TURNS = 64      # Turns running through the graph at the same time
+MAX_PENDING_PER_SESSION = 4    # Queued turns per session before answering 429
+MAX_QUEUED_TURNS = 1000        # Queued turns in total before answering 503
+SESSION_TTL = 30 * 60          # Idle sessions are dropped after this many seconds
+
+
+class Session:
+    def __init__(self, session_id, state):
+        self.id = session_id
+        self.state = state
+        self.lock = asyncio.Lock()       # One turn at a time per session, FIFO
+        self.pending = 0
+        self.last_used = time.monotonic()
+
+
+class Overloaded(Exception):
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+
+
+class AssistantServer:
+    """Per-session state, per-session queueing and global backpressure around an agent graph."""
+
+    def __init__(self, agent, max_concurrent=MAX_CONCURRENT_TURNS,
+                 max_pending_per_session=MAX_PENDING_PER_SESSION,
+                 max_queued=MAX_QUEUED_TURNS, session_ttl=SESSION_TTL):
+        self.agent = agent
+        self.max_pending_per_session = max_pending_per_session
+        self.max_queued = max_queued
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+        self.queued = 0
+        self.running = 0
+        self.counters = {"turns": 0, "errors": 0, "rejected_session": 0, "rejected_server": 0}
+        self.turn_seconds = 0.0
+
+    def session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(session_id, self.agent.new_state())
+        return session
+
+    def drop_idle_sessions(self):
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if not session.pending and now - session.last_used > self.session_ttl:
+                del self.sessions[session_id]
+
+    async def run_turn(self, session_id, query, on_token=None, on_revision=None):
+        session = self.session(session_id)
+        if session.pending >= self.max_pending_per_session:
+            self.counters["rejected_session"] += 1
+            raise Overloaded(429, "too many pending requests for this session")
+        if self.queued >= self.max_queued:
+            self.counters["rejected_server"] += 1
+            raise Overloaded(503, "server is overloaded")
+
+        session.pending += 1
+        self.queued += 1
+        waiting = True
+        try:
+            async with session.lock:          # Turns of one session run in order
+                async with self._slots:       # Bounded number of turns in flight
+                    self.queued -= 1
+                    waiting = False
+                    self.running += 1
+                    try:
+                        return await self._turn(session, query, on_token, on_revision)
+                    finally:
+                        self.running -= 1
+        finally:
+            if waiting:                       # Cancelled while still queued
+                self.queued -= 1
+            session.pending -= 1
+            session.last_used = time.monotonic()
+
+    async def _turn(self, session, query, on_token, on_revision):
+        start = time.perf_counter()
+        first_token = None
+
+        def token(text):
+            nonlocal first_token
+            if first_token is None:
+                first_token = time.perf_counter()
+            on_token(text)
+
+        configurable = {}
+        if on_token is not None:
+            configurable["on_token"] = token
+        if on_revision is not None:
+            configurable["on_revision"] = on_revision
+
+        session.state["query"] = query
+        set_session(session.id)       # Model transitions are learned per conversation
+        try:
+            with get_tracer().turn(agent=self.agent.__name__, session=session.id):
+                final_state = await self.agent.graph.ainvoke(session.state, config={"configurable": configurable})
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        # History appends (fsync) and cache writes: off the event loop, the other sessions keep going.
+        # Turns of different sessions are recorded concurrently: the history store, the semantic
+        # cache and the long-term memory each serialise their own writes under a lock
+        await asyncio.to_thread(self.agent.record_turn, query, final_state, session_id=session.id)
+
+        elapsed = time.perf_counter() - start
+        self.counters["turns"] += 1
+        self.turn_seconds += elapsed
+        return {
+            "response": final_state["response"],
+            "category": final_state["category"],
+            "timings": {
+                "ttft_s": round((first_token or time.perf_counter()) - start, 3),
+                "total_s": round(elapsed, 3),
+            },
+        }
+
+    def metrics(self):
+        return dict(self.counters,
+                    sessions=len(self.sessions),
+                    queued=self.queued,
+                    running=self.running,
+                    ollama=transport_stats(),
+                    avg_turn_s=self.turn_seconds / self.counters["turns"] if self.counters["turns"] else 0.0)
+
+
+# ---------- minimal HTTP/1.1 layer (keep-alive, chunked streaming) ----------
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, target, headers, body
+
+
+def http_response(status, payload):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+    head = (f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def handle_chat(server, request, writer):
+    session_id = str(request.get("session_id", "default"))
+    query = request.get("query", "")
+
+    if not request.get("stream"):
+        try:
+            result = await server.run_turn(session_id, query)
+        except Overloaded as error:
+            writer.write(http_response(error.status, {"error": str(error)}))
+            return
+        except Exception as error:
+            writer.write(http_response(500, {"error": repr(error)}))
+            return
+        writer.write(http_response(200, result))
+        return
+
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                 b"Transfer-Encoding: chunked\r\n\r\n")
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+
+    def send(event):
+        # Token callbacks are plain functions, some called from worker threads (speculative
+        # branches): queue the chunk, write_chunks() writes it once the client took the previous one
+        data = json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+        loop.call_soon_threadsafe(chunks.put_nowait, f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    async def write_chunks():
+        while (chunk := await chunks.get()) is not None:
+            writer.write(chunk)
+            await writer.drain()      # A slow client holds the stream back instead of growing the buffer
+
+    writing = asyncio.create_task(write_chunks())
+    try:
+        result = await server.run_turn(session_id, query,
+                                       on_token=lambda text: send({"token": text}),
+                                       on_revision=lambda text: send({"revision": text}))
+        send({"done": result})
+    except Overloaded as error:
+        send({"error": str(error), "status": error.status})
+    except Exception as error:
+        send({"error": repr(error), "status": 500})
+    finally:
+        loop.call_soon_threadsafe(chunks.put_nowait, None)
+        await writing
+    writer.write(b"0\r\n\r\n")
+
+
+async def handle_connection(server, reader, writer):
+    try:
+        while True:
+            request = await read_request(reader)
+            if request is None:
+                break
+            method, target, headers, body = request
+            url = urlsplit(target)
+
+            if method == "POST" and url.path == "/chat":
+                try:
+                    payload = json.loads(body or b"{}")
+                except json.JSONDecodeError:
+                    writer.write(http_response(400, {"error": "invalid JSON"}))
+                else:
+                    await handle_chat(server, payload, writer)
+            elif method == "GET" and url.path == "/metrics":
+                writer.write(http_response(200, server.metrics()))
+            elif method == "GET" and url.path == "/metrics/prometheus":
+                scheduler = get_scheduler()
+                writer.write(http_response(200, get_tracer().prometheus() + server.agent.gate.prometheus() +
+                                           (scheduler.prometheus() if scheduler is not None else "")))
+            elif method == "DELETE" and url.path == "/session":
+                session_id = parse_qs(url.query).get("id", [""])[0]
+                writer.write(http_response(200, {"deleted": server.sessions.pop(session_id, None) is not None}))
+            else:
+                writer.write(http_response(404, {"error": "not found"}))
+            await writer.drain()
+
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def cleanup_sessions(server):
+    while True:
+        await asyncio.sleep(60)
+        server.drop_idle_sessions()
+
+
+async def main(port=DEFAULT_PORT, agent_name=DEFAULT_AGENT):
+    from agent_builder import import_agent    # Builds configs; plain module names still work
+    agent = import_agent(agent_name)
+    server = AssistantServer(agent)
+    listener = await asyncio.start_server(
+        lambda reader, writer: handle_connection(server, reader, writer),
+        "127.0.0.1", port, backlog=1024)
+    cleaner = asyncio.create_task(cleanup_sessions(server))
+    print(f"🌐 Assistant server ({agent_name}) listening on http://127.0.0.1:{port}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        cleaner.cancel()
+        agent.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-session assistant server")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--agent", default=DEFAULT_AGENT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.port, args.agent))
+    except KeyboardInterrupt:
+        sys.exit(0)
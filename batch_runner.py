@@ -0,0 +1,216 @@
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from langgraph.checkpoint.memory import MemorySaver
+from tracing import get_tracer
+
+# Batch / offline mode for the classify -> process -> check graph.
+#
+# Reads queries from JSONL ({"id": ..., "query": ...} or a bare string per line)
+# or CSV (a "query" column, optional "id"), and runs them through the agent's
+# graph in batches. Inside a batch the graph runs stage by stage: every query
+# is classified, then the drafts are generated one category (= one model) at a
+# time, then every draft is checked. So each model is loaded once per batch
+# instead of swapping on every query.
+#
+# Results are appended to the output JSONL as they finish; ids already answered
+# in the output are skipped (failed ones run again), so an interrupted run
+# resumes where it stopped.
+#
+#   python batch_runner.py queries.jsonl results.jsonl [--agent pruebaollama7 | configs/ollama_agent6.toml] [--concurrency 8]
+
+DEFAULT_AGENT = "pruebaollama7"    # Module exposing builder (the StateGraph) and new_state()
+BATCH_SIZE = 64                    # Queries per staged batch
+CONCURRENCY = 8                    # Queries in flight inside a stage
+
+# The graph pauses after these nodes, so the next stage can be grouped by model
+STAGE_BREAKS = ["classify_query", "process_query"]
+
+
+def read_queries(path):
+    """[(id, query)] from a JSONL or CSV file; ids default to the line number."""
+    queries = []
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if path.lower().endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(file), start=1):
+                queries.append((str(row.get("id") or number), row["query"]))
+        else:
+            for number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, str):
+                    queries.append((str(number), item))
+                else:
+                    queries.append((str(item.get("id", number)), item["query"]))
+    return queries
+
+
+def finished_ids(path):
+    """Ids answered in the output file (the checkpoint of an interrupted run); failed ones are retried."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue    # Half-written last line of an interrupted run
+                if "id" in result and "error" not in result:
+                    done.add(str(result["id"]))
+    return done
+
+
+def open_output(path):
+    """The output file for appending, cut back to its last complete line."""
+    output = open(path, "ab+")
+    output.seek(0, os.SEEK_END)
+    size = output.tell()
+    if size:
+        output.seek(size - 1)
+        if output.read(1) != b"\n":
+            # Torn line of an interrupted run: the next result would be glued onto it and lost
+            output.seek(0)
+            output.truncate(output.read().rfind(b"\n") + 1)
+    output.close()
+    return open(path, "a", encoding="utf-8")
+
+
+class BatchRunner:
+    """Runs batches of independent queries through an agent graph, one stage at a time."""
+
+    def __init__(self, agent, output, concurrency=CONCURRENCY, record=False):
+        self.agent = agent
+        self.breaks = [node for node in STAGE_BREAKS if node in agent.builder.nodes]
+        self.graph = None
+        self.output = open_output(output)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.record = record
+        self.stage_seconds = defaultdict(float)
+        self.completed = 0
+        self.failed = 0
+
+    def initial_state(self, query):
+        state = self.agent.new_state() if hasattr(self.agent, "new_state") else {"history": []}
+        state["query"] = query
+        return state
+
+    async def _step(self, query_id, payload):
+        """Run one query until the next stage break (or the end); returns the graph state snapshot."""
+        config = {"configurable": {"thread_id": query_id}}
+        async with self.slots:
+            await self.graph.ainvoke(payload, config=config)
+        return self.graph.get_state(config)
+
+    async def _stage(self, name, items):
+        """Advance items [(query_id, payload)] by one stage, concurrently."""
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._step(query_id, payload) for query_id, payload in items),
+                                       return_exceptions=True)
+        self.stage_seconds[name] += time.perf_counter() - start
+        return dict(zip((query_id for query_id, _ in items), results))
+
+    def _write(self, query_id, query, snapshot, error=None):
+        if error is not None:
+            result = {"id": query_id, "query": query, "error": repr(error)}
+            self.failed += 1
+        else:
+            values = snapshot.values
+            result = {"id": query_id, "query": query, "category": values.get("category"),
+                      "response": values.get("response")}
+            self.completed += 1
+            if self.record and hasattr(self.agent, "record_turn"):
+                self.agent.record_turn(query, values, session_id=f"batch-{query_id}")
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    async def run_batch(self, batch):
+        # A fresh checkpointer per batch: the paused runs of finished batches are not kept around
+        self.graph = self.agent.builder.compile(checkpointer=MemorySaver(), interrupt_after=self.breaks)
+        queries = dict(batch)
+        pending = {}
+
+        def advance(snapshots):
+            for query_id, snapshot in snapshots.items():
+                if isinstance(snapshot, BaseException):
+                    self._write(query_id, queries[query_id], None, snapshot)
+                elif snapshot.next:
+                    pending[query_id] = snapshot
+                else:
+                    self._write(query_id, queries[query_id], snapshot)    # Finished early (cache hit, gate)
+
+        # Stage 1: classify everything (one classifier model)
+        advance(await self._stage("classify", [(query_id, self.initial_state(query)) for query_id, query in batch]))
+
+        # Stage 2: generate the drafts, one category (= model) at a time
+        by_category = defaultdict(list)
+        for query_id, snapshot in pending.items():
+            by_category[snapshot.values.get("category")].append(query_id)
+        pending.clear()
+        for category, ids in sorted(by_category.items(), key=lambda item: str(item[0])):
+            advance(await self._stage(f"process:{category}", [(query_id, None) for query_id in ids]))
+
+        # Stage 3: check the drafts that need it (one checker model)
+        ids = list(pending)
+        pending.clear()
+        if ids:
+            advance(await self._stage("check", [(query_id, None) for query_id in ids]))
+        for query_id, snapshot in pending.items():
+            self._write(query_id, queries[query_id], snapshot)
+
+        self.output.flush()
+        os.fsync(self.output.fileno())    # The batch is the checkpoint
+
+    async def run(self, queries, batch_size=BATCH_SIZE):
+        for index in range(0, len(queries), batch_size):
+            await self.run_batch(queries[index:index + batch_size])
+            print(f"📦 {min(index + batch_size, len(queries))}/{len(queries)} queries", flush=True)
+
+    def close(self):
+        self.output.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a file of queries through an agent graph")
+    parser.add_argument("input", help="JSONL or CSV file with the queries")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--agent", default=DEFAULT_AGENT)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--record", action="store_true", help="also append the turns to the agent's history")
+    args = parser.parse_args()
+
+    done = finished_ids(args.output)
+    queries = [(query_id, query) for query_id, query in read_queries(args.input) if query_id not in done]
+    if done:
+        print(f"⏩ Resuming: {len(done)} queries already in {args.output}")
+
+    from agent_builder import import_agent    # Builds configs; plain module names still work
+    agent = import_agent(args.agent)
+    runner = BatchRunner(agent, args.output, args.concurrency, args.record)
+    start = time.perf_counter()
+    try:
+        asyncio.run(runner.run(queries, args.batch_size))
+    finally:
+        runner.close()
+        if hasattr(agent, "shutdown"):
+            agent.shutdown()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n📈 {runner.completed} queries answered, {runner.failed} failed, in {elapsed:.1f}s "
+          f"({60 * runner.completed / elapsed if elapsed else 0:.1f} queries/min)")
+    for stage, seconds in runner.stage_seconds.items():
+        print(f"   {stage:<28}{seconds:8.2f}s")
+    tracer = get_tracer()
+    if tracer.enabled:
+        for node, summary in tracer.stats()["nodes"].items():
+            print(f"   node {node:<23}{summary['sum']:8.2f}s over {summary['count']} calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+import argparse
+import urllib.request
+import stub_ollama
+from langchain_core.messages import HumanMessage
+from ollama_client import OllamaModel
+from router import normalize_label
+from constrained import label_model, parse_label
+from reasoning import stream_label
+from load_test import percentile
+from agent_builder import config_path, load_config, node_prompt
+
+# Free-text vs schema-constrained classification.
+#
+# The stub's classifiers answer with the label of the query plus, like a chatty
+# model, an explanation that names the other label ("code because it is not
+# natural language ..."); deepseek-r1 also thinks first. The free-text arms
+# parse that the way the agents did ("code" in text, normalize_label) or stop
+# the stream at the label (reasoning.py); the constrained arms send the
+# category enum as `format` with num_predict capped (constrained.py).
+# "tokens" are generated by the server per query, "right" is the share of
+# queries routed to the label the model meant.
+#
+#   python bench_classification.py [--queries 40] [--explanation 20]
+
+QUERY_TOPICS = ("How do I reverse a list in python?", "Tell me about the history of Rome.",
+                "Why does this sql join return duplicates?", "How does gravity work?",
+                "Write a javascript function that debounces", "What should I cook tonight?")
+
+
+def server_tokens(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stub/stats") as response:
+        return json.load(response)["tokens_generated"]
+
+
+def run(classify, queries, port):
+    before = server_tokens(port)
+    latencies, right = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        label = classify(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        right += label == stub_ollama.classifier_label(query)
+    time.sleep(0.2)     # Let the server notice closed streams
+    return {"mean_ms": sum(latencies) / len(latencies), "p95_ms": percentile(latencies, 95),
+            "tokens": (server_tokens(port) - before) / len(queries), "right": right / len(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Free-text vs constrained (JSON schema) classification")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--explanation", type=int, default=20, help="tokens the stub's classifiers write after the label")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 60)
+    args = parser.parse_args()
+
+    stub = stub_ollama.serve(args.port, stub_ollama.StubConfig(tokens_per_second=args.tokens_per_second,
+                                                               label_explanation=args.explanation), background=True)
+    host = f"http://127.0.0.1:{args.port}"
+    prompt = node_prompt(load_config(config_path("ollama_agent5")), "classify_query")
+    queries = [f"{QUERY_TOPICS[n % len(QUERY_TOPICS)]} ({n})" for n in range(args.queries)]
+    mistral, deepseek = OllamaModel("mistral:latest", host=host), OllamaModel("deepseek-r1:latest", host=host)
+    constrained_mistral, constrained_deepseek = label_model(mistral), label_model(deepseek)
+
+    def messages(query):
+        return [prompt, HumanMessage(content=query)]
+
+    arms = (
+        ("mistral, 'code' in text", lambda q: "code" if "code" in mistral.invoke(messages(q)).lower()
+                                              else "natural_language"),
+        ("mistral, normalize_label", lambda q: normalize_label(mistral.invoke(messages(q)))),
+        ("mistral, constrained", lambda q: parse_label(constrained_mistral.invoke(messages(q)))),
+        ("deepseek-r1, stop at label", lambda q: stream_label(deepseek, messages(q))),
+        ("deepseek-r1, constrained", lambda q: parse_label(constrained_deepseek.invoke(messages(q)))),
+    )
+    print(f"🧪 {args.queries} queries, {args.explanation}-token explanations, {args.tokens_per_second:g} tokens/s\n")
+    print(f"{'classification':<28}{'mean ms':>9}{'p95 ms':>9}{'tokens':>8}{'right':>8}")
+    results = {}
+    for name, classify in arms:
+        result = results[name] = run(classify, queries, args.port)
+        print(f"{name:<28}{result['mean_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['tokens']:>8.1f}{result['right']:>8.0%}")
+    stub.shutdown()
+
+    before, after = results["mistral, normalize_label"], results["mistral, constrained"]
+    print(f"\n⚡ Constrained: {before['mean_ms'] / after['mean_ms']:.1f}x faster, "
+          f"{before['tokens'] - after['tokens']:.0f} fewer tokens per classification, "
+          f"{after['right']:.0%} routed right (was {before['right']:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from long_term_memory import LongTermMemory, normalize_rows
+
+# Indexing throughput, search latency and recall of the long-term memory index.
+#
+# Random unit vectors have no neighbourhoods worth finding, so the synthetic
+# turns are clustered: every turn is a noisy copy of one of turns / TURNS_PER_TOPIC
+# topic vectors, and every query a fresh noisy copy of a random topic. Embedding
+# time is excluded (that is one /api/embed call per turn, in the background).
+# Recall@k is measured against the exact scan of the same index; "same topic"
+# is the share of returned turns from the query's topic (the exact scan's top-k
+# are near-ties among TURNS_PER_TOPIC topic mates, so that is what matters).
+#
+#   python bench_long_term_memory.py [--turns 1000000] [--dim 384]   (1M x 384 is ~1.5 GB on disk)
+
+TURNS_PER_TOPIC = 50
+NOISE = 0.9                # Noise norm relative to the topic vector
+BATCH = 10_000             # Rows per add()
+QUERIES = 200
+
+
+def noisy(topics, picks, dim, rng):
+    noise = rng.standard_normal((len(picks), dim), dtype=np.float32)
+    noise *= NOISE / np.linalg.norm(noise, axis=1, keepdims=True)
+    return normalize_rows(topics[picks] + noise)
+
+
+def timed_searches(memory, queries, k, **options):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([turn for turn, _ in memory.search(query, k, **options)])
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    return results, np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def same_topic(found, labels, query_topics):
+    hits = sum(int(np.sum(labels[turns] == topic)) for turns, topic in zip(found, query_topics))
+    return hits / max(1, sum(len(turns) for turns in found))
+
+
+def recall_at_k(found, exact):
+    hits = sum(len(set(a) & set(b)) for a, b in zip(found, exact))
+    return hits / max(1, sum(len(b) for b in exact))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the long-term memory index")
+    parser.add_argument("--turns", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    topics = normalize_rows(rng.standard_normal((max(1, args.turns // TURNS_PER_TOPIC), args.dim), dtype=np.float32))
+    folder = tempfile.mkdtemp(prefix="long_term_memory_")
+    memory = LongTermMemory(store=None, embed_many=None, folder=folder, background=False)
+    labels = rng.integers(0, len(topics), args.turns)      # Topic of every turn
+    try:
+        start = time.perf_counter()
+        for first in range(0, args.turns, BATCH):
+            turns = np.arange(first, min(first + BATCH, args.turns))
+            memory.add(noisy(topics, labels[turns], args.dim, rng), turns, np.zeros(len(turns)))
+        elapsed = time.perf_counter() - start
+        stats = memory.stats()
+        print(f"🧪 {args.turns} turns x {args.dim} dims, {len(topics)} topics")
+        print(f"   indexing: {elapsed:.1f}s ({args.turns / elapsed:,.0f} rows/s), "
+              f"{stats['trainings']} IVF training(s) included: {stats['train_s']:.1f}s")
+
+        start = time.perf_counter()
+        memory.train()
+        print(f"   retrain at full size: {time.perf_counter() - start:.1f}s, {memory.stats()['ivf_lists']} lists")
+
+        query_topics = rng.integers(0, len(topics), QUERIES)
+        queries = noisy(topics, query_topics, args.dim, rng)
+        memory.search(queries[0], args.k, exact=True)     # Warm the page cache before timing
+        exact, p50, p95 = timed_searches(memory, queries, args.k, exact=True)
+        print(f"\n{'search':<16}{'p50 ms':>10}{'p95 ms':>10}{f'recall@{args.k}':>12}{'same topic':>12}")
+        print(f"{'exact scan':<16}{p50:>10.2f}{p95:>10.2f}{1.0:>12.3f}{same_topic(exact, labels, query_topics):>12.3f}")
+        if memory.centroids is not None:
+            for nprobe in (4, 8, 16, 32, 64):
+                memory.nprobe = nprobe
+                found, p50, p95 = timed_searches(memory, queries, args.k)
+                print(f"{f'ivf nprobe={nprobe}':<16}{p50:>10.2f}{p95:>10.2f}{recall_at_k(found, exact):>12.3f}"
+                      f"{same_topic(found, labels, query_topics):>12.3f}")
+    finally:
+        memory.close()
+        shutil.rmtree(folder, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import sys
+import argparse
+import stub_ollama
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from ollama_client import OllamaModel, add_observer
+from memory import ConversationMemory
+from prompts import system_prompt, stable_message
+
+# prompt_eval_count per turn with the old prompt layout and the prefix-stable one.
+#
+# Runs the same conversation twice against the stub server, which simulates
+# Ollama's KV cache reuse (only the part after the longest cached prefix is
+# evaluated). "before" is the old assembly: indented system prompts, the
+# checker getting the draft appended again after the history, and history
+# trimmed a little on every turn once over budget. "after" is the prompts.py
+# layout with ConversationMemory(trim_to=0.5).
+#
+#   python bench_prompt_prefix.py [--turns 30] [--budget 512]
+
+NLP_TEXT = """
+    You are an AI that answers general knowledge questions clearly and concisely.
+    - Provide well-structured explanations.
+    - If answering historical or scientific questions, use reliable knowledge.
+    """
+CHECKER_TEXT = """
+    You are a response checker. Read the given response and check if it needs improvement.
+    If so, improve it. But if the response its okay dont change aything.
+    """
+CHECK_TEXT = """
+    Check the last assistant response above. Reply with the improved response,
+    or with the same response if it is already fine.
+    """
+
+
+def run_conversation(host, turns, budget, stable, evaluated):
+    answerer = OllamaModel("phi:latest", host=host)
+    checker = OllamaModel("mistral:latest", host=host)
+    if stable:
+        nlp_prompt, checker_prompt = system_prompt(NLP_TEXT), system_prompt(CHECKER_TEXT)
+        history = ConversationMemory(max_tokens=budget, trim_to=0.5)
+    else:
+        nlp_prompt, checker_prompt = SystemMessage(content=NLP_TEXT), SystemMessage(content=CHECKER_TEXT)
+        history = ConversationMemory(max_tokens=budget)
+    check_request = stable_message(CHECK_TEXT)
+
+    per_turn = []
+    for turn in range(turns):
+        evaluated.clear()
+        query = f"Tell me something about topic number {turn}."
+        draft = answerer.invoke([nlp_prompt] + history + [HumanMessage(content=query)]).strip()
+        history.append(HumanMessage(content=query))
+        history.append(AIMessage(content=draft))
+        if stable:
+            checker.invoke([checker_prompt] + history + [check_request])
+        else:
+            checker.invoke([checker_prompt] + history + [AIMessage(content=draft)])
+        per_turn.append(sum(evaluated))
+    return per_turn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt_eval_count per turn before / after prefix-stable prompts")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--budget", type=int, default=512, help="history token budget")
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 20)
+    args = parser.parse_args()
+
+    evaluated = []
+    add_observer(lambda model, stats, seconds: evaluated.append(stats.get("prompt_eval_count", 0)))
+
+    results = {}
+    for offset, stable in enumerate((False, True)):
+        # A fresh stub (empty KV cache) for each layout; instant generation, only token counts matter
+        stub = stub_ollama.serve(args.port + offset, stub_ollama.StubConfig(tokens_per_second=0, response_tokens=60),
+                                 background=True)
+        results[stable] = run_conversation(f"http://127.0.0.1:{args.port + offset}", args.turns, args.budget,
+                                           stable, evaluated)
+        stub.shutdown()
+
+    print(f"{'turn':>5}{'before':>10}{'after':>10}")
+    for turn, (before, after) in enumerate(zip(results[False], results[True]), start=1):
+        print(f"{turn:>5}{before:>10}{after:>10}")
+    before, after = sum(results[False]), sum(results[True])
+    print(f"\n📉 prompt tokens evaluated: {before} -> {after} ({100 * (before - after) / before:.0f}% less)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
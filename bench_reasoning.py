@@ -0,0 +1,85 @@
+import sys
+import json
+import time
+import argparse
+import urllib.request
+import stub_ollama
+from langchain_core.messages import HumanMessage
+from ollama_client import OllamaModel
+from router import normalize_label
+from reasoning import stream_label, strip_reasoning, TokenSavings
+from agent_builder import config_path, load_config, node_prompt
+
+# Tokens and time a deepseek-r1 classification costs, before and after reasoning.py.
+#
+# The stub's deepseek-r1 writes a <think> block (think_tokens), the label and
+# an explanation after it, like the real model. "tokens" are the tokens the
+# server generated per query (including those of streams cut short), "right"
+# the share of queries that got the label the model actually gave. The last
+# arm also caps num_predict below the think block, to show the fallback label.
+#
+#   python bench_reasoning.py [--queries 20] [--think-tokens 200]
+
+MODEL = "deepseek-r1:latest"
+EXPECTED = "natural_language"         # The label the stub's classifier gives
+SHORT_CAP = 64                        # num_predict that ends inside the <think> block
+
+
+def server_tokens(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stub/stats") as response:
+        return json.load(response)["tokens_generated"]
+
+
+def run(classify, queries, port):
+    before = server_tokens(port)
+    labels, start = [], time.perf_counter()
+    for query in queries:
+        labels.append(classify(query))
+    seconds = (time.perf_counter() - start) / len(queries)
+    time.sleep(0.2)     # Let the server notice closed streams
+    tokens = (server_tokens(port) - before) / len(queries)
+    return seconds, tokens, sum(label == EXPECTED for label in labels) / len(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of deepseek-r1 classifications with and without early stop")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--think-tokens", type=int, default=stub_ollama.THINK_TOKENS)
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 50)
+    args = parser.parse_args()
+
+    stub = stub_ollama.serve(args.port, stub_ollama.StubConfig(tokens_per_second=400, think_tokens=args.think_tokens),
+                             background=True)
+    host = f"http://127.0.0.1:{args.port}"
+    model = OllamaModel(MODEL, host=host)
+    capped = OllamaModel(MODEL, host=host, num_predict=SHORT_CAP)
+    prompt = node_prompt(load_config(config_path("ollama_agent4")), "classify_query")
+    queries = [f"Question number {n}: tell me something about the history of Rome" for n in range(args.queries)]
+    savings = TokenSavings()
+
+    def messages(query):
+        return [prompt, HumanMessage(content=query)]
+
+    arms = (
+        ("invoke, whole text", lambda q: normalize_label(model.invoke(messages(q)))),
+        ("invoke, stripped", lambda q: normalize_label(strip_reasoning(model.invoke(messages(q)), savings))),
+        ("stream, stop at label", lambda q: stream_label(model, messages(q), savings)),
+        (f"stream, num_predict={SHORT_CAP}", lambda q: stream_label(capped, messages(q), savings)),
+    )
+    print(f"🧪 {args.queries} classifications, {args.think_tokens}-token think block\n")
+    print(f"{'classification':<26}{'mean s':>9}{'tokens':>9}{'right':>8}")
+    results = {}
+    for name, classify in arms:
+        results[name] = run(classify, queries, args.port)
+        seconds, tokens, right = results[name]
+        print(f"{name:<26}{seconds:>9.3f}{tokens:>9.1f}{right:>8.0%}")
+    stub.shutdown()
+
+    before, after = results["invoke, whole text"], results["stream, stop at label"]
+    print(f"\n⚡ Early stop: {before[1] - after[1]:.0f} fewer tokens and {before[0] / after[0]:.2f}x faster per classification")
+    print(f"📊 {savings.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import sys
+import time
+import zlib
+import threading
+import argparse
+import stub_ollama
+from load_test import percentile
+from ollama_client import OllamaModel, get_transport, set_residency_manager
+from residency import ResidencyManager, set_session
+
+# Model swaps with and without the residency manager, simulated on the stub server.
+#
+# The stub only fits --max-loaded models and charges a load cost per model
+# (like a GPU that can hold one of mistral / phi / codellama). N sessions run
+# the agent's pattern: classify (mistral) -> answer (phi or codellama) ->
+# check (mistral), with --think seconds of user think time between turns.
+# The report compares model loads, time spent loading and turn latency.
+#
+# Times are scaled down: --keep-alive stands in for Ollama's default 5 minutes,
+# and the manager's hot / cold keep_alive keep the same ratio to it (30m / 2m).
+#
+#   python bench_residency.py --sessions 8 --turns 5
+#   python bench_residency.py --sessions 4 --max-loaded 2 --think 1.5
+
+LOAD_SECONDS = {"mistral:latest": 0.3, "phi:latest": 0.2, "codellama:latest": 0.4}
+CLASSIFIER = "mistral:latest"
+CHECKER = "mistral:latest"
+
+
+def run_session(host, session, args, keep_alive, latencies):
+    set_session(session)
+    classifier = OllamaModel(CLASSIFIER, host=host, keep_alive=keep_alive)
+    checker = OllamaModel(CHECKER, host=host, keep_alive=keep_alive)
+    for turn in range(args.turns):
+        if turn:
+            time.sleep(args.think)
+        query = f"session {session} question {turn}"
+        answerer = "codellama:latest" if zlib.crc32(query.encode()) % 3 == 0 else "phi:latest"
+        start = time.perf_counter()
+        classifier.invoke(f"You are a classifier. {query}")
+        draft = OllamaModel(answerer, host=host, keep_alive=keep_alive).invoke(query)
+        checker.invoke(f"Check this answer: {draft}")
+        latencies.append(time.perf_counter() - start)
+
+
+def run(port, args, managed):
+    config = stub_ollama.StubConfig(tokens_per_second=args.tokens_per_second, response_tokens=20,
+                                    max_loaded_models=args.max_loaded, load_seconds=LOAD_SECONDS)
+    stub = stub_ollama.serve(port, config, background=True)
+    host = f"http://127.0.0.1:{port}"
+    manager = None
+    if managed:
+        manager = ResidencyManager(host=host, max_loaded=args.max_loaded, max_wait=args.max_wait,
+                                   hot_keep_alive=args.keep_alive * 6, cold_keep_alive=args.keep_alive * 0.4)
+    set_residency_manager(manager)
+    keep_alive = None if managed else args.keep_alive    # An explicit keep_alive overrides the manager's
+
+    latencies = []
+    threads = [threading.Thread(target=run_session, args=(host, s, args, keep_alive, latencies))
+               for s in range(args.sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    set_residency_manager(None)
+    stats = get_transport().request("GET", "/stub/stats", host=host)
+    stub.shutdown()
+    return elapsed, latencies, stats, manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model swaps with and without the residency manager")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--max-loaded", type=int, default=1)
+    parser.add_argument("--max-wait", type=float, default=2.0)
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between the turns of a session")
+    parser.add_argument("--keep-alive", type=float, default=1.0, help="seconds standing in for Ollama's 5m")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 10)
+    args = parser.parse_args()
+
+    print(f"🧪 {args.sessions} sessions x {args.turns} turns, {args.max_loaded} model(s) fit in memory, "
+          f"load costs {LOAD_SECONDS}")
+    for offset, managed in enumerate((False, True)):
+        elapsed, latencies, stats, manager = run(args.port + offset, args, managed)
+        print(f"\n{'📌 with residency manager' if managed else '🔁 without residency manager'}")
+        print(f"   total: {elapsed:.2f}s, {len(latencies) / elapsed:.2f} turns/s")
+        print(f"   model loads: {stats['loads']} ({stats['load_seconds']:.1f}s loading)")
+        print(f"   turn p50: {percentile(latencies, 50):.2f}s, p95: {percentile(latencies, 95):.2f}s")
+        if manager is not None:
+            counters = manager.stats()
+            print(f"   held back: {counters['held']} requests ({counters['held_seconds']:.1f}s), "
+                  f"starved: {counters['starved']}, prewarms: {counters['prewarms']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
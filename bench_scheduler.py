@@ -0,0 +1,103 @@
+import sys
+import time
+import zlib
+import threading
+import argparse
+import stub_ollama
+from load_test import percentile
+from ollama_client import OllamaModel, get_transport, set_residency_manager, set_scheduler
+from residency import ResidencyManager, set_session
+from scheduler import RequestScheduler, prioritized
+
+# Throughput and fairness with and without the per-model request scheduler.
+#
+# N sessions hammer the stub at once with the agent's pattern: classify
+# (mistral) -> answer (phi or codellama) -> check (mistral). The stub runs
+# --num-parallel requests per model at once and queues the rest, and only
+# --max-loaded models fit in memory; the residency manager is on in both runs.
+# Without the scheduler every request goes straight to the server queue; with
+# it, requests queue per model on the client, classification first and
+# sessions taking turns.
+#
+#   python bench_scheduler.py [--sessions 12] [--turns 4] [--num-parallel 2]
+
+LOAD_SECONDS = {"mistral:latest": 0.3, "phi:latest": 0.2, "codellama:latest": 0.4}
+CLASSIFIER = "mistral:latest"
+CHECKER = "mistral:latest"
+
+
+def run_session(host, session, args, results):
+    set_session(session)
+    classifier = OllamaModel(CLASSIFIER, host=host)
+    checker = OllamaModel(CHECKER, host=host)
+    classify = prioritized("classify", lambda query: classifier.invoke(f"You are a classifier. {query}"))
+    check = prioritized("check", lambda draft: checker.invoke(f"Check this answer: {draft}"))
+    for turn in range(args.turns):
+        query = f"session {session} question {turn}"
+        answerer = OllamaModel("codellama:latest" if zlib.crc32(query.encode()) % 3 == 0 else "phi:latest", host=host)
+        answer = prioritized("process", answerer.invoke)
+        start = time.perf_counter()
+        classify(query)
+        results["classify"].append(time.perf_counter() - start)
+        check(answer(query))
+        results["turns"].append(time.perf_counter() - start)
+    results["finished"].append(time.perf_counter())
+
+
+def run(port, args, scheduled):
+    config = stub_ollama.StubConfig(tokens_per_second=args.tokens_per_second, response_tokens=args.response_tokens,
+                                    max_loaded_models=args.max_loaded, load_seconds=LOAD_SECONDS,
+                                    num_parallel=args.num_parallel)
+    stub = stub_ollama.serve(port, config, background=True)
+    host = f"http://127.0.0.1:{port}"
+    set_residency_manager(ResidencyManager(host=host, max_loaded=args.max_loaded))
+    scheduler = RequestScheduler(num_parallel=args.num_parallel) if scheduled else None
+    set_scheduler(scheduler)
+
+    results = {"classify": [], "turns": [], "finished": []}
+    threads = [threading.Thread(target=run_session, args=(host, session, args, results))
+               for session in range(args.sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    set_scheduler(None)
+    set_residency_manager(None)
+    stats = get_transport().request("GET", "/stub/stats", host=host)
+    stub.shutdown()
+    results["finished"] = [finished - start for finished in results["finished"]]
+    return elapsed, results, stats, scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-model request scheduler")
+    parser.add_argument("--sessions", type=int, default=12)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--num-parallel", type=int, default=2, help="requests per model the server runs at once")
+    parser.add_argument("--max-loaded", type=int, default=2)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 50)
+    args = parser.parse_args()
+
+    print(f"🧪 {args.sessions} sessions x {args.turns} turns, {args.num_parallel} parallel requests per model, "
+          f"{args.max_loaded} model(s) in memory")
+    for offset, scheduled in enumerate((False, True)):
+        elapsed, results, stats, scheduler = run(args.port + offset, args, scheduled)
+        print(f"\n{'🗓️ with request scheduler' if scheduled else '📨 straight to the server queue'}")
+        print(f"   total: {elapsed:.2f}s, {stats['tokens_generated'] / elapsed:.0f} tokens/s, "
+              f"{len(results['turns']) / elapsed:.2f} turns/s, {stats['loads']} model loads")
+        print(f"   turn p50: {percentile(results['turns'], 50):.2f}s, p95: {percentile(results['turns'], 95):.2f}s, "
+              f"classify p95: {percentile(results['classify'], 95):.2f}s")
+        print(f"   sessions finished between {min(results['finished']):.2f}s and {max(results['finished']):.2f}s")
+        if scheduler is not None:
+            counters = scheduler.stats()
+            print(f"   queued: {counters['queued']} requests, max queue depth: {counters['max_queue_depth']}, "
+                  f"promoted by aging: {counters['promoted']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import sys
+import time
+import tempfile
+import numpy as np
+from semantic_cache import SemanticCache
+
+# Lookup latency of the semantic cache at 10k / 100k / 1M entries.
+# Embedding time is excluded (random unit vectors stand in for the embedding
+# model), so the numbers are the cost of the index itself.
+#
+#   python bench_semantic_cache.py [dim]      (default dim 384; 1M x 768 needs ~3 GB)
+
+SIZES = [10_000, 100_000, 1_000_000]
+LOOKUPS = 200
+
+
+def random_unit_vectors(count, dim, rng):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench(size, dim, rng):
+    cache = SemanticCache(embed=None, folder=tempfile.mkdtemp(), max_entries=size)
+    # Fill the index directly: going through add() would only measure Python overhead
+    cache.vectors = random_unit_vectors(size, dim, rng)
+    cache.entries = [{"query": str(i), "response": str(i)} for i in range(size)]
+
+    queries = random_unit_vectors(LOOKUPS, dim, rng)
+    timings = []
+    for vector in queries:
+        start = time.perf_counter()
+        cache.search(vector)
+        timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings) * 1000
+    return np.percentile(timings, 50), np.percentile(timings, 95), np.percentile(timings, 99)
+
+
+if __name__ == "__main__":
+    dim = int(sys.argv[1]) if len(sys.argv) > 1 else 384
+    rng = np.random.default_rng(0)
+    print(f"Semantic cache lookup latency (dim={dim}, {LOOKUPS} lookups)")
+    print(f"{'entries':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for size in SIZES:
+        p50, p95, p99 = bench(size, dim, rng)
+        print(f"{size:>10} {p50:>10.3f} {p95:>10.3f} {p99:>10.3f}")
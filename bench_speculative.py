@@ -0,0 +1,109 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import urllib.request
+import stub_ollama
+from langchain_core.messages import HumanMessage
+from ollama_client import OllamaModel
+from prompts import system_prompt
+from router import normalize_label
+from speculative import Speculator, BOTH, LIKELY
+
+# Latency gained vs compute spent by speculative branch execution.
+#
+# Runs the same queries against the stub server with the classifier first
+# (the normal graph), with both branches speculated, and with only the branch
+# a cheap prior favours. The stub takes --prefill-tokens-per-second to
+# evaluate prompts, so the classifier (one output token) costs about as much
+# as its prompt, like on a real host. The stub's classifier always answers
+# natural_language; the prior here guesses "code" for queries that mention a
+# script, so --code-share controls how often the "likely" mode guesses wrong.
+#
+#   python bench_speculative.py [--queries 40] [--prefill-tokens-per-second 60]
+
+CLASSIFIER = system_prompt("You are a classifier. ONLY return one word: code or natural_language.")
+BRANCH_PROMPTS = {"code": system_prompt("You are an AI code assistant."),
+                  "natural_language": system_prompt("You are an AI that answers general knowledge questions.")}
+
+
+def make_queries(count, code_share):
+    every = max(1, round(1 / code_share)) if code_share else 0
+    return [f"Question {n}: how would a script handle case {n}?" if every and n % every == 0
+            else f"Question {n}: tell me about the history of place {n}." for n in range(count)]
+
+
+def prior(query):
+    p_code = 0.7 if "script" in query else 0.3
+    return {"code": p_code, "natural_language": 1.0 - p_code}
+
+
+async def run_mode(host, mode, queries):
+    classifier = OllamaModel("mistral:latest", host=host)
+    models = {"code": OllamaModel("codellama:latest", host=host),
+              "natural_language": OllamaModel("phi:latest", host=host)}
+    speculator = Speculator(mode) if mode else None
+    latencies = []
+    for query in queries:
+        async def classify():
+            return normalize_label(await classifier.ainvoke([CLASSIFIER, HumanMessage(content=query)]))
+        branches = {category: (model, [BRANCH_PROMPTS[category], HumanMessage(content=query)])
+                    for category, model in models.items()}
+
+        start = time.perf_counter()
+        if speculator is None:
+            model, messages = branches[await classify()]
+            await model.ainvoke(messages)
+        else:
+            await speculator.arun(classify, branches, prior(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, speculator.stats() if speculator else {}
+
+
+def stub_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stub/stats") as response:
+        return json.loads(response.read())
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and wasted tokens of speculative branch execution")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--code-share", type=float, default=0.25, help="share of queries the prior calls code")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=60)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 30)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries, args.code_share)
+    print(f"{'mode':<12}{'mean s':>9}{'p95 s':>9}{'hits':>7}{'wasted chunks':>14}{'server tok':>12}{'cancelled':>11}")
+    baseline = None
+    for offset, mode in enumerate((None, BOTH, LIKELY)):
+        port = args.port + offset
+        # Memory for every model: speculation only makes sense when the branches fit next to the classifier
+        config = stub_ollama.StubConfig(tokens_per_second=args.tokens_per_second, response_tokens=args.response_tokens,
+                                        prefill_tokens_per_second=args.prefill_tokens_per_second)
+        stub = stub_ollama.serve(port, config, background=True)
+        latencies, stats = asyncio.run(run_mode(f"http://127.0.0.1:{port}", mode, queries))
+        server = stub_stats(port)
+        stub.shutdown()
+
+        mean = sum(latencies) / len(latencies)
+        baseline = baseline or (mean, server["tokens_generated"])
+        hits = f"{stats['hit_ratio']:.0%}" if stats else "-"
+        print(f"{mode or 'off':<12}{mean:>9.3f}{percentile(latencies, 95):>9.3f}{hits:>7}"
+              f"{stats.get('wasted_chunks', 0):>14}{server['tokens_generated']:>12}{server['streams_cancelled']:>11}")
+        if mode:
+            print(f"{'':<12}latency {100 * (baseline[0] - mean) / baseline[0]:.0f}% lower, "
+                  f"server tokens {100 * (server['tokens_generated'] - baseline[1]) / baseline[1]:+.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import stub_ollama
+from load_test import QUERIES, percentile
+
+# End-to-end benchmark of the agent graphs against the stub Ollama server.
+#
+# Starts the stub in this process, then runs every (agent, scenario) in a fresh
+# worker process pointed at it through OLLAMA_HOST, in a temp folder (so no real
+# history or caches are touched, and no scenario starts with another one's
+# caches or memory):
+#
+#   single_turn    --queries turns, each with a fresh state (graph.invoke)
+#   conversation   --conversation-turns turns on one state, the history growing
+#   concurrent     --sessions sessions of --session-turns turns at once (graph.ainvoke)
+#   batch          --queries queries through batch_runner.BatchRunner
+#
+# Each result has the turn latency percentiles and throughput, the framework
+# overhead per turn (turn time not spent waiting for a chat call, and CPU time
+# of the worker, which does not include the stub's), memory (RSS at the end,
+# its growth during the scenario and the peak) and errors. With the stub at
+# --tokens-per-second 0 the latency is almost all overhead.
+#
+# Results are appended to RESULTS_PATH with the git commit and the stub
+# settings, and compared with the previous run of the same agent, scenario and
+# settings, so a regression shows up as a percentage.
+#
+#   python bench_suite.py [--agents pruebaollama7 configs/specialists.toml] [--scenarios single_turn conversation]
+#   python bench_suite.py --tokens-per-second 0 --error-rate 0.02 --seed 1
+
+FOLDER_NAME = "IA_assistant_history"
+RESULTS_PATH = os.path.join(FOLDER_NAME, "bench_results.jsonl")
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+AGENTS = ("configs/ollama_agent6.toml", "configs/specialists.toml", "pruebaollama7")
+SCENARIOS = ("single_turn", "conversation", "concurrent", "batch")
+RESULT_FILE = "bench_result.json"       # Written by the worker in its temp folder
+
+# Compared with the previous matching run (lower is better for all of them)
+COMPARED = ("p50_ms", "p95_ms", "overhead_ms", "cpu_ms", "peak_rss_mb")
+
+
+# ---------- worker (one agent, one scenario, in its own process) ----------
+
+def query(n):
+    return QUERIES[n % len(QUERIES)].format(n=n)
+
+
+def memory_mb():
+    """(current RSS, peak RSS) of this process in MB; None where the platform does not tell."""
+    current = peak = None
+    try:
+        with open("/proc/self/statm", "r") as file:
+            current = int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024    # KB on Linux
+    except ImportError:
+        pass
+    return current, peak
+
+
+class ModelTime:
+    """Chat calls and the seconds spent in them (an ollama_client observer)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, model, stats, seconds):
+        self.calls += 1
+        self.seconds += seconds
+
+
+def run_turn(agent, state, text, latencies, errors, session_id=None):
+    state["query"] = text
+    start = time.perf_counter()
+    try:
+        final_state = agent.graph.invoke(state)
+    except Exception as error:
+        errors.append(repr(error))
+        return state
+    latencies.append(time.perf_counter() - start)
+    agent.record_turn(text, final_state, session_id=session_id)
+    return final_state
+
+
+async def arun_session(agent, session, turns, latencies, errors):
+    state = agent.new_state()
+    for turn in range(turns):
+        text = query(session * turns + turn)
+        state["query"] = text
+        start = time.perf_counter()
+        try:
+            state = await agent.graph.ainvoke(state)
+        except Exception as error:
+            errors.append(repr(error))
+            continue
+        latencies.append(time.perf_counter() - start)
+        agent.record_turn(text, state, session_id=f"bench-{session}")
+
+
+def run_scenario(agent, scenario, args, latencies, errors):
+    """Runs the scenario; returns the number of turns attempted."""
+    if scenario == "single_turn":
+        for n in range(args.queries):
+            run_turn(agent, agent.new_state(), query(n), latencies, errors)
+        return args.queries
+    if scenario == "conversation":
+        state = agent.new_state()
+        for n in range(args.conversation_turns):
+            state = run_turn(agent, state, query(n), latencies, errors, session_id="bench")
+        return args.conversation_turns
+    if scenario == "concurrent":
+        async def run_all():
+            await asyncio.gather(*(arun_session(agent, session, args.session_turns, latencies, errors)
+                                   for session in range(args.sessions)))
+        asyncio.run(run_all())
+        return args.sessions * args.session_turns
+    if scenario == "batch":
+        from batch_runner import BatchRunner
+        runner = BatchRunner(agent, "batch_results.jsonl", args.concurrency)
+        try:
+            asyncio.run(runner.run([(str(n), query(n)) for n in range(args.queries)]))
+        finally:
+            runner.close()
+        with open("batch_results.jsonl", "r", encoding="utf-8") as file:
+            errors.extend(item["error"] for item in map(json.loads, file) if "error" in item)
+        return args.queries         # No per-turn latency: the queries advance stage by stage
+    raise ValueError(f"unknown scenario {scenario!r}")
+
+
+def worker(args):
+    from ollama_client import add_observer, transport_stats
+    from agent_builder import import_agent
+    agent_name = args.agent if not args.agent.endswith(".toml") else os.path.join(REPO, args.agent)
+    agent = import_agent(agent_name)
+    agent.graph      # Compile before measuring
+    model_time = ModelTime()
+    add_observer(model_time)
+    latencies, errors = [], []
+    rss_start, _ = memory_mb()
+    cpu_start, start = time.process_time(), time.perf_counter()
+    turns = run_scenario(agent, args.scenario, args, latencies, errors)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    rss, peak = memory_mb()
+    agent.shutdown()
+
+    answered = turns - len(errors)
+    result = {
+        "turns": turns, "errors": len(errors), "seconds": round(elapsed, 3),
+        "throughput": round(answered / elapsed, 2) if elapsed else 0.0,
+        "model_calls": model_time.calls,
+        "cpu_ms": round(1000 * cpu / turns, 2),
+        "rss_mb": round(rss, 1) if rss is not None else None,
+        "rss_growth_mb": round(rss - rss_start, 1) if rss is not None else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "transport": transport_stats(),
+        "first_errors": errors[:3],
+    }
+    if latencies:
+        result.update({f"p{q}_ms": round(1000 * percentile(latencies, q), 2) for q in (50, 95, 99)})
+        # Concurrent turns overlap, so this is the time per turn the turn spent outside a chat call
+        result["overhead_ms"] = round(1000 * (sum(latencies) - model_time.seconds) / len(latencies), 2)
+    with open(RESULT_FILE, "w", encoding="utf-8") as file:
+        json.dump(result, file)
+    return 0
+
+
+# ---------- parent ----------
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stub_settings(args):
+    return {"tokens_per_second": args.tokens_per_second, "response_tokens": args.response_tokens,
+            "chunk_tokens": args.chunk_tokens, "load_seconds": args.load_seconds,
+            "max_loaded_models": args.max_loaded_models, "num_parallel": args.num_parallel,
+            "error_rate": args.error_rate, "disconnect_rate": args.disconnect_rate, "seed": args.seed}
+
+
+def scenario_settings(args, scenario):
+    return {"single_turn": {"queries": args.queries},
+            "conversation": {"turns": args.conversation_turns},
+            "concurrent": {"sessions": args.sessions, "session_turns": args.session_turns},
+            "batch": {"queries": args.queries, "concurrency": args.concurrency}}[scenario]
+
+
+def run_worker(args, agent, scenario):
+    """Result dict of one worker process, or {"failed": ...} when it crashed."""
+    folder = tempfile.mkdtemp(prefix="bench_suite_")
+    python_path = os.pathsep.join(filter(None, [REPO, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{args.stub_port}", PYTHONPATH=python_path)
+    command = [sys.executable, os.path.join(REPO, "bench_suite.py"), "--worker", agent, scenario,
+               "--queries", str(args.queries), "--conversation-turns", str(args.conversation_turns),
+               "--sessions", str(args.sessions), "--session-turns", str(args.session_turns),
+               "--concurrency", str(args.concurrency)]
+    process = subprocess.run(command, cwd=folder, env=env, capture_output=True, text=True)
+    path = os.path.join(folder, RESULT_FILE)
+    if process.returncode != 0 or not os.path.exists(path):
+        return {"failed": (process.stderr.strip().splitlines() or [f"exit code {process.returncode}"])[-1]}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def previous_runs(path):
+    """{(agent, scenario, settings, stub settings): last result} of the results file."""
+    runs = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                runs[run_key(record)] = record
+    return runs
+
+
+def run_key(record):
+    return (record["agent"], record["scenario"], json.dumps(record["settings"], sort_keys=True),
+            json.dumps(record["stub"], sort_keys=True))
+
+
+def change(result, previous, key):
+    if result.get(key) is None or not previous.get(key):
+        return ""
+    return f" {100 * (result[key] - previous[key]) / previous[key]:+.0f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the agent graphs against the stub Ollama")
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), help="agent modules or configs/*.toml")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--queries", type=int, default=50, help="turns of single_turn and batch")
+    parser.add_argument("--conversation-turns", type=int, default=100)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--session-turns", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="queries in flight per batch stage")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--note", help="free text stored with the results")
+    stub = parser.add_argument_group("stub server")
+    stub.add_argument("--stub-port", type=int, default=stub_ollama.DEFAULT_PORT + 70)
+    stub.add_argument("--tokens-per-second", type=stub_ollama.parse_rates, default=stub_ollama.TOKENS_PER_SECOND)
+    stub.add_argument("--response-tokens", type=int, default=stub_ollama.RESPONSE_TOKENS)
+    stub.add_argument("--chunk-tokens", type=int, default=1)
+    stub.add_argument("--max-loaded-models", type=int)
+    stub.add_argument("--load-seconds", type=float, default=1.0)
+    stub.add_argument("--num-parallel", type=int)
+    stub.add_argument("--error-rate", type=float, default=0.0)
+    stub.add_argument("--disconnect-rate", type=float, default=0.0)
+    stub.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", nargs=2, metavar=("AGENT", "SCENARIO"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        args.agent, args.scenario = args.worker
+        return worker(args)
+
+    settings = stub_settings(args)
+    server = stub_ollama.serve(args.stub_port, stub_ollama.StubConfig(**settings), background=True)
+    previous = previous_runs(args.output)
+    commit = git_commit()
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    print(f"🧪 Stub at {settings['tokens_per_second']} tokens/s, {settings['response_tokens']}-token answers, "
+          f"error rate {settings['error_rate']:g}, disconnect rate {settings['disconnect_rate']:g}\n")
+    print(f"{'agent / scenario':<44}{'turns':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'turns/s':>9}"
+          f"{'ovh ms':>9}{'cpu ms':>9}{'peak MB':>9}{'errors':>8}")
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            for agent in args.agents:
+                for scenario in args.scenarios:
+                    record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "agent": agent,
+                              "scenario": scenario, "settings": scenario_settings(args, scenario), "stub": settings,
+                              "python": platform.python_version(), "note": args.note}
+                    record.update(run_worker(args, agent, scenario))
+                    output.write(json.dumps(record) + "\n")
+                    output.flush()
+                    name = f"{os.path.basename(agent)} / {scenario}"
+                    if "failed" in record:
+                        print(f"{name:<44}❌ {record['failed']}")
+                        continue
+
+                    def cell(key, width=9):
+                        return f"{record[key]:>{width}}" if record.get(key) is not None else f"{'-':>{width}}"
+
+                    print(f"{name:<44}{record['turns']:>6}{cell('p50_ms')}{cell('p95_ms')}{cell('p99_ms')}"
+                          f"{cell('throughput')}{cell('overhead_ms')}{cell('cpu_ms')}{cell('peak_rss_mb')}"
+                          f"{record['errors']:>8}")
+                    last = previous.get(run_key(record))
+                    if last is not None and "failed" not in last:
+                        changes = ", ".join(f"{key}{change(record, last, key)}" for key in COMPARED
+                                            if change(record, last, key))
+                        print(f"{'':<6}↳ vs {last.get('commit') or 'previous run'} ({last['time']}): {changes}")
+    finally:
+        server.shutdown()
+    print(f"\n📄 Results appended to: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import sys
+import time
+import asyncio
+import argparse
+import stub_ollama
+from langchain_core.messages import HumanMessage
+from ollama_client import OllamaModel
+from prompts import system_prompt
+from tool_calling import tool, ToolExecutor
+
+# Sequential vs parallel dispatch of the tool calls of one model answer.
+#
+# The stub answers multi-tool prompts with several native tool_calls; the
+# tools below wait like a network lookup would. Each prompt is a tool round
+# (model call, tools, one follow-up turn). Sequential dispatch pays the sum of
+# the tool latencies, parallel dispatch roughly the slowest one. The prompts
+# repeat, so the pure multiply tool is answered from its memo after round one.
+#
+#   python bench_tools.py [--prompts 20] [--tool-seconds 0.1]
+
+TOOL_SECONDS = 0.1
+SYSTEM = system_prompt("You are an assistant with tools. Call them for everything you need to look up.")
+
+
+def make_tools(seconds):
+    @tool
+    def exchange_rate(currency: str) -> str:
+        """Exchange rate of a currency against the euro."""
+        time.sleep(seconds)
+        return f"1 EUR = {1 + len(currency) / 10:.2f} {currency}"
+
+    @tool
+    def weather(city: str) -> str:
+        """Current weather in a city."""
+        time.sleep(seconds)
+        return f"{city}: {15 + len(city)} C"
+
+    @tool(pure=True)
+    def multiply(a: int, b: int) -> int:
+        """Multiply two integers."""
+        time.sleep(seconds / 10)
+        return a * b
+
+    return [exchange_rate, weather, multiply]
+
+
+def make_prompts(count):
+    cities = ["Paris", "Lima", "Oslo", "Quito", "Seoul"]
+    return [f"Plan a trip: weather(city={cities[n % 5]}) weather(city={cities[(n + 1) % 5]}) "
+            f"exchange_rate(currency=USD) exchange_rate(currency=PEN) and 3 x {80 + n % 4} euros for the hotel"
+            for n in range(count)]
+
+
+def run_sync(model, executor, prompts):
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        followup = executor.round(model, [SYSTEM, HumanMessage(content=prompt)])
+        model.invoke(followup)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run_async(model, executor, prompts):
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        followup = await executor.around(model, [SYSTEM, HumanMessage(content=prompt)])
+        await model.ainvoke(followup)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs parallel tool dispatch on multi-tool prompts")
+    parser.add_argument("--prompts", type=int, default=20)
+    parser.add_argument("--tool-seconds", type=float, default=TOOL_SECONDS, help="latency of each lookup tool")
+    parser.add_argument("--port", type=int, default=stub_ollama.DEFAULT_PORT + 40)
+    args = parser.parse_args()
+
+    stub = stub_ollama.serve(args.port, stub_ollama.StubConfig(tokens_per_second=400, response_tokens=20),
+                             background=True)
+    model = OllamaModel("mistral:latest", host=f"http://127.0.0.1:{args.port}")
+    prompts = make_prompts(args.prompts)
+
+    print(f"{'dispatch':<18}{'mean s':>9}{'tools s':>9}{'calls':>7}{'memo hits':>11}")
+    results = {}
+    for name, parallel, run in (("sequential", False, run_sync), ("parallel threads", True, run_sync),
+                                ("parallel asyncio", True, None)):
+        executor = ToolExecutor(make_tools(args.tool_seconds), parallel=parallel)
+        if run is None:
+            latencies = asyncio.run(run_async(model, executor, prompts))
+        else:
+            latencies = run(model, executor, prompts)
+        stats = executor.stats()
+        executor.close()
+        results[name] = sum(latencies) / len(latencies)
+        memo_hits = sum(tool["memo_hits"] for tool in stats["tools"].values())
+        print(f"{name:<18}{results[name]:>9.3f}{stats['seconds'] / stats['rounds']:>9.3f}"
+              f"{stats['calls']:>7}{memo_hits:>11}")
+    stub.shutdown()
+
+    speedup = results["sequential"] / results["parallel threads"]
+    print(f"\n⚡ Parallel dispatch: {speedup:.1f}x faster per tool round")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import threading
+import subprocess
+import importlib.util
+
+# Startup helpers for the agents.
+#
+# - lazy_import(name): the module object right away, the actual import on first
+#   attribute access, for heavy dependencies only some code paths need.
+# - profile_startup(module): imports the module in a fresh interpreter with
+#   python -X importtime and reports where the cold start goes, grouped by top
+#   level package. Every run is appended to startup_profile.jsonl and compared
+#   with the previous one, so startup regressions show up.
+#
+#   python bootstrap.py pruebaollama7            # or: python pruebaollama7.py --profile-startup
+
+FOLDER_NAME = "IA_assistant_history"
+PROFILE_PATH = os.path.join(FOLDER_NAME, "startup_profile.jsonl")
+TOP_PACKAGES = 12      # Packages listed in the breakdown
+
+_lazy_lock = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """Stands in for a module until an attribute is needed, then imports it and takes its attributes."""
+
+    def __getattr__(self, attribute):
+        # A lock rather than importlib.util.LazyLoader: before Python 3.12 a thread could see
+        # the LazyLoader module half-initialised while another one was importing it
+        with _lazy_lock:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazy_import(name):
+    """Module proxy that runs the import on first attribute access (thread-safe)."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named {name!r}")
+    return _LazyModule(name)
+
+
+def import_times(module):
+    """
+    [(name, self us, cumulative us)] of every module imported by `import module`
+    in a fresh interpreter, plus its exit code (e.g. a script that needs stdin).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows, result.returncode
+
+
+def startup_profile(module):
+    """{"total_ms", "body_ms", "packages": {top level package: ms}} of importing module."""
+    start = time.perf_counter()
+    rows, returncode = import_times(module)
+    wall = time.perf_counter() - start
+    packages = {}
+    total_ms = body_ms = 0.0
+    for name, self_us, cumulative_us in rows:
+        if name == module:
+            total_ms, body_ms = cumulative_us / 1000, self_us / 1000
+            continue
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_us / 1000
+    packages = dict(sorted(packages.items(), key=lambda item: -item[1]))
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "module": module, "total_ms": round(total_ms, 1),
+            "body_ms": round(body_ms, 1), "interpreter_s": round(wall, 3), "returncode": returncode,
+            "packages": {package: round(ms, 1) for package, ms in packages.items()}}
+
+
+def previous_profile(module, path=PROFILE_PATH):
+    last = None
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("module") == module:
+                    last = record
+    return last
+
+
+def profile_startup(module, path=PROFILE_PATH, top=TOP_PACKAGES):
+    """Print the import-time breakdown of module, record it and compare with the last run."""
+    profile = startup_profile(module)
+    previous = previous_profile(module, path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(profile) + "\n")
+
+    total = profile["total_ms"] or 1.0
+    print(f"⏱️ import {module}: {profile['total_ms']:.0f} ms "
+          f"({profile['body_ms']:.0f} ms in its own body, {profile['interpreter_s']:.2f}s with the interpreter)")
+    if profile["returncode"]:
+        print(f"⚠️ The import exited with code {profile['returncode']} (does it read input at import time?)")
+    for package, ms in list(profile["packages"].items())[:top]:
+        change = ""
+        if previous is not None:
+            change = f"{ms - previous['packages'].get(package, 0.0):+9.0f} ms"
+        print(f"   {package:<28}{ms:9.0f} ms{100 * ms / total:6.0f}%{change}")
+    if previous is not None:
+        print(f"📈 vs {previous['time']}: {profile['total_ms'] - previous['total_ms']:+.0f} ms total")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown of an agent module")
+    parser.add_argument("module", nargs="?", default="pruebaollama7")
+    parser.add_argument("--top", type=int, default=TOP_PACKAGES)
+    args = parser.parse_args()
+    return profile_startup(args.module, top=args.top)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import struct
+import threading
+
+# Append-only chat history store.
+#
+# Turns are written as JSON lines into fixed-size segments
+# (segment-000000.jsonl, segment-000001.jsonl, ...). Every segment has a
+# sidecar .idx file with one 8-byte offset per turn, so turn N is found with
+# two seeks instead of loading the whole history. One store can be shared by
+# threads: appends (and segment rollover) run under a lock.
+
+FOLDER_NAME = "IA_assistant_history"
+STORE_NAME = "chat_history"
+LEGACY_FILE_NAME = "chat_history.json"   # Old format: one big JSON array
+MIGRATION_MARKER = "migrating"           # In the store while the legacy file is being imported
+
+SEGMENT_SIZE = 100_000    # Turns per segment file
+FSYNC_EVERY = 16          # fsync after this many unsynced turns...
+FSYNC_INTERVAL = 2.0      # ...or after this many seconds, whatever comes first
+
+_OFFSET = struct.Struct("<Q")
+
+
+class ChatHistoryStore:
+    """
+    Append-only, indexed store for the conversation log.
+    Appends are O(1), turn N can be read without loading the rest,
+    and a legacy chat_history.json is migrated the first time the store is opened.
+    """
+
+    def __init__(self, folder=FOLDER_NAME, name=STORE_NAME,
+                 fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = os.path.join(folder, name)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        os.makedirs(self.path, exist_ok=True)
+
+        self._count = 0
+        self._data = None          # Open handles of the last (writable) segment
+        self._index = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.RLock()
+
+        self._open_last_segment()
+        self._migrate_legacy(os.path.join(folder, LEGACY_FILE_NAME))
+
+    # ---------- segment helpers ----------
+
+    def _segment_paths(self, segment):
+        base = os.path.join(self.path, f"segment-{segment:06d}")
+        return base + ".jsonl", base + ".idx"
+
+    def _segments(self):
+        segments = []
+        for file_name in os.listdir(self.path):
+            if file_name.startswith("segment-") and file_name.endswith(".jsonl"):
+                segments.append(int(file_name[len("segment-"):-len(".jsonl")]))
+        return sorted(segments)
+
+    def _open_last_segment(self):
+        segments = self._segments()
+        last = segments[-1] if segments else 0
+        # Every segment before the last one is full by construction
+        self._count = last * SEGMENT_SIZE
+        self._open_segment(last)
+
+    def _open_segment(self, segment):
+        data_path, index_path = self._segment_paths(segment)
+        self._data = open(data_path, "ab+")
+        self._index = open(index_path, "ab+")
+        self._count += self._recover()
+
+    def _recover(self):
+        """
+        Make the segment and its index agree after a crash.
+        A half-written last line is dropped, missing index entries are rebuilt
+        and index entries pointing past the data are discarded.
+        Returns the number of valid turns in the segment.
+        """
+        data, index = self._data, self._index
+
+        # Drop a partial trailing line (no newline = the write never finished)
+        data.seek(0, os.SEEK_END)
+        size = data.tell()
+        if size:
+            data.seek(size - 1)
+            if data.read(1) != b"\n":
+                data.seek(0)
+                content = data.read()
+                size = content.rfind(b"\n") + 1
+                data.truncate(size)
+
+        # Keep only whole index entries that point inside the data file
+        index.seek(0, os.SEEK_END)
+        entries = index.tell() // _OFFSET.size
+        index.seek(0)
+        offsets = [_OFFSET.unpack(index.read(_OFFSET.size))[0] for _ in range(entries)]
+        while offsets and offsets[-1] >= size:
+            offsets.pop()
+
+        # Re-index lines written after the last index entry
+        position = 0
+        if offsets:
+            data.seek(offsets[-1])
+            position = offsets[-1] + len(data.readline())
+        data.seek(position)
+        while position < size:
+            offsets.append(position)
+            position += len(data.readline())
+
+        if len(offsets) != entries:
+            index.truncate(0)
+            index.write(b"".join(_OFFSET.pack(offset) for offset in offsets))
+            index.flush()
+            os.fsync(index.fileno())
+        return len(offsets)
+
+    def _migrate_legacy(self, legacy_path):
+        """
+        One-time import of the old JSON array file into the store. A marker file
+        lives in the store while the import runs, so an import cut short by a
+        crash resumes where it stopped on the next start.
+        """
+        marker = os.path.join(self.path, MIGRATION_MARKER)
+        migrating = os.path.exists(marker)
+        if not os.path.exists(legacy_path):
+            if migrating:
+                os.remove(marker)    # Crashed after the rename: the import was complete
+            return
+        if self._count and not migrating:
+            return
+        if not migrating:
+            with open(marker, "w") as f:
+                f.write(legacy_path)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(legacy_path, "r") as f:
+            try:
+                records = json.load(f)
+            except json.JSONDecodeError:
+                records = []    # Empty or corrupt file, nothing to import
+        done = self._count      # Turns imported before an interrupted run stopped
+        for record in records[done:]:
+            self.append(record, sync=False)
+        self.flush(sync=True)
+        os.replace(legacy_path, legacy_path + ".migrated")
+        os.remove(marker)
+        resumed = f" (resumed after {done})" if done else ""
+        print(f"📦 Migrated {len(records)} turns from {legacy_path} to {self.path}{resumed}")
+
+    # ---------- public API ----------
+
+    def append(self, record, sync=True):
+        """Append one turn (a JSON-serialisable dict) and return its turn number."""
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._count and self._count % SEGMENT_SIZE == 0:
+                self.flush(sync=True)
+                self._data.close()
+                self._index.close()
+                self._open_segment(self._count // SEGMENT_SIZE)
+
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(line)
+            self._index.write(_OFFSET.pack(offset))
+            self._count += 1
+            self._unsynced += 1
+
+            # Data goes to the OS every turn; fsync is batched
+            self.flush(sync=sync and (self._unsynced >= self.fsync_every or
+                                      time.monotonic() - self._last_sync >= self.fsync_interval))
+            return self._count - 1
+
+    def flush(self, sync=False):
+        """Flush buffered writes; with sync=True also fsync them to disk."""
+        # The data file is synced before the index so the index never points at lost data
+        with self._lock:
+            self._data.flush()
+            if sync:
+                os.fsync(self._data.fileno())
+            self._index.flush()
+            if sync:
+                os.fsync(self._index.fileno())
+                self._unsynced = 0
+                self._last_sync = time.monotonic()
+
+    def get(self, n):
+        """Return turn number n (negative numbers count from the end)."""
+        if n < 0:
+            n += self._count
+        if not 0 <= n < self._count:
+            raise IndexError(f"turn {n} out of range")
+
+        segment, position = divmod(n, SEGMENT_SIZE)
+        self.flush()    # The turn may still be sitting in our write buffer
+        data_path, index_path = self._segment_paths(segment)
+        with open(index_path, "rb") as index:
+            index.seek(position * _OFFSET.size)
+            offset, = _OFFSET.unpack(index.read(_OFFSET.size))
+        with open(data_path, "rb") as data:
+            data.seek(offset)
+            return json.loads(data.readline())
+
+    def tail(self, k):
+        """Return the last k turns, oldest first."""
+        count = self._count
+        return [self.get(n) for n in range(max(0, count - k), count)]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, n):
+        return self.get(n)
+
+    def __iter__(self):
+        """Stream every turn in order without loading the whole history."""
+        self.flush()
+        for segment in self._segments():
+            data_path, _ = self._segment_paths(segment)
+            with open(data_path, "rb") as data:
+                for line in data:
+                    yield json.loads(line)
+
+    def close(self):
+        with self._lock:
+            if self._data and not self._data.closed:
+                self.flush(sync=True)
+                self._data.close()
+                self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,98 @@
+import json
+import threading
+from ollama_client import OLLAMA_HOST, get_model
+from router import CATEGORIES, normalize_label
+from reasoning import find_label
+
+# Classification with a guaranteed-valid label.
+#
+# Parsing a free-text answer ("code" in text, or an equality test on .strip())
+# mis-routes any verbose answer, and the model keeps generating until it decides
+# to stop. Here the classifier runs with Ollama's structured output: `format` is
+# a JSON schema whose only field is an enum of the categories, so the grammar
+# lets the model write nothing but {"category": "<one of them>"}, with no
+# <think> block and no explanation, and num_predict is capped just above that.
+# Routing becomes a bounded, near-single-token generation.
+#
+# (Scoring each label's log-likelihood in one prefill-only request would be
+# cheaper still, but /api/chat does not return prompt log-probabilities.)
+#
+#   classify, aclassify = label_classifier("mistral:latest", prompt)
+#   classify("How do I reverse a list in Python?")    # -> "code"
+
+LABEL_KEY = "category"
+LABEL_NUM_PREDICT = 16        # {"category": "natural_language"} is ~10 tokens; the grammar makes it close right after
+
+
+def label_schema(labels=CATEGORIES):
+    """JSON schema of an answer that is exactly one of labels."""
+    return {"type": "object",
+            "properties": {LABEL_KEY: {"type": "string", "enum": list(labels)}},
+            "required": [LABEL_KEY]}
+
+
+def label_model(model, labels=CATEGORIES, **settings):
+    """Shared handle of model (a name or a handle, whose settings are kept) that can only answer with one of labels."""
+    if not isinstance(model, str):
+        for name, default in (("keep_alive", None), ("system", None), ("host", OLLAMA_HOST)):
+            if getattr(model, name) != default:
+                settings.setdefault(name, getattr(model, name))
+        settings = dict(model.options, **settings)
+        model = model.model
+    settings.update(format=label_schema(labels), num_predict=LABEL_NUM_PREDICT, temperature=0)
+    return get_model(model, **settings)
+
+
+class LabelStats:
+    """How often the structured answer was not a valid label (older servers ignore `format`)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"classifications": 0, "invalid": 0}
+
+    def add(self, valid):
+        with self._lock:
+            self.counters["classifications"] += 1
+            self.counters["invalid"] += not valid
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+label_stats = LabelStats()
+
+
+def parse_label(text, labels=CATEGORIES):
+    """
+    The label of a structured answer. Free text (a server that ignores `format`)
+    falls back to normalize_label(), or for other label sets to the first label
+    it mentions, else the last label.
+    """
+    try:
+        label = json.loads(text).get(LABEL_KEY)
+    except (ValueError, AttributeError):
+        label = None
+    label_stats.add(label in labels)
+    if label in labels:
+        return label
+    if tuple(labels) == CATEGORIES:
+        return normalize_label(text)
+    return find_label(text, labels) or labels[-1]
+
+
+def label_classifier(model, prompt=None, labels=CATEGORIES, **settings):
+    """(classify, aclassify) for query strings, with a schema-constrained model."""
+    handle = label_model(model, labels, **settings)
+
+    def messages(query):
+        return ([prompt] if prompt else []) + [{"role": "user", "content": query}]
+
+    def classify(query):
+        return parse_label(handle.invoke(messages(query)), labels)
+
+    async def aclassify(query):
+        return parse_label(await handle.ainvoke(messages(query)), labels)
+
+    classify.model = aclassify.model = handle
+    return classify, aclassify
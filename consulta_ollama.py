@@ -1,9 +1,6 @@
-import requests
 import json
 import os
-
-# Definir la URL del endpoint de la API local de Ollama
-url = "http://localhost:11434/api/generate"
+from ollama_client import get_transport, OllamaError
 
 # Definir el cuerpo de la solicitud
 data = {
@@ -12,19 +9,16 @@ data = {
     "stream": False
 }
 
-# Definir los encabezados de la solicitud
-headers = {
-    "Content-Type": "application/json"
-}
-
-# Enviar la solicitud POST a la API
-response = requests.post(url, headers=headers, data=json.dumps(data))
+# Enviar la solicitud POST a la API local de Ollama (conexión compartida y reutilizable)
+try:
+    resultado = get_transport().request("POST", "/api/generate", data)
+    error = None
+except OllamaError as e:
+    resultado = None
+    error = e
 
 # Verificar si la solicitud fue exitosa
-if response.status_code == 200:
-    # Convertir la respuesta a JSON
-    resultado = response.json()
-
+if error is None:
     # Nombre del archivo donde se guardarán todas las respuestas
     file_name = "respuestas_acumuladas.json"
 
@@ -46,8 +40,8 @@ if response.status_code == 200:
     print(resultado["response"])
 
 else:
-    print(f"Error en la solicitud: {response.status_code}")
-    print(response.text)
+    print(f"Error en la solicitud: {error.status}")
+    print(error)
 
 
 ### Obtener info del JSON
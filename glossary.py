@@ -0,0 +1,399 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from collections import deque
+from bootstrap import lazy_import
+
+np = lazy_import("numpy")     # Only needed to read / write the cached automaton
+
+# Glossary of domain terms for unknown_word_checker.
+#
+# Terms and definitions live in SQLite; matching uses an Aho-Corasick automaton
+# over the case-folded terms, so one pass over the query finds every term no
+# matter how many there are. Matches must sit on word boundaries ("GAN" does
+# not fire inside "began"). The automaton is cached next to the store in an
+# .npz file and rebuilt only when the term list changed: triggers bump a
+# version number on every insert/delete, and a running agent notices it and
+# rebuilds in the background (hot reload) while the old automaton keeps serving.
+#
+#   python glossary.py add qubit "The basic unit of quantum information."
+#   python glossary.py import terms.tsv          # term<TAB>definition per line
+#   python glossary.py remove qubit
+#   python glossary.py bench [--terms 100000]    # build / load / match times vs the old loop
+
+FOLDER_NAME = "IA_assistant_history"
+GLOSSARY_PATH = os.path.join(FOLDER_NAME, "glossary.sqlite")
+
+RELOAD_CHECK_SECONDS = 2.0    # How often match() looks at the store's version
+SHIFT = 21                    # Transition key = node << SHIFT | code point (Unicode fits in 21 bits)
+
+
+def normalize_term(term):
+    """Matching key of a term: case-folded, inner whitespace collapsed."""
+    return " ".join(term.casefold().split())
+
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton. Transitions are one flat dict {node << SHIFT | code point: child}
+    (fast to rebuild from arrays); out[node] is the term id ending there (-1 if none) and
+    link[node] the nearest node on the failure chain with an output.
+    """
+
+    def __init__(self, edges, fail, out, link, depth, word_edges):
+        self.edges = edges
+        self.fail = fail
+        self.out = out
+        self.link = link
+        self.depth = depth
+        self.word_edges = word_edges    # Per node: (first char is a word char, last char is a word char)
+
+    @classmethod
+    def build(cls, terms):
+        """terms: iterable of (id, normalized term)."""
+        edges = {}
+        children = [[]]
+        out, depth, word_edges = [-1], [0], [(False, False)]
+        for term_id, key in terms:
+            node = 0
+            for ch in key:
+                transition = node << SHIFT | ord(ch)
+                child = edges.get(transition)
+                if child is None:
+                    child = len(out)
+                    edges[transition] = child
+                    children[node].append((ord(ch), child))
+                    children.append([])
+                    out.append(-1)
+                    depth.append(depth[node] + 1)
+                    word_edges.append((False, False))
+                node = child
+            if node:
+                out[node] = term_id
+                word_edges[node] = (is_word_char(key[0]), is_word_char(key[-1]))
+
+        fail = [0] * len(out)
+        link = [-1] * len(out)
+        queue = deque(child for _, child in children[0])
+        while queue:
+            node = queue.popleft()
+            for code, child in children[node]:
+                state = fail[node]
+                while state and (state << SHIFT | code) not in edges:
+                    state = fail[state]
+                target = edges.get(state << SHIFT | code, 0)
+                fail[child] = target
+                link[child] = target if out[target] >= 0 else link[target]
+                queue.append(child)
+        return cls(edges, fail, out, link, depth, word_edges)
+
+    def save(self, path, state):
+        keys = np.fromiter(self.edges.keys(), dtype=np.int64, count=len(self.edges))
+        values = np.fromiter(self.edges.values(), dtype=np.int32, count=len(self.edges))
+        temporary = path + ".tmp.npz"
+        np.savez(temporary, state=np.array(state, dtype=np.int64), keys=keys, values=values,
+                 fail=np.array(self.fail, dtype=np.int32), out=np.array(self.out, dtype=np.int64),
+                 link=np.array(self.link, dtype=np.int32), depth=np.array(self.depth, dtype=np.int32),
+                 word_edges=np.array(self.word_edges, dtype=bool).reshape(-1, 2))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, state):
+        """The cached automaton, or None when it was built for another version of the store."""
+        try:
+            with np.load(path) as cached:
+                if cached["state"].tolist() != list(state):
+                    return None
+                edges = dict(zip(cached["keys"].tolist(), cached["values"].tolist()))
+                word_edges = [tuple(pair) for pair in cached["word_edges"].tolist()]
+                return cls(edges, cached["fail"].tolist(), cached["out"].tolist(), cached["link"].tolist(),
+                           cached["depth"].tolist(), word_edges)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def find(self, text):
+        """[(start, end, term id)] of the terms in text (already case-folded), on word boundaries."""
+        edges, fail, out, link, depth = self.edges, self.fail, self.out, self.link, self.depth
+        found = []
+        node = 0
+        for end, ch in enumerate(text, start=1):
+            code = ord(ch)
+            while True:
+                child = edges.get(node << SHIFT | code)
+                if child is not None:
+                    node = child
+                    break
+                if not node:
+                    break
+                node = fail[node]
+            hit = node if out[node] >= 0 else link[node]
+            while hit >= 0:
+                start = end - depth[hit]
+                word_start, word_end = self.word_edges[hit]
+                if not (word_start and start > 0 and is_word_char(text[start - 1])) and \
+                        not (word_end and end < len(text) and is_word_char(text[end])):
+                    found.append((start, end, out[hit]))
+                hit = link[hit]
+        return found
+
+    def __len__(self):
+        return len(self.out)
+
+
+class Glossary:
+    """Term store + automaton, opened on first use and reloaded when the terms change."""
+
+    def __init__(self, path=GLOSSARY_PATH, seed=None, reload_check=RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.seed = seed              # {term: definition} written into a new store (version 0) only
+        self.reload_check = reload_check
+        self._db = None
+        self._lock = threading.Lock()
+        self._automaton = None
+        self._state = None            # (version, terms, max id) the automaton was built for
+        self._checked = 0.0
+        self._rebuilding = None
+        self.counters = {"matches": 0, "hits": 0, "reloads": 0, "builds": 0, "cache_loads": 0}
+        self.seconds = {"match": 0.0, "build": 0.0, "load": 0.0}
+
+    # ---------- store ----------
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS terms (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                term TEXT NOT NULL,
+                definition TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (version INTEGER NOT NULL);
+            INSERT INTO meta SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM meta);
+            CREATE TRIGGER IF NOT EXISTS terms_inserted AFTER INSERT ON terms
+                BEGIN UPDATE meta SET version = version + 1; END;
+            CREATE TRIGGER IF NOT EXISTS terms_deleted AFTER DELETE ON terms
+                BEGIN UPDATE meta SET version = version + 1; END;
+            CREATE TRIGGER IF NOT EXISTS terms_renamed AFTER UPDATE OF key ON terms
+                BEGIN UPDATE meta SET version = version + 1; END;
+        """)
+        self._db = db
+        # Seed a store that never had a term: terms removed later must stay removed
+        if self.seed and db.execute("SELECT version FROM meta").fetchone()[0] == 0:
+            self._write(self.seed.items(), replace=False)
+        return db
+
+    def _write(self, items, replace=True):
+        conflict = "DO UPDATE SET term = excluded.term, definition = excluded.definition" if replace else "DO NOTHING"
+        rows = ((normalize_term(term), term, definition) for term, definition in items)
+        with self._lock:
+            with self._db:
+                self._db.executemany(f"INSERT INTO terms (key, term, definition) VALUES (?, ?, ?) "
+                                     f"ON CONFLICT(key) {conflict}", (row for row in rows if row[0]))
+
+    def add(self, term, definition):
+        self.add_many([(term, definition)])
+
+    def add_many(self, items):
+        """Insert or update (term, definition) pairs; only new terms trigger a rebuild."""
+        self._connect()
+        self._write(items)
+
+    def remove(self, term):
+        self._connect()
+        with self._lock:
+            with self._db:
+                return self._db.execute("DELETE FROM terms WHERE key = ?", (normalize_term(term),)).rowcount
+
+    def _store_state(self):
+        with self._lock:
+            return self._db.execute("SELECT version, (SELECT COUNT(*) FROM terms), "
+                                    "(SELECT COALESCE(MAX(id), 0) FROM terms) FROM meta").fetchone()
+
+    def definitions(self, term_ids):
+        with self._lock:
+            placeholders = ",".join("?" * len(term_ids))
+            rows = self._db.execute(f"SELECT id, term, definition FROM terms WHERE id IN ({placeholders})",
+                                    list(term_ids)).fetchall()
+        return {term_id: (term, definition) for term_id, term, definition in rows}
+
+    # ---------- automaton ----------
+
+    def _cache_path(self):
+        return os.path.splitext(self.path)[0] + ".automaton.npz"
+
+    def _load_automaton(self, state):
+        """Automaton for the given store state: from the disk cache, or built and cached."""
+        start = time.perf_counter()
+        automaton = Automaton.load(self._cache_path(), state)
+        if automaton is not None:
+            self.counters["cache_loads"] += 1
+            self.seconds["load"] += time.perf_counter() - start
+            return automaton
+        with self._lock:
+            terms = self._db.execute("SELECT id, key FROM terms").fetchall()
+        automaton = Automaton.build(terms)
+        automaton.save(self._cache_path(), state)
+        self.counters["builds"] += 1
+        self.seconds["build"] += time.perf_counter() - start
+        return automaton
+
+    def _rebuild(self, state):
+        try:
+            automaton = self._load_automaton(state)
+            self._automaton, self._state = automaton, state
+            self.counters["reloads"] += 1
+        finally:
+            self._rebuilding = None
+
+    def _current(self):
+        """The automaton to match with; starts a background rebuild when the store changed."""
+        if self._automaton is None:
+            self._connect()
+            state = self._store_state()
+            self._automaton, self._state = self._load_automaton(state), state    # First use: load now
+            self._checked = time.monotonic()
+        elif time.monotonic() - self._checked >= self.reload_check:
+            self._checked = time.monotonic()
+            state = self._store_state()
+            if state != self._state and self._rebuilding is None:
+                self._rebuilding = threading.Thread(target=self._rebuild, args=(state,), daemon=True)
+                self._rebuilding.start()
+        return self._automaton
+
+    def reload(self):
+        """Rebuild now if the term list changed (the agent also does it on its own)."""
+        self._connect()
+        state = self._store_state()
+        if state != self._state:
+            self._rebuild(state)
+
+    # ---------- matching ----------
+
+    def find(self, text):
+        """[(term, definition)] of the glossary terms in text, each once, in order of appearance."""
+        start = time.perf_counter()
+        matches = self._current().find(normalize_term(text))
+        ids = list(dict.fromkeys(term_id for _, _, term_id in matches))
+        found = []
+        if ids:
+            definitions = self.definitions(ids)
+            found = [definitions[term_id] for term_id in ids if term_id in definitions]
+        self.counters["matches"] += 1
+        self.counters["hits"] += len(found)
+        self.seconds["match"] += time.perf_counter() - start
+        return found
+
+    def stats(self):
+        automaton = self._automaton
+        matches = self.counters["matches"]
+        return dict(self.counters,
+                    terms=self._state[1] if self._state else None,
+                    nodes=len(automaton) if automaton else 0,
+                    build_s=round(self.seconds["build"], 3),
+                    load_s=round(self.seconds["load"], 3),
+                    avg_match_ms=1000 * self.seconds["match"] / matches if matches else 0.0)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# ---------- command line ----------
+
+def read_terms(path):
+    """(term, definition) pairs from a TSV file."""
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            term, _, definition = line.rstrip("\n").partition("\t")
+            if term.strip():
+                yield term.strip(), definition.strip()
+
+
+def bench(count, queries=1000):
+    """Build / cache load / match times for a synthetic glossary, and the old substring loop."""
+    rng = np.random.default_rng(0)
+    syllables = ["qua", "ten", "lor", "bit", "gan", "zor", "mex", "tri", "pol", "vin", "dar", "sul"]
+    words = {"".join(rng.choice(syllables, size=rng.integers(2, 5))) + str(n) for n in range(count)}
+    terms = {word: f"definition of {word}" for word in words}
+    sample = list(words)[:queries]
+    texts = [f"What does {word} mean in the context of quantum computing and entropy?" for word in sample]
+
+    with tempfile.TemporaryDirectory() as folder:
+        glossary = Glossary(os.path.join(folder, "glossary.sqlite"))
+        start = time.perf_counter()
+        glossary.add_many(terms.items())
+        stored = time.perf_counter() - start
+
+        start = time.perf_counter()
+        glossary.find("warm up")
+        built = time.perf_counter() - start
+        glossary.close()
+
+        cached = Glossary(os.path.join(folder, "glossary.sqlite"))
+        start = time.perf_counter()
+        cached.find("warm up")
+        loaded = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = sum(len(cached.find(text)) for text in texts)
+        matched = time.perf_counter() - start
+        print(f"🗂️ {len(terms)} terms: stored in {stored:.2f}s, automaton of {cached.stats()['nodes']} nodes "
+              f"built in {built:.2f}s, loaded from cache in {loaded:.2f}s")
+        print(f"⚡ Automaton: {1000 * matched / len(texts):.3f} ms per query ({hits} terms found)")
+        cached.close()
+
+    # The old unknown_word_checker: a substring test per term, lowercasing the input every time
+    start = time.perf_counter()
+    subset = texts[:max(1, queries // 100)]
+    for text in subset:
+        [word for word in terms if word.lower() in text.lower()]
+    print(f"🐢 Substring loop: {1000 * (time.perf_counter() - start) / len(subset):.3f} ms per query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage and benchmark the glossary of domain terms")
+    parser.add_argument("--path", default=GLOSSARY_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add or update a term")
+    add.add_argument("term")
+    add.add_argument("definition")
+    load = commands.add_parser("import", help="add terms from a term<TAB>definition file")
+    load.add_argument("file")
+    remove = commands.add_parser("remove", help="remove a term")
+    remove.add_argument("term")
+    benchmark = commands.add_parser("bench", help="build / load / match times on a synthetic glossary")
+    benchmark.add_argument("--terms", type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.terms)
+        return 0
+    glossary = Glossary(args.path)
+    if args.command == "add":
+        glossary.add(args.term, args.definition)
+        print(f"✅ Added '{args.term}'")
+    elif args.command == "import":
+        glossary.add_many(read_terms(args.file))
+        print(f"✅ Imported {args.file}")
+    elif args.command == "remove":
+        removed = glossary.remove(args.term)
+        print(f"✅ Removed '{args.term}'" if removed else f"❌ '{args.term}' is not in the glossary")
+    glossary.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import stub_ollama
+
+# Load test for assistant_server.py against the stub Ollama server.
+#
+# Starts the stub in this process and the assistant server as a subprocess
+# (pointed at the stub through OLLAMA_HOST, working in a temp folder so no real
+# history or caches are touched), then runs N concurrent sessions with M turns
+# each and reports throughput and latency percentiles.
+#
+#   python load_test.py --sessions 100 --turns 5
+
+QUERIES = [
+    "Tell me about the history of Rome, part {n}.",
+    "How do I write a loop in Python? Example {n}.",
+    "Why is the sky blue? Question {n}.",
+    "Write a SQL query that joins two tables, variant {n}.",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+async def post_json(reader, writer, path, payload):
+    """One request on a keep-alive connection; returns (status, json body)."""
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_session(port, session, turns, latencies, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for turn in range(turns):
+            query = QUERIES[(session + turn) % len(QUERIES)].format(n=f"{session}-{turn}")
+            start = time.perf_counter()
+            status, _ = await post_json(reader, writer, "/chat", {"session_id": f"load-{session}", "query": query})
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(port, sessions, turns):
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(port, s, turns, latencies, statuses) for s in range(sessions)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the assistant server against a stub Ollama")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--stub-port", type=int, default=stub_ollama.DEFAULT_PORT)
+    parser.add_argument("--tokens-per-second", type=float, default=stub_ollama.TOKENS_PER_SECOND)
+    parser.add_argument("--agent", default="pruebaollama7")
+    args = parser.parse_args()
+
+    stub = stub_ollama.serve(args.stub_port, stub_ollama.StubConfig(tokens_per_second=args.tokens_per_second),
+                             background=True)
+    repo = os.path.dirname(os.path.abspath(__file__))
+    python_path = os.pathsep.join(filter(None, [repo, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{args.stub_port}", PYTHONPATH=python_path)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(repo, "assistant_server.py"), "--port", str(args.port), "--agent", args.agent],
+        cwd=tempfile.mkdtemp(prefix="load_test_"), env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port, server)
+        latencies, statuses, elapsed = asyncio.run(run_load(args.port, args.sessions, args.turns))
+    finally:
+        server.terminate()
+        server.wait()
+        stub.shutdown()
+
+    print(f"\n📈 {args.sessions} sessions x {args.turns} turns in {elapsed:.2f}s")
+    print(f"   statuses: {statuses}")
+    print(f"   throughput: {len(latencies) / elapsed:.1f} turns/s")
+    for q in (50, 95, 99):
+        print(f"   p{q}: {1000 * percentile(latencies, q):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
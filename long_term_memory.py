@@ -0,0 +1,360 @@
+import os
+import json
+import math
+import time
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ollama_client import OllamaError
+from bootstrap import lazy_import
+
+np = lazy_import("numpy")
+
+# Long-term memory: retrieval over every past turn of the history store.
+#
+# The models only get the last few exchanges as chat history (ConversationMemory).
+# Older turns are chunked, embedded and appended to an on-disk index, and for
+# each query the top-k most similar past exchanges are put in front of the
+# question, so relevant old context comes back without sending the whole log.
+#
+# On disk (IA_assistant_history/long_term_memory/):
+#   vectors.f32    unit-normalised float32 rows, appended to and memory-mapped
+#   rows.i64       per row: turn number in the store, session tag, IVF list
+#   centroids.npy  IVF centroids (spherical k-means), once there are IVF_MIN_ROWS rows
+#   meta.json      row count, dimension, indexed store turns; rows past its count
+#                  (a crash mid-append) are dropped and re-indexed
+#
+# Below IVF_MIN_ROWS a query scans every row. Above it only the NPROBE lists
+# with the closest centroids are scanned; new rows join their nearest list as
+# they are added, and the centroids are retrained (in the background) once the
+# index grew RETRAIN_GROWTH times since the last training.
+#
+#   memory = LongTermMemory(store, get_model(EMBEDDING_MODEL).embed_many)
+#   recalled = memory.recall(query_vector)          # [(score, record)]
+#   memory.remember(turn, record)                   # after store.append()
+#   python bench_long_term_memory.py [--turns 1000000]
+
+FOLDER_NAME = "IA_assistant_history"
+MEMORY_FOLDER = os.path.join(FOLDER_NAME, "long_term_memory")
+
+TOP_K = 4                  # Past exchanges recalled per query
+MIN_SCORE = 0.55           # Cosine similarity below which a past exchange is not worth the prompt tokens
+CHUNK_CHARS = 1200         # Exchanges longer than this are embedded in overlapping chunks
+CHUNK_OVERLAP = 200
+RECALL_CHARS = 600         # Characters of each side of a recalled exchange put in the prompt
+EMBED_BATCH = 64           # Texts per /api/embed request
+
+IVF_MIN_ROWS = 20_000      # Below this a full scan is fast enough
+LISTS_PER_SQRT = 4         # IVF lists = LISTS_PER_SQRT * sqrt(rows)
+NPROBE = 32                # IVF lists scanned per query
+TRAIN_SAMPLE = 32          # Training rows per centroid
+KMEANS_ITERATIONS = 10
+RETRAIN_GROWTH = 4.0
+BLOCK_ROWS = 65_536        # Rows per matrix product when scanning / assigning
+
+
+def session_tag(session_id):
+    """int64 tag of a session; 0 for turns recorded without one (visible to every session)."""
+    return 0 if session_id is None else zlib.crc32(str(session_id).encode("utf-8")) + 1
+
+
+def exchange_text(record):
+    return f"User: {record.get('user', '')}\nAssistant: {record.get('assistant', '')}"
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    if len(text) <= size:
+        return [text]
+    return [text[start:start + size] for start in range(0, len(text) - overlap, size - overlap)]
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def assign(vectors, centroids):
+    """Nearest centroid (cosine) of every row, in blocks."""
+    lists = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        lists[start:start + BLOCK_ROWS] = np.argmax(vectors[start:start + BLOCK_ROWS] @ centroids.T, axis=1)
+    return lists
+
+
+def spherical_kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Unit-norm centroids of `clusters` groups of unit vectors."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        lists = assign(vectors, centroids)
+        order = np.argsort(lists, kind="stable")
+        counts = np.bincount(lists, minlength=clusters)
+        filled = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = normalize_rows(np.add.reduceat(vectors[order], starts, axis=0))
+    return centroids
+
+
+def memory_prompt(query, recalled, max_chars=RECALL_CHARS):
+    """The user message: recalled exchanges first, then the question (or just the query)."""
+    if not recalled:
+        return query
+    def shorten(text):
+        text = " ".join(str(text).split())
+        return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+    lines = ["Earlier conversation that may be relevant:"]
+    for _, record in recalled:
+        lines.append(f"- User: {shorten(record.get('user', ''))}\n  Assistant: {shorten(record.get('assistant', ''))}")
+    lines += ["", f"Question: {query}"]
+    return "\n".join(lines)
+
+
+class LongTermMemory:
+    """Vector index over the turns of a ChatHistoryStore, with top-k recall of past exchanges."""
+
+    def __init__(self, store, embed_many, folder=MEMORY_FOLDER, top_k=TOP_K, min_score=MIN_SCORE,
+                 nprobe=NPROBE, background=True):
+        self.store = store                # ChatHistoryStore the row turn numbers point into (None: search only)
+        self.embed_many = embed_many      # [text] -> [vector]
+        self.folder = folder
+        self.top_k = top_k
+        self.min_score = min_score
+        self.nprobe = nprobe
+        # Indexing and training run on one worker thread, so they never overlap
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="long_term_memory") if background else None
+        self._lock = threading.RLock()
+        self._meta = None                 # Opened on first use
+        self._vectors_file = self._rows_file = None
+        self._mapped = None               # (count, vectors memmap, rows memmap)
+        self._lists = None                # (order, bounds, rows covered) of the IVF lists
+        self._backfilled = 0              # Store turns below this are indexed or queued by the backfill
+        self.centroids = None
+        self.counters = {"recalls": 0, "recalled": 0, "indexed_turns": 0, "rows_added": 0, "trainings": 0}
+        self.seconds = {"search": 0.0, "index": 0.0, "train": 0.0}
+
+    # ---------- files ----------
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _open(self):
+        """Load meta.json and cut the data files back to it (called with the lock held)."""
+        if self._meta is not None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        meta = {"dim": None, "count": 0, "indexed_turns": 0, "nlist": 0, "trained_rows": 0}
+        if os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json"), "r", encoding="utf-8") as file:
+                meta.update(json.load(file))
+        self._vectors_file = open(self._path("vectors.f32"), "ab")
+        self._rows_file = open(self._path("rows.i64"), "ab")
+        self._vectors_file.truncate(meta["count"] * (meta["dim"] or 0) * 4)
+        self._rows_file.truncate(meta["count"] * 3 * 8)
+        if meta["nlist"]:
+            self.centroids = np.load(self._path("centroids.npy"))
+        self._meta = meta
+        self._backfilled = meta["indexed_turns"]
+        if self.store is not None and meta["indexed_turns"] < len(self.store):
+            self._backfilled = len(self.store)
+            self._submit(self._backfill, self._backfilled)
+
+    def _save_meta(self):
+        temporary = self._path("meta.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(self._meta, file)
+        os.replace(temporary, self._path("meta.json"))
+
+    def _map(self):
+        """Read-only memmaps of the rows written so far (re-mapped when the index grew)."""
+        count, dim = self._meta["count"], self._meta["dim"]
+        if self._mapped is None or self._mapped[0] != count:
+            vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+            rows = np.memmap(self._path("rows.i64"), dtype=np.int64, mode="r", shape=(count, 3))
+            self._mapped = (count, vectors, rows)
+        return self._mapped
+
+    def _submit(self, func, *args):
+        if self._worker is None:
+            return func(*args)
+        return self._worker.submit(self._guarded, func, *args)
+
+    @staticmethod
+    def _guarded(func, *args):
+        try:
+            return func(*args)
+        except (OllamaError, OSError, ValueError) as error:
+            print(f"⚠️ Long-term memory: {error}")
+
+    # ---------- indexing ----------
+
+    def add(self, vectors, turns, sessions):
+        """Append rows: one vector per chunk, with the store turn and session tag it came from."""
+        vectors = normalize_rows(vectors).reshape(len(turns), -1)
+        with self._lock:
+            self._open()
+            if self._meta["dim"] is None:
+                self._meta["dim"] = vectors.shape[1]
+            if vectors.shape[1] != self._meta["dim"]:
+                raise ValueError(f"embedding size {vectors.shape[1]} != index size {self._meta['dim']} "
+                                 f"(delete {self.folder} after changing the embedding model)")
+            lists = assign(vectors, self.centroids) if self.centroids is not None else np.full(len(turns), -1)
+            rows = np.column_stack([np.asarray(turns), np.asarray(sessions), lists]).astype(np.int64)
+            self._vectors_file.write(vectors.tobytes())
+            self._rows_file.write(rows.tobytes())
+            self._vectors_file.flush()
+            self._rows_file.flush()
+            self._meta["count"] += len(turns)
+            self._save_meta()
+            self.counters["rows_added"] += len(turns)
+            count, trained = self._meta["count"], self._meta["trained_rows"]
+        if count >= IVF_MIN_ROWS and (self.centroids is None or count >= RETRAIN_GROWTH * trained):
+            self.train()
+
+    def index_turns(self, turns):
+        """Chunk, embed and add [(turn number, record)] of the store."""
+        start = time.perf_counter()
+        texts, numbers, sessions = [], [], []
+        for turn, record in turns:
+            for chunk in chunk_text(exchange_text(record)):
+                texts.append(chunk)
+                numbers.append(turn)
+                sessions.append(session_tag(record.get("session")))
+        vectors = []
+        for batch in range(0, len(texts), EMBED_BATCH):
+            vectors.extend(self.embed_many(texts[batch:batch + EMBED_BATCH]))
+        if texts:
+            self.add(vectors, numbers, sessions)
+        with self._lock:
+            self._meta["indexed_turns"] = max(self._meta["indexed_turns"], max(numbers, default=-1) + 1)
+            self._save_meta()
+            self.counters["indexed_turns"] += len(turns)
+            self.seconds["index"] += time.perf_counter() - start
+
+    def _backfill(self, until):
+        """Index the store turns recorded before the index existed (or while it was not running)."""
+        for first in range(self._meta["indexed_turns"], until, EMBED_BATCH):
+            self.index_turns([(turn, self.store.get(turn)) for turn in range(first, min(first + EMBED_BATCH, until))])
+
+    def remember(self, turn, record):
+        """
+        Index a turn just appended to the store (in the background). Turns appended
+        by concurrent threads can arrive out of order, so only the backfill's turns are skipped.
+        """
+        with self._lock:
+            self._open()
+            if turn < self._backfilled:
+                return
+        self._submit(self.index_turns, [(turn, record)])
+
+    def train(self):
+        """(Re)build the IVF lists: k-means on a sample, then every row joins its nearest centroid."""
+        start = time.perf_counter()
+        with self._lock:
+            self._open()
+            count, vectors, _ = self._map()
+        clusters = max(1, int(LISTS_PER_SQRT * math.sqrt(count)))
+        sample = np.sort(np.random.default_rng(count).choice(count, min(count, clusters * TRAIN_SAMPLE), replace=False))
+        centroids = spherical_kmeans(np.asarray(vectors[sample]), clusters)
+        rows = np.memmap(self._path("rows.i64"), dtype=np.int64, mode="r+", shape=(count, 3))
+        for block in range(0, count, BLOCK_ROWS):
+            rows[block:block + BLOCK_ROWS, 2] = assign(np.asarray(vectors[block:block + BLOCK_ROWS]), centroids)
+        rows.flush()
+        del rows
+        with self._lock:
+            np.save(self._path("centroids.tmp.npy"), centroids)
+            os.replace(self._path("centroids.tmp.npy"), self._path("centroids.npy"))
+            self.centroids = centroids
+            self._lists = None
+            self._mapped = None
+            self._meta.update(nlist=clusters, trained_rows=count)
+            self._save_meta()
+            self.counters["trainings"] += 1
+            self.seconds["train"] += time.perf_counter() - start
+
+    # ---------- search ----------
+
+    def _inverted_lists(self, rows, count):
+        """Row numbers grouped by IVF list; rows added since are scanned through their list column."""
+        if self._lists is None or count - self._lists[2] > max(BLOCK_ROWS, self._lists[2] // 10):
+            lists = np.asarray(rows[:count, 2])
+            order = np.argsort(lists, kind="stable")
+            bounds = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds, count)
+        return self._lists
+
+    def _candidates(self, query, rows, count):
+        probe = np.argpartition(self.centroids @ query, -min(self.nprobe, len(self.centroids)))[-self.nprobe:]
+        order, bounds, covered = self._inverted_lists(rows, count)
+        parts = [order[bounds[cluster]:bounds[cluster + 1]] for cluster in probe]
+        recent = np.arange(covered, count)
+        parts.append(recent[np.isin(rows[covered:count, 2], probe)])
+        return np.sort(np.concatenate(parts))      # Sorted: the memmap is read front to back
+
+    def search(self, vector, k=None, session=None, exact=False):
+        """[(turn, score)] of the k best past turns, best first (exact=True scans every row)."""
+        k = k or self.top_k
+        start = time.perf_counter()
+        with self._lock:
+            self._open()
+            if not self._meta["count"]:
+                return []
+            count, vectors, rows = self._map()
+            use_ivf = self.centroids is not None and not exact
+            candidates = self._candidates(normalize_rows(vector), rows, count) if use_ivf else None
+        query = normalize_rows(vector)
+        if candidates is None:
+            scores = np.concatenate([vectors[block:block + BLOCK_ROWS] @ query for block in range(0, count, BLOCK_ROWS)])
+            meta = rows[:count]
+        else:
+            scores = vectors[candidates] @ query
+            meta = rows[candidates]
+        tag = session_tag(session)
+        if tag:
+            scores = np.where((meta[:, 1] == 0) | (meta[:, 1] == tag), scores, -np.inf)
+        best = np.argpartition(scores, -min(len(scores), 4 * k))[-4 * k:]     # Chunks of one turn share it
+        found = {}
+        for index in best[np.argsort(-scores[best])]:
+            turn = int(meta[index, 0])
+            if scores[index] > -np.inf and turn not in found:
+                found[turn] = float(scores[index])
+            if len(found) == k:
+                break
+        self.seconds["search"] += time.perf_counter() - start
+        return list(found.items())
+
+    def recall(self, query_vector, session=None, skip=()):
+        """[(score, record)] of the past exchanges worth showing with this query; skip: user texts to leave out."""
+        self.counters["recalls"] += 1
+        recalled = []
+        for turn, score in self.search(query_vector, self.top_k + len(skip), session):
+            if score < self.min_score:
+                break
+            record = self.store.get(turn)
+            if record.get("user") in skip:
+                continue        # Still in the short-term history
+            recalled.append((score, record))
+            if len(recalled) == self.top_k:
+                break
+        self.counters["recalled"] += len(recalled)
+        return recalled
+
+    def stats(self):
+        with self._lock:
+            meta = dict(self._meta or {})
+        recalls = self.counters["recalls"]
+        return dict(self.counters, rows=meta.get("count", 0), ivf_lists=meta.get("nlist", 0),
+                    avg_search_ms=1000 * self.seconds["search"] / recalls if recalls else 0.0,
+                    index_s=round(self.seconds["index"], 3), train_s=round(self.seconds["train"], 3))
+
+    def close(self):
+        """Finish pending indexing and close the files."""
+        if self._worker is not None:
+            self._worker.shutdown(wait=True)
+        with self._lock:
+            if self._meta is not None:
+                self._save_meta()
+                self._vectors_file.close()
+                self._rows_file.close()
+                self._meta = None
+                self._mapped = None
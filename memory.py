@@ -0,0 +1,180 @@
+from langchain_core.messages import SystemMessage, HumanMessage
+
+# Token-budgeted conversation memory for State["history"].
+#
+# ConversationMemory is a list, so the nodes can keep building prompts with
+# [system_message] + state["history"] + [...]. Every append updates a running
+# token count and, once the budget is exceeded, the oldest unpinned messages
+# are handed to a trimming policy (drop them, or summarise them). Other edits
+# (+=, insert, item / slice assignment, del, pop, remove) recount the list and
+# apply the same budget.
+
+DEFAULT_TOKEN_BUDGET = 2048   # Tokens of history sent to each model
+MESSAGE_OVERHEAD = 4          # Role markers / separators per message
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text and code)."""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD
+
+
+# ---------- trimming policies ----------
+# A policy receives the evicted messages (oldest first) and the previous
+# summary message (or None) and returns the message that replaces them, or None.
+
+def drop_oldest(evicted, previous_summary):
+    """Forget the oldest messages."""
+    return None
+
+
+class SummarizeOldest:
+    """Fold the oldest messages into one compact summary written by a cheap model."""
+
+    def __init__(self, model, max_words=80):
+        self.model = model
+        self.max_words = max_words
+
+    def __call__(self, evicted, previous_summary):
+        transcript = "\n".join(f"{message.type}: {message.content}" for message in evicted)
+        if previous_summary is not None:
+            transcript = f"{previous_summary.content}\n{transcript}"
+
+        system_message = SystemMessage(content=
+            f"Summarise this conversation in at most {self.max_words} words. "
+            "Keep names, facts and decisions. Only return the summary."
+        )
+        summary = self.model.invoke([system_message, HumanMessage(content=transcript)])
+        return SystemMessage(content=f"Summary of the earlier conversation: {summary.strip()}")
+
+
+class ConversationMemory(list):
+    """
+    Chat history capped by a token budget.
+    System messages and the first `pinned_turns` exchanges are always kept,
+    the latest exchange is never trimmed, and everything in between is a
+    sliding window. The token count is kept incrementally, so appending a turn
+    only counts the new message.
+    """
+
+    def __init__(self, max_tokens=DEFAULT_TOKEN_BUDGET, pinned_turns=1,
+                 policy=drop_oldest, count_tokens=estimate_tokens, trim_to=1.0):
+        super().__init__()
+        self.max_tokens = max_tokens
+        # Once over budget, trim down to trim_to * max_tokens. Below 1.0 the history
+        # changes at the front only every few turns, so the model's cached prompt
+        # prefix survives the turns in between.
+        self.trim_to = trim_to
+        self.pinned_turns = pinned_turns
+        self.policy = policy
+        self.count_tokens = count_tokens
+
+        self.total_tokens = 0
+        self._tokens = []        # Token count of each message, same order as the list
+        self._pinned = 0         # Leading messages that are never trimmed
+        self._summary = None     # Summary message currently stored right after the pinned block
+
+    def append(self, message):
+        tokens = self.count_tokens(message.content)
+        # Leading system messages and the first turns form the pinned block
+        if self._pinned == len(self) and self._pins(message):
+            self._pinned += 1
+        super().append(message)
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+        self._trim()
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+    def __imul__(self, times):
+        super().__imul__(times)
+        self._recount()
+        return self
+
+    def insert(self, index, message):
+        super().insert(index, message)
+        self._recount()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._recount()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._recount()
+
+    def pop(self, index=-1):
+        message = super().pop(index)
+        self._recount()
+        return message
+
+    def remove(self, message):
+        super().remove(message)
+        self._recount()
+
+    def _recount(self):
+        """Rebuild the token counts and the pinned block after an edit anywhere in the list, then trim."""
+        self._tokens = [self.count_tokens(message.content) for message in self]
+        self.total_tokens = sum(self._tokens)
+        self._pinned = 0
+        while self._pinned < len(self) and self[self._pinned] is not self._summary and self._pins(self[self._pinned]):
+            self._pinned += 1
+        if not (self._pinned < len(self) and self[self._pinned] is self._summary):
+            self._summary = None
+        self._trim()
+
+    def _pins(self, message):
+        """Whether message, coming right after the pinned block, belongs to it."""
+        turn_messages = sum(1 for pinned in self[:self._pinned] if pinned.type != "system")
+        return message.type == "system" or turn_messages < 2 * self.pinned_turns
+
+    def _trim(self):
+        start = self._pinned + (self._summary is not None)
+        target = int(self.max_tokens * self.trim_to)
+        while self.total_tokens > self.max_tokens:
+            # Evict oldest window messages, but always keep the latest exchange (from its user message on)
+            latest = len(self) - 1
+            while latest > start and self[latest].type != "human":
+                latest -= 1
+            end = start
+            freed = 0
+            while end < latest and self.total_tokens - freed > target:
+                freed += self._tokens[end]
+                end += 1
+            # Don't split an exchange: the window must start with a user message
+            while end < latest and self[end].type != "human":
+                freed += self._tokens[end]
+                end += 1
+            if end == start:
+                return    # Nothing left to trim: pinned messages + latest exchange exceed the budget
+
+            evicted = self[start:end]
+            super().__delitem__(slice(start, end))
+            del self._tokens[start:end]
+            self.total_tokens -= freed
+
+            summary = self.policy(evicted, self._summary)
+            if self._summary is not None:
+                # The old summary is folded into the new one (or dropped)
+                super().__delitem__(self._pinned)
+                self.total_tokens -= self._tokens.pop(self._pinned)
+                self._summary = None
+            if summary is not None:
+                tokens = self.count_tokens(summary.content)
+                super().insert(self._pinned, summary)
+                self._tokens.insert(self._pinned, tokens)
+                self.total_tokens += tokens
+                self._summary = summary
+            start = self._pinned + (self._summary is not None)
+
+    def clear(self):
+        super().clear()
+        self._tokens.clear()
+        self.total_tokens = 0
+        self._pinned = 0
+        self._summary = None
@@ -1,18 +1,12 @@
 import os
-from langchain_ollama import OllamaLLM
+import argparse
+from ollama_client import get_model
 from langgraph.graph import MessagesState, StateGraph, START, END
 from langchain_core.messages import SystemMessage
-from graphviz import Digraph
-from IPython.display import Image, display
 
 
-# Load the locally available Ollama model
-llm = OllamaLLM(model="qwen2.5:0.5b")  # Change model if needed
-
-
-# Test the model
-response = llm.invoke("Hello, world!")
-print(response)
+# Load the locally available Ollama model (no request is made until it is used)
+llm = get_model("qwen2.5:0.5b")  # Change model if needed
 
 # Define state class
 class State(MessagesState):
@@ -34,14 +28,21 @@ builder.add_edge("node_llm", END)
 # Compile graph
 graph = builder.compile()
 
-# Render the graph using Graphviz
-dot = Digraph()
-dot.node("START", "Start")
-dot.node("node_llm", "LLM Node")
-dot.node("END", "End")
-dot.edge("START", "node_llm")
-dot.edge("node_llm", "END")
-
-# Save and display the image
-dot.render("state_graph", format="png", cleanup=False)
-display(Image(filename="state_graph.png"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-node LangGraph demo")
+    parser.add_argument("--draw", metavar="IMAGE", help="render the graph (optional extra: graphviz)")
+    parser.add_argument("--profile-startup", action="store_true", help="import-time breakdown, then exit")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        from bootstrap import profile_startup
+        raise SystemExit(profile_startup("ollama_agent"))
+
+    # Test the model
+    response = llm.invoke("Hello, world!")
+    print(response)
+
+    if args.draw:
+        from visualize import draw_graph
+        print(f"🖼️ Graph saved to {draw_graph(graph, args.draw)}")
@@ -1,15 +1,15 @@
 import os
-from langchain_ollama import OllamaLLM
+import argparse
+from ollama_client import get_model
+from constrained import label_classifier
 from langgraph.graph import MessagesState, StateGraph, START, END
 from langchain_core.messages import SystemMessage
-from graphviz import Digraph
-from IPython.display import Image, display
 
 # Define AI models
-llm = OllamaLLM(model="qwen2.5:0.5b")  # Main AI Assistant
-nlp_model = OllamaLLM(model="phi:latest")  # Natural Language Model
-code_model = OllamaLLM(model="qwen2.5-coder:0.5b")  # Code Model
-checker = OllamaLLM(model="qwen2.5:0.5b")  # Final Checker
+classify, _ = label_classifier("qwen2.5:0.5b", SystemMessage(content="You are a classifier. Identify if the query is related to 'code' or 'natural_language'."))  # Answers only with a valid label
+nlp_model = get_model("phi:latest")  # Natural Language Model
+code_model = get_model("qwen2.5-coder:0.5b")  # Code Model
+checker = get_model("qwen2.5:0.5b")  # Final Checker
 
 # Define state class
 class State(MessagesState):
@@ -19,11 +19,7 @@ class State(MessagesState):
 
 # Function to classify query
 def classify_query(state: State) -> State:
-    system_message = SystemMessage(content="You are a classifier. Identify if the query is related to 'code' or 'natural language'.")
-    classification = llm.invoke([system_message, {"role": "user", "content": state["query"]}])
-    
-    category = "code" if "code" in classification.lower() else "natural_language"   # basic code/natural_language classification
-    state["category"] = category
+    state["category"] = classify(state["query"])   # "code" or "natural_language", never free text
     return state
 
 # Function to process the request based on category
@@ -55,23 +51,24 @@ builder.add_edge("check_response", END)
 # Compile the graph
 graph = builder.compile()
 
-# Run the AI Assistant
-user_input = input("AI Assistant: How can I assist you today?\n> ")
-state = {"query": user_input}
-final_state = graph.invoke(state)
 
-# Display response
-print("\nAI Assistant Response:", final_state["response"])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="classify -> process -> check assistant")
+    parser.add_argument("--draw", metavar="IMAGE", help="render the graph (optional extra: graphviz)")
+    parser.add_argument("--profile-startup", action="store_true", help="import-time breakdown, then exit")
+    args = parser.parse_args()
 
+    if args.profile_startup:
+        from bootstrap import profile_startup
+        raise SystemExit(profile_startup("ollama_agent2"))
+    if args.draw:
+        from visualize import draw_graph
+        print(f"🖼️ Graph saved to {draw_graph(graph, args.draw)}")
 
-# Render the graph using Graphviz
-dot = Digraph()
-dot.node("START", "Start")
-dot.node("node_llm", "LLM Node")
-dot.node("END", "End")
-dot.edge("START", "node_llm")
-dot.edge("node_llm", "END")
+    # Run the AI Assistant
+    user_input = input("AI Assistant: How can I assist you today?\n> ")
+    state = {"query": user_input}
+    final_state = graph.invoke(state)
 
-# Save and display the image
-dot.render("state_graph2", format="png", cleanup=False)
-display(Image(filename="state_graph2.png"))
\ No newline at end of file
+    # Display response
+    print("\nAI Assistant Response:", final_state["response"])
\ No newline at end of file
@@ -0,0 +1,645 @@
+import os
+import json
+import time
+import random
+import weakref
+import asyncio
+import functools
+import threading
+import contextlib
+import contextvars
+import http.client
+from urllib.parse import urlsplit
+
+# Shared, connection-pooled client for the Ollama HTTP API.
+#
+# Every model handle in the agents goes through one transport, so connections
+# are kept alive and reused across nodes, models and sessions instead of
+# opening a new one per call. get_model() also de-duplicates handles: asking
+# twice for "mistral:latest" with the same options returns the same object.
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+
+POOL_SIZE = 32           # Connections open at the same time, all hosts together
+MAX_PER_HOST = 16        # Connections open at the same time to one host
+CONNECT_TIMEOUT = 5.0    # Seconds to open a connection / wait for a free one
+READ_TIMEOUT = 600.0     # Seconds without data before a request fails (model loads can be slow)
+RETRIES = 3              # Retries on connection errors (never after the server started answering)
+BACKOFF = 0.2            # Base delay of the exponential backoff, with +-50% jitter
+
+# Generation options Ollama accepts under "options"
+OPTION_NAMES = ("temperature", "top_k", "top_p", "seed", "num_ctx", "num_predict",
+                "repeat_penalty", "stop", "mirostat", "tfs_z", "num_gpu", "num_thread")
+
+
+class OllamaError(Exception):
+    """The server answered with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"Ollama returned {status}: {message}")
+        self.status = status
+
+
+class OllamaConnectionError(OllamaError):
+    """The server could not be reached, even after retrying."""
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.status = None
+
+
+class OllamaCancelled(OllamaError):
+    """A request given up while it waited for admission, before it was sent (see cancellable())."""
+
+    def __init__(self, model):
+        Exception.__init__(self, f"request for {model} cancelled before it was sent")
+        self.status = None
+
+
+def _normalize_host(host):
+    if "://" not in host:
+        host = "http://" + host
+    parts = urlsplit(host)
+    return parts.hostname or "127.0.0.1", parts.port or 11434
+
+
+def _jitter(attempt):
+    return BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "connections_opened": 0, "connections_reused": 0,
+                         "retries": 0, "errors": 0}
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        used = counters["connections_opened"] + counters["connections_reused"]
+        counters["reuse_ratio"] = counters["connections_reused"] / used if used else 0.0
+        return counters
+
+
+# ---------- sync transport ----------
+
+class OllamaTransport:
+    """Thread-safe keep-alive connection pool (http.client) with retries."""
+
+    def __init__(self, pool_size=POOL_SIZE, max_per_host=MAX_PER_HOST,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES):
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._host_slots = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = _Stats()
+
+    def _acquire(self, address):
+        with self._lock:
+            host_slots = self._host_slots.setdefault(address, threading.BoundedSemaphore(self.max_per_host))
+        if not self._slots.acquire(timeout=self.connect_timeout):
+            raise OllamaConnectionError("connection pool exhausted")
+        if not host_slots.acquire(timeout=self.connect_timeout):
+            self._slots.release()
+            raise OllamaConnectionError(f"connection pool for {address[0]}:{address[1]} exhausted")
+
+        with self._lock:
+            idle = self._idle.setdefault(address, [])
+            connection = idle.pop() if idle else None
+        if connection is not None:
+            self._stats.add("connections_reused")
+            return connection, True
+        self._stats.add("connections_opened")
+        connection = http.client.HTTPConnection(*address, timeout=self.connect_timeout)
+        return connection, False
+
+    def _release(self, address, connection, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.setdefault(address, []).append(connection)
+        else:
+            connection.close()
+        self._host_slots[address].release()
+        self._slots.release()
+
+    def _open(self, host, method, path, payload):
+        """Send a request and return (address, connection, response) once the status line arrived."""
+        address = _normalize_host(host)
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        self._stats.add("requests")
+
+        attempt = 0
+        while True:
+            connection, reused = self._acquire(address)
+            try:
+                if connection.sock is None:
+                    connection.connect()
+                connection.sock.settimeout(self.read_timeout)
+                connection.request(method, path, body, headers)
+                return address, connection, connection.getresponse()
+            except (OSError, http.client.HTTPException) as error:
+                self._release(address, connection, reusable=False)
+                if reused:
+                    continue    # Stale keep-alive connection: retry at once on a fresh one
+                if attempt >= self.retries:
+                    self._stats.add("errors")
+                    raise OllamaConnectionError(f"{method} {path} failed: {error!r}") from error
+                self._stats.add("retries")
+                time.sleep(_jitter(attempt))
+                attempt += 1
+
+    def request(self, method, path, payload=None, host=OLLAMA_HOST):
+        """Plain JSON request; returns the decoded body."""
+        address, connection, response = self._open(host, method, path, payload)
+        try:
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self._release(address, connection, reusable=False)
+            self._stats.add("errors")
+            raise
+        self._release(address, connection, reusable=not response.will_close)
+        if response.status != 200:
+            self._stats.add("errors")
+            raise OllamaError(response.status, data.decode("utf-8", "replace"))
+        return json.loads(data)
+
+    def stream(self, method, path, payload=None, host=OLLAMA_HOST):
+        """NDJSON streaming request; yields one decoded object per line."""
+        address, connection, response = self._open(host, method, path, payload)
+        if response.status != 200:
+            data = response.read()
+            self._release(address, connection, reusable=not response.will_close)
+            self._stats.add("errors")
+            raise OllamaError(response.status, data.decode("utf-8", "replace"))
+
+        finished = False
+        last = None
+        try:
+            try:
+                for line in response:
+                    if line.strip():
+                        last = json.loads(line)
+                        yield last
+            except (OSError, http.client.HTTPException) as error:
+                self._stats.add("errors")
+                raise OllamaConnectionError(f"{method} {path}: stream interrupted: {error!r}") from error
+            if last is None or not last.get("done"):
+                # Ollama always ends with a "done" object: the connection dropped halfway through the answer
+                self._stats.add("errors")
+                raise OllamaConnectionError(f"{method} {path}: stream ended before the answer was complete")
+            finished = True
+        finally:
+            # A stream closed early (cancelled) leaves unread data: the connection can't be reused
+            self._release(address, connection, reusable=finished and not response.will_close)
+
+    def stats(self):
+        return self._stats.snapshot()
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+# ---------- async transport ----------
+
+class _AsyncResponse:
+    def __init__(self, status, headers, reader):
+        self.status = status
+        self.headers = headers
+        self.reader = reader
+        self.will_close = headers.get("connection", "").lower() == "close"
+
+    async def chunks(self):
+        """Body as raw byte chunks (chunked or Content-Length)."""
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    raise ConnectionResetError("connection closed in the middle of the body")
+                size = int(line.split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()    # Final CRLF (no trailers from Ollama)
+                    return
+                data = await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+                yield data
+        else:
+            length = int(self.headers.get("content-length", 0))
+            if length:
+                yield await self.reader.readexactly(length)
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.chunks()])
+
+
+class AsyncOllamaTransport:
+    """asyncio keep-alive connection pool with the same limits and retries as OllamaTransport."""
+
+    def __init__(self, pool_size=POOL_SIZE, max_per_host=MAX_PER_HOST,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES, stats=None):
+        self.max_per_host = max_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self._slots = asyncio.Semaphore(pool_size)
+        self._host_slots = {}
+        self._idle = {}
+        self._stats = stats or _Stats()
+
+    async def _acquire(self, address):
+        host_slots = self._host_slots.setdefault(address, asyncio.Semaphore(self.max_per_host))
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            raise OllamaConnectionError("connection pool exhausted") from None
+        try:
+            await asyncio.wait_for(host_slots.acquire(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            self._slots.release()
+            raise OllamaConnectionError(f"connection pool for {address[0]}:{address[1]} exhausted") from None
+
+        idle = self._idle.setdefault(address, [])
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                self._stats.add("connections_reused")
+                return (reader, writer), True
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(*address), self.connect_timeout)
+        except BaseException:
+            host_slots.release()
+            self._slots.release()
+            raise
+        self._stats.add("connections_opened")
+        return connection, False
+
+    def _release(self, address, connection, reusable):
+        if reusable:
+            self._idle.setdefault(address, []).append(connection)
+        else:
+            connection[1].close()
+        self._host_slots[address].release()
+        self._slots.release()
+
+    async def _open(self, host, method, path, payload):
+        address = _normalize_host(host)
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {address[0]}:{address[1]}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: keep-alive\r\n\r\n").encode("latin-1")
+        self._stats.add("requests")
+
+        attempt = 0
+        while True:
+            try:
+                connection, reused = await self._acquire(address)
+            except OSError as error:
+                if attempt >= self.retries:
+                    self._stats.add("errors")
+                    raise OllamaConnectionError(f"{method} {path} failed: {error!r}") from error
+                self._stats.add("retries")
+                await asyncio.sleep(_jitter(attempt))
+                attempt += 1
+                continue
+
+            reader, writer = connection
+            try:
+                writer.write(head + body)
+                await writer.drain()
+                status_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                if not status_line:
+                    raise ConnectionResetError("connection closed by server")
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                return address, connection, _AsyncResponse(int(status_line.split()[1]), headers, reader)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as error:
+                self._release(address, connection, reusable=False)
+                if reused:
+                    continue
+                if attempt >= self.retries:
+                    self._stats.add("errors")
+                    raise OllamaConnectionError(f"{method} {path} failed: {error!r}") from error
+                self._stats.add("retries")
+                await asyncio.sleep(_jitter(attempt))
+                attempt += 1
+            except BaseException:
+                self._release(address, connection, reusable=False)    # Cancelled
+                raise
+
+    async def request(self, method, path, payload=None, host=OLLAMA_HOST):
+        address, connection, response = await self._open(host, method, path, payload)
+        try:
+            data = await asyncio.wait_for(response.read(), self.read_timeout)
+        except BaseException:
+            self._release(address, connection, reusable=False)
+            raise
+        self._release(address, connection, reusable=not response.will_close)
+        if response.status != 200:
+            self._stats.add("errors")
+            raise OllamaError(response.status, data.decode("utf-8", "replace"))
+        return json.loads(data)
+
+    async def stream(self, method, path, payload=None, host=OLLAMA_HOST):
+        address, connection, response = await self._open(host, method, path, payload)
+        if response.status != 200:
+            data = await response.read()
+            self._release(address, connection, reusable=not response.will_close)
+            self._stats.add("errors")
+            raise OllamaError(response.status, data.decode("utf-8", "replace"))
+
+        finished = False
+        last = None
+        try:
+            buffer = b""
+            try:
+                async for chunk in response.chunks():
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            last = json.loads(line)
+                            yield last
+            except (OSError, asyncio.IncompleteReadError) as error:
+                self._stats.add("errors")
+                raise OllamaConnectionError(f"{method} {path}: stream interrupted: {error!r}") from error
+            if buffer.strip():
+                last = json.loads(buffer)
+                yield last
+            if last is None or not last.get("done"):
+                self._stats.add("errors")
+                raise OllamaConnectionError(f"{method} {path}: stream ended before the answer was complete")
+            finished = True
+        finally:
+            # Cancelled streams close their connection, which also stops generation on the server
+            self._release(address, connection, reusable=finished and not response.will_close)
+
+    def stats(self):
+        return self._stats.snapshot()
+
+
+# ---------- shared instances ----------
+
+_transport = None
+_async_transports = weakref.WeakKeyDictionary()    # One per event loop (asyncio primitives are bound to their loop)
+_models = {}
+_shared_lock = threading.Lock()
+_observers = []          # Called with (model, final chunk, seconds) after every generation
+_residency = None        # Optional ResidencyManager: keep_alive per model and admission control
+_scheduler = None        # Optional RequestScheduler: per-model parallelism, priorities and fairness
+_cancel = contextvars.ContextVar("ollama_cancel", default=None)    # threading.Event of cancellable()
+
+
+def get_transport():
+    global _transport
+    with _shared_lock:
+        if _transport is None:
+            _transport = OllamaTransport()
+        return _transport
+
+
+def get_async_transport():
+    loop = asyncio.get_running_loop()
+    stats = get_transport()._stats    # Shared counters, so stats() covers sync and async traffic
+    with _shared_lock:
+        transport = _async_transports.get(loop)
+        if transport is None:
+            transport = _async_transports[loop] = AsyncOllamaTransport(stats=stats)
+        return transport
+
+
+def transport_stats():
+    """Connection reuse / retry counters of all Ollama traffic in this process."""
+    return get_transport().stats()
+
+
+def add_observer(callback):
+    """Call callback(model, stats, seconds) after every chat request, with Ollama's final
+    chunk (load_duration, prompt_eval_count, eval_count, eval_duration, ...) and the
+    wall time of the call as seen by the client."""
+    _observers.append(callback)
+
+
+def remove_observer(callback):
+    if callback in _observers:
+        _observers.remove(callback)
+
+
+def set_residency_manager(manager):
+    """Route keep_alive and request admission through a ResidencyManager (None to disable)."""
+    global _residency
+    _residency = manager
+
+
+def set_scheduler(scheduler):
+    """Queue requests per model through a RequestScheduler (None to disable)."""
+    global _scheduler
+    _scheduler = scheduler
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def cancellable(event, func):
+    """Wrap func so the requests it makes give up while still waiting for admission once event is set."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _cancel.set(event)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _cancel.reset(token)
+    return wrapper
+
+
+def cancel_waiting(event):
+    """Set event and wake the requests waiting for admission, so the ones it covers give up."""
+    event.set()
+    for manager in (_residency, _scheduler):
+        if manager is not None:
+            with manager.condition:
+                manager.condition.notify_all()
+
+
+def check_cancelled(model):
+    """Raise OllamaCancelled if the request being admitted was cancelled (see cancellable())."""
+    event = _cancel.get()
+    if event is not None and event.is_set():
+        raise OllamaCancelled(model)
+
+
+def _notify(model, stats, start):
+    if _observers:
+        seconds = time.perf_counter() - start
+        for callback in _observers:
+            callback(model, stats, seconds)
+
+
+def to_chat_messages(messages, system=None):
+    """Convert a prompt (string, dicts or LangChain messages) to Ollama chat messages."""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    chat = []
+    for message in messages:
+        if isinstance(message, dict):
+            # Extra keys (tool_calls of an assistant turn, tool_name of a tool result) pass through
+            chat.append(dict(message, role=message.get("role", "user"), content=message.get("content", "")))
+        else:
+            role = {"human": "user", "ai": "assistant"}.get(message.type, message.type)
+            chat.append({"role": role, "content": message.content})
+    if system and not any(message["role"] == "system" for message in chat):
+        chat.insert(0, {"role": "system", "content": system})
+    return chat
+
+
+class OllamaModel:
+    """
+    Model handle with the OllamaLLM interface the agents use
+    (.model, invoke/stream/ainvoke/astream returning text), over the shared transport.
+    """
+
+    def __init__(self, model, system=None, keep_alive=None, host=OLLAMA_HOST, format=None, **options):
+        unknown = set(options) - set(OPTION_NAMES)
+        if unknown:
+            raise TypeError(f"unknown Ollama options: {', '.join(sorted(unknown))}")
+        self.model = model
+        self.system = system
+        self.keep_alive = keep_alive
+        self.host = host
+        self.format = format      # "json" or a JSON schema the answer must follow (structured output)
+        self.options = options
+
+    def __getattr__(self, name):
+        # Options read like OllamaLLM attributes (model.temperature, model.num_ctx, ...)
+        if name in OPTION_NAMES:
+            return self.options.get(name)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"OllamaModel({self.model!r})"
+
+    def _payload(self, messages, stream, tools=None):
+        payload = {"model": self.model, "messages": to_chat_messages(messages, self.system), "stream": stream}
+        if tools:
+            payload["tools"] = tools
+        if self.format is not None:
+            payload["format"] = self.format
+        if self.options:
+            payload["options"] = self.options
+        return self._with_keep_alive(payload)
+
+    def _with_keep_alive(self, payload):
+        keep_alive = self.keep_alive
+        if keep_alive is None and _residency is not None:
+            keep_alive = _residency.keep_alive(self.model)
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    @contextlib.contextmanager
+    def _slot(self):
+        # The residency manager decides when the model may run (no needless swaps; it sees
+        # every waiting request), then the scheduler orders the requests of that model
+        check_cancelled(self.model)
+        with _residency.slot(self.model) if _residency is not None else contextlib.nullcontext():
+            with _scheduler.slot(self.model) if _scheduler is not None else contextlib.nullcontext():
+                yield
+
+    @contextlib.asynccontextmanager
+    async def _aslot(self):
+        async with _residency.aslot(self.model) if _residency is not None else contextlib.nullcontext():
+            async with _scheduler.aslot(self.model) if _scheduler is not None else contextlib.nullcontext():
+                yield
+
+    def chat(self, messages, tools=None):
+        """The whole assistant message (content, and tool_calls when tools were offered)."""
+        start = time.perf_counter()
+        with self._slot():
+            data = get_transport().request("POST", "/api/chat", self._payload(messages, False, tools), self.host)
+        _notify(self.model, data, start)
+        return data["message"]
+
+    def invoke(self, messages):
+        return self.chat(messages)["content"]
+
+    def stream(self, messages):
+        start = time.perf_counter()
+        generated = 0
+        try:
+            with self._slot():
+                for chunk in get_transport().stream("POST", "/api/chat", self._payload(messages, True), self.host):
+                    if chunk.get("message", {}).get("content"):
+                        generated += 1
+                        yield chunk["message"]["content"]
+                    if chunk.get("done"):
+                        _notify(self.model, chunk, start)
+        except GeneratorExit:
+            # Closed before the end (e.g. a classifier stopped at its label): report what was generated
+            _notify(self.model, {"eval_count": generated, "done_reason": "cancelled"}, start)
+            raise
+
+    async def achat(self, messages, tools=None):
+        start = time.perf_counter()
+        async with self._aslot():
+            data = await get_async_transport().request("POST", "/api/chat", self._payload(messages, False, tools),
+                                                       self.host)
+        _notify(self.model, data, start)
+        return data["message"]
+
+    async def ainvoke(self, messages):
+        return (await self.achat(messages))["content"]
+
+    async def astream(self, messages):
+        start = time.perf_counter()
+        generated = 0
+        try:
+            async with self._aslot():
+                async for chunk in get_async_transport().stream("POST", "/api/chat", self._payload(messages, True),
+                                                                self.host):
+                    if chunk.get("message", {}).get("content"):
+                        generated += 1
+                        yield chunk["message"]["content"]
+                    if chunk.get("done"):
+                        _notify(self.model, chunk, start)
+        except GeneratorExit:
+            _notify(self.model, {"eval_count": generated, "done_reason": "cancelled"}, start)
+            raise
+
+    def embed(self, text):
+        """Embedding vector of a text (for embedding models)."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        """Embedding vectors of several texts in one request."""
+        # Through the slots too: the embedding model is resident like any other
+        payload = self._with_keep_alive({"model": self.model, "input": list(texts)})
+        with self._slot():
+            data = get_transport().request("POST", "/api/embed", payload, self.host)
+        return data["embeddings"]
+
+
+def get_model(model, **settings):
+    """Shared OllamaModel for (model, settings): identical handles are created once."""
+    key = (model, json.dumps(settings, sort_keys=True, default=str))
+    with _shared_lock:
+        handle = _models.get(key)
+        if handle is None:
+            handle = _models[key] = OllamaModel(model, **settings)
+        return handle
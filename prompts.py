@@ -0,0 +1,38 @@
+import textwrap
+from langchain_core.messages import SystemMessage, HumanMessage
+
+# Prompt assembly that keeps Ollama's KV cache useful.
+#
+# Ollama keeps the evaluated prompt of each slot and only prefills what comes
+# after the longest prefix shared with the new request. That only pays off if
+# every prompt sent to a model is the previous one plus new messages:
+#
+#   [system] + history (append-only) + [new message(s)]
+#
+# - the system prompt is the same bytes on every call (dedented once),
+# - the history is only ever appended to (trimmed in big steps, see
+#   ConversationMemory(trim_to=...)), and never duplicated in the suffix,
+# - per-call instructions go at the end, never in front of the history.
+#
+# /api/chat reuses the cache by prefix on its own, so the deprecated `context`
+# field of /api/generate is not needed.
+
+
+def system_prompt(text):
+    """SystemMessage with the source indentation and blank edges removed, identical on every call."""
+    return SystemMessage(content=textwrap.dedent(text).strip())
+
+
+def stable_message(text):
+    """A fixed user instruction (e.g. the checker request), identical on every call."""
+    return HumanMessage(content=textwrap.dedent(text).strip())
+
+
+def shared_prefix(previous, current):
+    """Number of leading messages two prompts have in common (role and exact content)."""
+    count = 0
+    for old, new in zip(previous, current):
+        if old.type != new.type or old.content != new.content:
+            break
+        count += 1
+    return count
@@ -0,0 +1,120 @@
+import re
+import ast
+import time
+import random
+from contextlib import contextmanager
+
+# Cheap local checks that decide whether a draft needs the checker model.
+#
+# check_response re-sends history + answer to a second large model, and most of
+# the time it returns the answer unchanged. The gate only sends the draft there
+# when a local check fails, or for a random sample of turns (to keep an eye on
+# the drafts that pass).
+
+SAMPLE_RATE = 0.05       # Fraction of passing drafts that are checked anyway
+MIN_CHARS = 2            # Shorter than this counts as empty
+MAX_CHARS = 6000         # Longer than this is sent to the checker to be tightened
+
+_CODE_BLOCK = re.compile(r"```[ \t]*([\w+#-]*)[^\n]*\n(.*?)```", re.DOTALL)
+_DANGLING_CHARS = (",", ":", ";", "(", "[", "{", "-", "=", "+", "\\")    # Not "*" / "/": markdown bold, URLs
+_DANGLING_WORDS = {"and", "or", "the", "a", "an", "to", "of", "with"}
+
+
+def find_problems(response, max_chars=MAX_CHARS):
+    """Return a list with the reasons a draft looks wrong (empty list = looks fine)."""
+    problems = []
+    text = response.strip()
+
+    if len(text) < MIN_CHARS:
+        return ["empty"]
+    if len(text) > max_chars:
+        problems.append("too_long")
+
+    if text.count("```") % 2:
+        problems.append("unbalanced_code_fence")
+    elif text.endswith(_DANGLING_CHARS) or text.split()[-1].lower() in _DANGLING_WORDS:
+        problems.append("truncated")
+
+    for language, code in _CODE_BLOCK.findall(text):
+        if language.lower() in ("python", "py", "python3"):
+            try:
+                ast.parse(code)
+            except SyntaxError:
+                problems.append("python_syntax_error")
+                break
+
+    return problems
+
+
+class QualityGate:
+    """Decides per turn whether check_response runs, and keeps the metrics."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, max_chars=MAX_CHARS, seed=None):
+        self.sample_rate = sample_rate
+        self.max_chars = max_chars
+        self._random = random.Random(seed)
+
+        self.turns = 0
+        self.checked = 0
+        self.sampled = 0
+        self.problems = {}
+        self.checker_seconds = 0.0
+        self.last_problems = []
+
+    def needs_check(self, response):
+        """True when the draft should go to the checker model."""
+        self.turns += 1
+        self.last_problems = find_problems(response, self.max_chars)
+        for problem in self.last_problems:
+            self.problems[problem] = self.problems.get(problem, 0) + 1
+
+        if self.last_problems:
+            self.checked += 1
+            return True
+        if self._random.random() < self.sample_rate:
+            self.checked += 1
+            self.sampled += 1
+            return True
+        return False
+
+    @contextmanager
+    def timing(self):
+        """Time a checker call (used to estimate the time saved by skipping it)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.checker_seconds += time.perf_counter() - start
+
+    def metrics(self):
+        avg_checker = self.checker_seconds / self.checked if self.checked else 0.0
+        skipped = self.turns - self.checked
+        return {
+            "turns": self.turns,
+            "checker_calls": self.checked,
+            "checker_sampled": self.sampled,
+            "checker_rate": self.checked / self.turns if self.turns else 0.0,
+            "checker_avg_s": avg_checker,
+            "latency_saved_s": skipped * avg_checker,   # Skipped calls x average checker latency
+            "problems": dict(self.problems),
+        }
+
+    def prometheus(self):
+        """Metrics in Prometheus text format."""
+        metrics = self.metrics()
+        lines = [
+            "# TYPE quality_gate_turns_total counter",
+            f"quality_gate_turns_total {metrics['turns']}",
+            "# TYPE quality_gate_checker_calls_total counter",
+            f"quality_gate_checker_calls_total {metrics['checker_calls']}",
+            "# TYPE quality_gate_checker_sampled_total counter",
+            f"quality_gate_checker_sampled_total {metrics['checker_sampled']}",
+            "# TYPE quality_gate_checker_seconds_total counter",
+            f"quality_gate_checker_seconds_total {self.checker_seconds:.6f}",
+            "# TYPE quality_gate_latency_saved_seconds gauge",
+            f"quality_gate_latency_saved_seconds {metrics['latency_saved_s']:.6f}",
+            "# TYPE quality_gate_problems_total counter",
+        ]
+        for problem, count in sorted(self.problems.items()):
+            lines.append(f'quality_gate_problems_total{{problem="{problem}"}} {count}')
+        return "\n".join(lines) + "\n"
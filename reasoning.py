@@ -0,0 +1,214 @@
+import re
+import threading
+from memory import estimate_tokens
+from router import CATEGORIES, normalize_label
+
+# Output post-processing for reasoning models (deepseek-r1 and the like).
+#
+# These models write a <think>...</think> block before the answer. Left alone,
+# that block ends up in the category label, in the checked response and in the
+# chat history, and classification waits for the model to finish writing
+# whatever follows the label too. Here:
+#
+#   - ReasoningFilter splits a token stream into reasoning and answer text
+#     (tags split across chunks are handled),
+#   - stream_label() / astream_label() stream a classification and close the
+#     stream (which stops generation on the server) as soon as the answer names
+#     a label, so nothing after the label is generated,
+#   - strip_reasoning() removes the block from a finished text before it is
+#     used as a response or enters the history,
+#   - token_savings counts what that saved, per turn and in total.
+#
+# The per-node num_predict caps are Ollama options in the agent config
+# (e.g. configs/ollama_agent4.toml), so a runaway reasoning block is cut by
+# the server; if the cap ends it before a label, the last label the reasoning
+# leaned towards is used.
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+REASONING_MODELS = ("deepseek-r1", "qwq", "phi4-reasoning")   # Name prefixes of models that think out loud
+
+_THINK_BLOCK = re.compile(r"<think>.*?(</think>|$)", re.DOTALL)
+_LABELS = {"code": r"\bcode\b", "natural_language": r"\bnatural[\s_-]*language\b"}
+
+
+def _label_pattern(label):
+    return _LABELS.get(label, r"\b" + re.escape(label).replace("_", r"[\s_-]*") + r"\b")
+
+
+def is_reasoning_model(name):
+    return str(name).split("/")[-1].startswith(REASONING_MODELS)
+
+
+def find_label(text, labels=CATEGORIES):
+    """The first label written in text, or None while there is none yet."""
+    found = None
+    for label in labels:
+        match = re.search(_label_pattern(label), text, re.IGNORECASE)
+        if match and (found is None or match.start() < found[0]):
+            found = (match.start(), label)
+    return found and found[1]
+
+
+class TokenSavings:
+    """Reasoning tokens kept out of responses / history and classification streams stopped early."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"label_streams": 0, "stopped_early": 0, "label_tokens": 0,
+                         "reasoning_tokens_stripped": 0, "capped_before_label": 0}
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def since(self, snapshot):
+        """Counters accumulated after snapshot (e.g. during one turn)."""
+        current = self.snapshot()
+        return {name: current[name] - snapshot.get(name, 0) for name in current}
+
+    def report(self, snapshot):
+        """One line about the turn since snapshot, or None when nothing was saved."""
+        turn = self.since(snapshot)
+        if not turn["reasoning_tokens_stripped"] and not turn["stopped_early"]:
+            return None
+        report = f"~{turn['reasoning_tokens_stripped']} reasoning tokens kept out of the answers and history"
+        if turn["label_streams"]:
+            report += (f", {turn['stopped_early']}/{turn['label_streams']} classifications stopped at the label "
+                       f"({turn['label_tokens']} tokens generated for them)")
+        return report
+
+    def stats(self):
+        return self.snapshot()
+
+
+token_savings = TokenSavings()
+
+
+class ReasoningFilter:
+    """Splits streamed chunks into reasoning (inside <think>...</think>) and answer text."""
+
+    def __init__(self):
+        self.state = "start"       # start -> think -> answer, or start -> answer
+        self.pending = ""
+        self.reasoning = []
+        self.answer = ""
+        self.reasoning_tokens = 0
+        self.tokens = 0
+
+    def feed(self, chunk):
+        """Consume one chunk; returns the answer text it produced (possibly "")."""
+        self.tokens += 1
+        if self.state == "think":
+            self.reasoning_tokens += 1
+        self.pending += chunk
+        produced = ""
+        while self.pending:
+            if self.state == "start":
+                head = self.pending.lstrip()
+                if head.startswith(THINK_OPEN):
+                    self.state, self.pending = "think", head[len(THINK_OPEN):]
+                    self.reasoning_tokens += 1
+                elif THINK_OPEN.startswith(head):
+                    break              # Maybe the beginning of the tag: wait for more
+                else:
+                    self.state = "answer"
+            elif self.state == "think":
+                end = self.pending.find(THINK_CLOSE)
+                if end < 0:
+                    keep = len(THINK_CLOSE) - 1           # The closing tag may be split over chunks
+                    self.reasoning.append(self.pending[:-keep])
+                    self.pending = self.pending[-keep:]
+                    break
+                self.reasoning.append(self.pending[:end])
+                self.state, self.pending = "answer", self.pending[end + len(THINK_CLOSE):].lstrip()
+            else:
+                produced += self.pending
+                self.pending = ""
+        self.answer += produced
+        return produced
+
+    def finish(self):
+        """Flush what is still pending at the end of the stream."""
+        if self.state == "think":
+            self.reasoning.append(self.pending)
+        else:
+            self.answer += self.pending
+        self.pending = ""
+        return self.answer
+
+    @property
+    def thinking(self):
+        return "".join(self.reasoning)
+
+
+def strip_reasoning(text, savings=token_savings):
+    """text without <think>...</think> blocks (an unterminated block runs to the end)."""
+    if THINK_OPEN not in text:
+        return text
+    stripped = _THINK_BLOCK.sub("", text)
+    savings.add(reasoning_tokens_stripped=estimate_tokens(text) - estimate_tokens(stripped))
+    return stripped.strip()
+
+
+def _labelled(parser, label, savings, labels):
+    parser.finish()
+    if label is None:
+        label = find_label(parser.answer, labels)
+    if label is None:
+        # num_predict ran out while thinking: go with the last label the reasoning leaned towards
+        mentions = [(match.start(), name) for name in labels
+                    for match in re.finditer(_label_pattern(name), parser.thinking, re.IGNORECASE)]
+        if mentions:
+            label = max(mentions)[1]
+        else:
+            label = normalize_label(parser.answer) if tuple(labels) == CATEGORIES else labels[-1]
+        savings.add(capped_before_label=1)
+    savings.add(label_streams=1, label_tokens=parser.tokens, reasoning_tokens_stripped=parser.reasoning_tokens)
+    return label
+
+
+def stream_label(model, messages, savings=token_savings, labels=CATEGORIES):
+    """Classify with a streamed answer, closing the stream as soon as it names one of labels."""
+    parser = ReasoningFilter()
+    label = None
+    stream = model.stream(messages)
+    try:
+        for chunk in stream:
+            if parser.feed(chunk) and (label := find_label(parser.answer, labels)):
+                savings.add(stopped_early=1)
+                break
+    finally:
+        stream.close()    # Closes the connection: the server stops generating
+    return _labelled(parser, label, savings, labels)
+
+
+async def astream_label(model, messages, savings=token_savings, labels=CATEGORIES):
+    """Async stream_label()."""
+    parser = ReasoningFilter()
+    label = None
+    stream = model.astream(messages)
+    try:
+        async for chunk in stream:
+            if parser.feed(chunk) and (label := find_label(parser.answer, labels)):
+                savings.add(stopped_early=1)
+                break
+    finally:
+        await stream.aclose()
+    return _labelled(parser, label, savings, labels)
+
+
+def visible_tokens(on_token):
+    """Wrap a streaming callback so reasoning is not shown; returns (callback, parser)."""
+    parser = ReasoningFilter()
+
+    def callback(chunk):
+        text = parser.feed(chunk)
+        if text:
+            on_token(text)
+    return callback, parser
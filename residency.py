@@ -0,0 +1,256 @@
+import os
+import time
+import asyncio
+import threading
+import contextlib
+import contextvars
+from collections import Counter, defaultdict
+from ollama_client import OLLAMA_HOST, OllamaError, OllamaCancelled, add_observer, check_cancelled, get_transport
+
+# Model residency manager for the multi-model agents.
+#
+# The agents bounce between models (mistral classifies, phi or codellama
+# answer, mistral checks), and when the GPU only fits one or two of them
+# Ollama unloads and reloads on every hop. The manager:
+#
+#   - learns which models are hot (load_duration of each answer, /api/ps) and
+#     which model usually follows which,
+#   - gives hot models a long keep_alive and cold ones a short one,
+#   - pre-warms the most likely next model when there is room for it,
+#   - holds requests for a model that is not loaded while another one is busy,
+#     so requests from many sessions run in batches per model instead of
+#     swapping on every call (no request waits more than max_wait for that).
+#
+#   set_residency_manager(ResidencyManager())   # from ollama_client
+
+# Models that fit in memory together: Ollama's own default is 3 (per GPU); raised when /api/ps shows more
+MAX_LOADED_MODELS = int(os.environ.get("OLLAMA_MAX_LOADED_MODELS", 3))
+HOT_KEEP_ALIVE = "30m"       # keep_alive of the models that take most of the traffic
+COLD_KEEP_ALIVE = "2m"       # keep_alive of the rest, so they free memory soon
+MAX_WAIT = 2.0               # Seconds a request can be held back to batch another model's requests
+LOAD_THRESHOLD = 0.05        # load_duration (seconds) above which an answer counts as a model load
+PREWARM_CONFIDENCE = 0.6     # Share of transitions a next model needs before it is pre-warmed
+POLL_INTERVAL = 0.005        # Seconds between admission checks of async requests
+MAX_SESSIONS = 10_000        # Sessions whose last model is remembered
+
+_session = contextvars.ContextVar("residency_session", default=None)
+
+
+def set_session(session_id):
+    """Tag the requests of the current turn with a session, so transitions are learned per conversation."""
+    _session.set(session_id)
+
+
+def current_session():
+    return _session.get()
+
+
+class ResidencyManager:
+    """Per-model keep_alive, pre-warming and swap-minimising admission of Ollama requests."""
+
+    def __init__(self, host=OLLAMA_HOST, max_loaded=MAX_LOADED_MODELS, hot_keep_alive=HOT_KEEP_ALIVE,
+                 cold_keep_alive=COLD_KEEP_ALIVE, max_wait=MAX_WAIT, prewarm=True):
+        self.host = host
+        self.max_loaded = max_loaded
+        self.hot_keep_alive = hot_keep_alive
+        self.cold_keep_alive = cold_keep_alive
+        self.max_wait = max_wait
+        self.prewarm_enabled = prewarm
+
+        self.loaded = {}                          # model -> last time used, as far as we know
+        self.active = Counter()                   # model -> requests running
+        self.queue = []                           # [since, model] of the requests held back
+        self.usage = Counter()
+        self.transitions = defaultdict(Counter)   # model -> Counter of the model requested next
+        self._last_model = {}                     # session -> model of its previous request
+        self.condition = threading.Condition()
+        self.counters = {"requests": 0, "held": 0, "held_seconds": 0.0, "starved": 0,
+                         "loads": 0, "load_seconds": 0.0, "prewarms": 0}
+        self._prewarming = set()
+        self._refreshed = False                   # /api/ps is read when the first request arrives
+
+        add_observer(self.observe)
+
+    # ---------- what is loaded ----------
+
+    def refresh(self):
+        """Read the loaded models from /api/ps (more of them than max_loaded means more fit)."""
+        try:
+            running = get_transport().request("GET", "/api/ps", host=self.host).get("models", [])
+        except OllamaError:
+            return
+        now = time.monotonic()
+        with self.condition:
+            names = {model.get("model") or model.get("name") for model in running}
+            self.loaded = {name: self.loaded.get(name, now) for name in names}
+            self.max_loaded = max(self.max_loaded, len(names))
+
+    def _refresh_once(self):
+        # In the background: neither building the manager nor the first request waits for the server
+        with self.condition:
+            if self._refreshed:
+                return
+            self._refreshed = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def observe(self, model, stats, seconds):
+        """Observer of every answer (see ollama_client.add_observer)."""
+        load_seconds = stats.get("load_duration", 0) / 1e9
+        if load_seconds > LOAD_THRESHOLD:
+            with self.condition:
+                self.counters["loads"] += 1
+                self.counters["load_seconds"] += load_seconds
+
+    def _mark_loaded(self, model):
+        self.loaded[model] = time.monotonic()
+        while len(self.loaded) > self.max_loaded:
+            idle = [m for m in self.loaded if not self.active[m] and m != model]
+            if not idle:
+                break
+            del self.loaded[min(idle, key=self.loaded.get)]   # Ollama unloads the least recently used
+
+    def hot_models(self):
+        return {model for model, _ in self.usage.most_common(self.max_loaded)}
+
+    def keep_alive(self, model):
+        return self.hot_keep_alive if model in self.hot_models() else self.cold_keep_alive
+
+    def predict_next(self, model):
+        """Most likely model after this one, or None if no model is likely enough."""
+        following = self.transitions.get(model)
+        if not following:
+            return None
+        candidate, count = following.most_common(1)[0]
+        return candidate if count / sum(following.values()) >= PREWARM_CONFIDENCE else None
+
+    # ---------- admission ----------
+
+    def _may_run(self, ticket):
+        since, model = ticket
+        now = time.monotonic()
+        running = {m for m, n in self.active.items() if n}
+        oldest = min(self.queue) if self.queue else None
+        if oldest is not None and now - oldest[0] > self.max_wait and oldest[1] != model:
+            return False            # Another model's request waited too long: let the running ones drain
+        if model in running:
+            return True             # Already loaded and busy: joins the batch, no swap
+        if len(running) >= self.max_loaded:
+            return False
+        if oldest is not None and now - oldest[0] > self.max_wait:
+            return True             # This model is the starving one
+        # Free room: a loaded model goes first (no load at all), otherwise the model
+        # of the oldest request, which then takes all its waiting requests with it
+        waiting = [ticket for ticket in self.queue if ticket[1] in self.loaded] or self.queue
+        return min(waiting)[1] == model
+
+    def _start(self, ticket, record=True):
+        since, model = ticket
+        held = time.monotonic() - since
+        if held > POLL_INTERVAL:
+            self.counters["held"] += 1
+            self.counters["held_seconds"] += held
+            if held > self.max_wait:
+                self.counters["starved"] += 1
+        self.queue.remove(ticket)
+        self.active[model] += 1
+        self._mark_loaded(model)
+        if not record:
+            return
+        self.usage[model] += 1
+        self.counters["requests"] += 1
+
+        session = _session.get()
+        previous = self._last_model.get(session)
+        if previous is not None:
+            self.transitions[previous][model] += 1
+        self._last_model[session] = model
+        if len(self._last_model) > MAX_SESSIONS:
+            self._last_model.pop(next(iter(self._last_model)))
+
+    def _finish(self, model):
+        with self.condition:
+            self.active[model] -= 1
+            self.loaded[model] = time.monotonic()
+            self.condition.notify_all()
+            idle = not self.queue and not any(self.active.values())
+        if idle and self.prewarm_enabled:
+            self._maybe_prewarm(model)
+
+    @contextlib.contextmanager
+    def slot(self, model, record=True):
+        """Hold a sync request until running it does not force a needless swap."""
+        self._refresh_once()
+        with self.condition:
+            ticket = (time.monotonic(), model)
+            self.queue.append(ticket)
+            try:
+                while not self._may_run(ticket):
+                    check_cancelled(model)      # A speculative branch that lost while held back
+                    self.condition.wait(timeout=self.max_wait / 4)    # Wake up to re-check starvation
+            except OllamaCancelled:
+                self.queue.remove(ticket)
+                self.condition.notify_all()
+                raise
+            self._start(ticket, record)
+        try:
+            yield
+        finally:
+            self._finish(model)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, model):
+        """Async twin of slot(); polls instead of blocking the event loop."""
+        self._refresh_once()
+        ticket = (time.monotonic(), model)
+        with self.condition:
+            self.queue.append(ticket)
+        try:
+            while True:
+                with self.condition:
+                    if self._may_run(ticket):
+                        self._start(ticket)
+                        break
+                await asyncio.sleep(POLL_INTERVAL)
+        except BaseException:
+            with self.condition:
+                self.queue.remove(ticket)
+                self.condition.notify_all()
+            raise
+        try:
+            yield
+        finally:
+            self._finish(model)
+
+    # ---------- pre-warming ----------
+
+    def _maybe_prewarm(self, model):
+        with self.condition:
+            candidate = self.predict_next(model)
+            if candidate is None or candidate in self.loaded or candidate in self._prewarming:
+                return
+            if len(self.loaded) >= self.max_loaded and candidate not in self.hot_models():
+                return      # Only evict something for a model that takes most of the traffic
+            self._prewarming.add(candidate)
+        threading.Thread(target=self._prewarm, args=(candidate,), daemon=True).start()
+
+    def _prewarm(self, model):
+        # An empty prompt makes Ollama load the model and return at once
+        try:
+            with self.slot(model, record=False):
+                get_transport().request("POST", "/api/generate",
+                                        {"model": model, "keep_alive": self.keep_alive(model)}, self.host)
+            with self.condition:
+                self.counters["prewarms"] += 1
+        except OllamaError:
+            pass
+        finally:
+            with self.condition:
+                self._prewarming.discard(model)
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counters,
+                        loaded=sorted(self.loaded),
+                        hot=sorted(self.hot_models()),
+                        queued=len(self.queue),
+                        transitions={m: dict(c) for m, c in self.transitions.items()})
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Response cache for the model wrappers used by the agents.
+#
+# Lookups go memory LRU (with TTL) -> SQLite on disk -> the model. Keys are a
+# hash of the model name, the exact system prompt, the normalised message list
+# and the sampling options, so only truly identical requests share an answer.
+
+FOLDER_NAME = "IA_assistant_history"
+CACHE_PATH = os.path.join(FOLDER_NAME, "response_cache.sqlite")
+
+MEMORY_ENTRIES = 512                 # Entries kept in the in-memory LRU
+TTL_SECONDS = 7 * 24 * 3600          # Entries older than this are ignored and evicted
+MAX_DISK_BYTES = 256 * 1024 * 1024   # Size bound of the on-disk store
+TOUCH_BATCH = 64                     # Disk hits whose LRU timestamp is written in one transaction
+
+# Options that change what the model generates
+SAMPLING_OPTIONS = ("temperature", "top_k", "top_p", "seed", "num_ctx", "num_predict",
+                    "repeat_penalty", "stop", "format", "mirostat", "tfs_z")
+
+
+def normalize_messages(messages):
+    """
+    Turn a prompt (string, dicts or LangChain messages) into [(role, text)].
+    Only line endings and the whitespace around each text are normalised: indentation
+    and newlines inside it are meaning (code, YAML, Makefiles) and stay in the key.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        if isinstance(message, dict):
+            role, content = message.get("role", "user"), message.get("content", "")
+        else:
+            role, content = message.type, message.content
+        role = {"human": "user", "ai": "assistant"}.get(role, role)
+        text = str(content).replace("\r\n", "\n").replace("\r", "\n").strip()
+        normalized.append((role, text))
+    return normalized
+
+
+def cache_key(model, system, messages, options):
+    payload = json.dumps({
+        "model": model,
+        "system": system,
+        "messages": normalize_messages(messages),
+        "options": options,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-level (memory LRU + SQLite) cache with TTL and a size bound."""
+
+    def __init__(self, path=CACHE_PATH, memory_entries=MEMORY_ENTRIES,
+                 ttl=TTL_SECONDS, max_bytes=MAX_DISK_BYTES):
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()      # key -> (created, value)
+        self._touched = {}                # key -> accessed, not yet written (LRU order of disk hits)
+        self._lock = threading.Lock()
+        self.path = path
+        self._db = None                   # Opened on first use
+        self._bytes = 0
+
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "evicted": 0}
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._db = db
+        return db
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+
+            row = self._connect().execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                # The read path doesn't commit: LRU timestamps are written in batches
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH:
+                    self._write_touches()
+                    self._db.commit()
+                self._remember(key, row[1], row[0])
+                self.counters["disk_hits"] += 1
+                return row[0]
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, now, value)
+            old = self._connect().execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, value, size, now, now))
+            self._bytes += size - (old[0] if old else 0)
+            self._touched.pop(key, None)
+            self._write_touches()      # Eviction goes by the accessed column
+            self._evict(now)
+            self._db.commit()
+
+    def _write_touches(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                 [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones until under 90% of max_bytes."""
+        if self._bytes <= self.max_bytes:
+            return
+        cursor = self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self.counters["evicted"] += cursor.rowcount
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        target = int(self.max_bytes * 0.9)
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if self._bytes <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._bytes -= size
+            self.counters["evicted"] += 1
+
+    def stats(self):
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return dict(self.counters,
+                    hit_ratio=hits / lookups if lookups else 0.0,
+                    bytes_stored=self._bytes,
+                    memory_entries=len(self._memory))
+
+    def close(self):
+        with self._lock:
+            if self._db is None:
+                return
+            self._write_touches()
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+
+class CachedLLM:
+    """
+    Wraps an OllamaLLM-like model (invoke/stream) with a ResponseCache.
+    Requests with temperature > 0 (or unset, which means the model default)
+    are not cached unless cache_sampled=True.
+    """
+
+    def __init__(self, llm, cache, cache_sampled=False):
+        self.llm = llm
+        self.cache = cache
+        self.cache_sampled = cache_sampled
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)    # .model, .temperature, ...
+
+    def _key(self, messages):
+        options = {name: getattr(self.llm, name, None) for name in SAMPLING_OPTIONS}
+        temperature = options["temperature"]
+        if not self.cache_sampled and (temperature is None or temperature > 0):
+            self.cache.counters["bypassed"] += 1
+            return None
+        return cache_key(self.llm.model, getattr(self.llm, "system", None), messages, options)
+
+    def invoke(self, messages, **kwargs):
+        key = self._key(messages)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        response = self.llm.invoke(messages, **kwargs)
+        if key is not None:
+            self.cache.put(key, response)
+        return response
+
+    def stream(self, messages, **kwargs):
+        key = self._key(messages)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        for chunk in self.llm.stream(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if key is not None:
+            self.cache.put(key, "".join(chunks))
+
+    async def ainvoke(self, messages, **kwargs):
+        key = self._key(messages)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        response = await self.llm.ainvoke(messages, **kwargs)
+        if key is not None:
+            self.cache.put(key, response)
+        return response
+
+    async def astream(self, messages, **kwargs):
+        key = self._key(messages)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        async for chunk in self.llm.astream(messages, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if key is not None:
+            self.cache.put(key, "".join(chunks))
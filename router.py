@@ -0,0 +1,268 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import asyncio
+import threading
+from array import array
+
+# Tiered query router: decides "code" vs "natural_language" without calling
+# the classifier LLM whenever it can.
+#
+#   1. keywords - one compiled regex over programming words (microseconds)
+#   2. scorer   - hashed n-gram logistic regression trained from logged decisions
+#   3. llm      - the classifier model, only when the cheaper tiers are not confident
+#
+# CategoryRouter does the same for any number of categories (specialists.py):
+# per-category keywords, then the classifier LLM.
+
+CATEGORIES = ("code", "natural_language")
+
+CODE_KEYWORDS = ["python", "java", "c++", "c#", "javascript", "sql", "database",
+                 "algorithm", "function", "loop", "debugging", "debug", "api", "class",
+                 "object", "variable", "programming", "coding", "compile", "regex",
+                 "json", "html", "css", "bash"]
+
+FOLDER_NAME = "IA_assistant_history"
+LOG_PATH = os.path.join(FOLDER_NAME, "classifications.jsonl")  # Decisions used as training data
+MODEL_PATH = os.path.join(FOLDER_NAME, "router_weights.bin")
+
+CONFIDENCE_THRESHOLD = 0.85   # Below this the classifier LLM is consulted
+KEYWORD_CONFIDENCE = 0.95     # Confidence given to a keyword hit
+HASH_BITS = 18                # 2^18 weights (~2 MB) for the hashed features
+
+
+def normalize_label(text):
+    """Map a free-text classifier answer to one of CATEGORIES."""
+    text = text.strip().lower()
+    if "natural" in text:
+        return "natural_language"
+    return "code" if "code" in text else "natural_language"
+
+
+def compile_keywords(keywords):
+    """Build one case-insensitive regex that matches any keyword as a whole word."""
+    # Longest first so "javascript" wins over "java"; lookarounds instead of \b
+    # because keywords like "c++" and "c#" end in non-word characters
+    alternatives = "|".join(re.escape(word) for word in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf"(?<![\w+#])(?:{alternatives})(?![\w+#])", re.IGNORECASE)
+
+
+class NGramScorer:
+    """Logistic regression over hashed word uni/bigrams and character trigrams."""
+
+    def __init__(self, bits=HASH_BITS):
+        self.size = 1 << bits
+        self.weights = array("d", bytes(8 * self.size))
+        self.bias = 0.0
+
+    def features(self, text):
+        words = re.findall(r"\w+|[^\w\s]", text.lower())
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        padded = f" {text.lower()} "
+        grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return {zlib.crc32(gram.encode("utf-8")) & (self.size - 1) for gram in grams}
+
+    def probability(self, text, features=None):
+        """Probability that the query is about code."""
+        features = features if features is not None else self.features(text)
+        z = self.bias + sum(self.weights[i] for i in features)
+        z = max(-30.0, min(30.0, z))
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def train(self, examples, epochs=5, learning_rate=0.2):
+        """SGD over (text, category) pairs."""
+        data = [(self.features(text), 1.0 if category == "code" else 0.0)
+                for text, category in examples]
+        for _ in range(epochs):
+            for features, target in data:
+                error = target - self.probability(None, features)
+                step = learning_rate * error / math.sqrt(len(features) or 1)
+                for i in features:
+                    self.weights[i] += step
+                self.bias += learning_rate * error * 0.1
+
+    def save(self, path=MODEL_PATH):
+        with open(path, "wb") as f:
+            array("d", [self.bias]).tofile(f)
+            self.weights.tofile(f)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, bits=HASH_BITS):
+        scorer = cls(bits)
+        with open(path, "rb") as f:
+            bias = array("d")
+            bias.fromfile(f, 1)
+            scorer.bias = bias[0]
+            scorer.weights = array("d")
+            scorer.weights.fromfile(f, scorer.size)
+        return scorer
+
+
+class QueryRouter:
+    """
+    Route a query through the cheapest tier that is confident enough.
+    `llm_classify(query)` is the fallback and must return the model's raw answer
+    (`allm_classify` is its optional async twin, used by aroute()).
+    """
+
+    def __init__(self, llm_classify, threshold=CONFIDENCE_THRESHOLD,
+                 keywords=CODE_KEYWORDS, scorer=None, log_path=LOG_PATH, allm_classify=None):
+        self.llm_classify = llm_classify
+        self.allm_classify = allm_classify
+        self.threshold = threshold
+        self.keyword_pattern = compile_keywords(keywords)
+        self.log_path = log_path
+        self._log_lock = threading.Lock()    # aroute() appends from worker threads
+
+        if scorer is None and os.path.exists(MODEL_PATH):
+            scorer = NGramScorer.load()
+        self.scorer = scorer
+
+        self.counters = {"keywords": 0, "scorer": 0, "llm": 0}
+        self.seconds = {"keywords": 0.0, "scorer": 0.0, "llm": 0.0}
+        self.last_tier = None
+
+    def _decide(self, tier, category, start):
+        self.counters[tier] += 1
+        self.seconds[tier] += time.perf_counter() - start
+        self.last_tier = tier
+        return category
+
+    def _fast_route(self, query, start):
+        """Tiers 1 and 2; returns None when neither is confident enough."""
+        # Tier 1: keyword hit
+        if KEYWORD_CONFIDENCE >= self.threshold and self.keyword_pattern.search(query):
+            return self._decide("keywords", "code", start)
+
+        # Tier 2: local scoring model
+        if self.scorer is not None:
+            p_code = self.scorer.probability(query)
+            if max(p_code, 1.0 - p_code) >= self.threshold:
+                return self._decide("scorer", "code" if p_code >= 0.5 else "natural_language", start)
+        return None
+
+    def fast_route(self, query):
+        """Tiers 1 and 2 only; None when the classifier LLM would have to decide."""
+        return self._fast_route(query, time.perf_counter())
+
+    def prior(self, query):
+        """Cheap {category: probability} guess from the scorer (even odds without one)."""
+        p_code = self.scorer.probability(query) if self.scorer is not None else 0.5
+        return {"code": p_code, "natural_language": 1.0 - p_code}
+
+    def route(self, query):
+        start = time.perf_counter()
+        category = self._fast_route(query, start)
+        if category is not None:
+            return category
+
+        # Tier 3: classifier LLM; its answers become training data for tier 2
+        category = normalize_label(self.llm_classify(query))
+        self._log(query, category)
+        return self._decide("llm", category, start)
+
+    async def aroute(self, query):
+        """Async route(): uses `allm_classify` for tier 3, or runs llm_classify in a thread."""
+        start = time.perf_counter()
+        category = self._fast_route(query, start)
+        if category is not None:
+            return category
+
+        if self.allm_classify is not None:
+            answer = await self.allm_classify(query)
+        else:
+            answer = await asyncio.to_thread(self.llm_classify, query)
+        category = normalize_label(answer)
+        await asyncio.to_thread(self._log, query, category)    # File I/O stays off the event loop
+        return self._decide("llm", category, start)
+
+    def _log(self, query, category):
+        if self.log_path is None:
+            return
+        line = json.dumps({"query": query, "category": category}, ensure_ascii=False) + "\n"
+        with self._log_lock:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def stats(self):
+        """How often each tier decided, and the average time it took."""
+        total = sum(self.counters.values()) or 1
+        return {
+            tier: {
+                "count": count,
+                "share": count / total,
+                "avg_ms": 1000 * self.seconds[tier] / count if count else 0.0,
+            }
+            for tier, count in self.counters.items()
+        }
+
+
+class CategoryRouter:
+    """
+    Router over N categories: the category whose keywords the query hits most
+    decides; no hit or a tie goes to `llm_classify(query)`, which must return
+    one of the categories (constrained.label_classifier gives such a function).
+    """
+
+    def __init__(self, categories, keywords, llm_classify, allm_classify=None):
+        self.categories = tuple(categories)
+        self.patterns = {category: compile_keywords(words) for category, words in keywords.items() if words}
+        self.llm_classify = llm_classify
+        self.allm_classify = allm_classify
+        self.counters = {"keywords": 0, "llm": 0}
+        self.seconds = {"keywords": 0.0, "llm": 0.0}
+        self.last_tier = None
+
+    _decide = QueryRouter._decide
+    stats = QueryRouter.stats
+
+    def fast_route(self, query):
+        """The keyword tier alone; None when it is not decisive."""
+        start = time.perf_counter()
+        hits = {category: len(pattern.findall(query)) for category, pattern in self.patterns.items()}
+        ranked = sorted(hits.values(), reverse=True)
+        if not ranked or ranked[0] == 0 or (len(ranked) > 1 and ranked[0] == ranked[1]):
+            return None
+        return self._decide("keywords", max(hits, key=hits.get), start)
+
+    def route(self, query):
+        category = self.fast_route(query)
+        if category is not None:
+            return category
+        start = time.perf_counter()
+        return self._decide("llm", self.llm_classify(query), start)
+
+    async def aroute(self, query):
+        category = self.fast_route(query)
+        if category is not None:
+            return category
+        start = time.perf_counter()
+        if self.allm_classify is not None:
+            category = await self.allm_classify(query)
+        else:
+            category = await asyncio.to_thread(self.llm_classify, query)
+        return self._decide("llm", category, start)
+
+
+def train_from_log(log_path=LOG_PATH, model_path=MODEL_PATH):
+    """Train the tier-2 scorer from the logged LLM classifications."""
+    examples = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            examples.append((record["query"], record["category"]))
+    scorer = NGramScorer()
+    scorer.train(examples)
+    scorer.save(model_path)
+    print(f"✅ Router scorer trained on {len(examples)} queries -> {model_path}")
+    return scorer
+
+
+if __name__ == "__main__":
+    # python router.py [classifications.jsonl]
+    train_from_log(sys.argv[1] if len(sys.argv) > 1 else LOG_PATH)
@@ -0,0 +1,200 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+import contextlib
+import contextvars
+from collections import Counter, OrderedDict, defaultdict
+from residency import current_session
+from ollama_client import OllamaCancelled, check_cancelled
+from tracing import Histogram, SECONDS_BUCKETS
+
+# Per-model request scheduler between the graph nodes and the transport.
+#
+# Ollama runs up to OLLAMA_NUM_PARALLEL requests of one model at once and
+# queues the rest first come, first served. The scheduler keeps that queue on
+# our side instead, per model, so it can choose what goes next:
+#
+#   - up to num_parallel requests per model are submitted together (Ollama
+#     batches them on the loaded model); the rest wait here,
+#   - waiting requests go by priority (classification before answering before
+#     checking, see PRIORITIES), and a request moves up one level every
+#     AGING_SECONDS so checks are never starved,
+#   - within a priority, the session served longest ago goes first, so one
+#     busy session can't monopolise a model.
+#
+# Queue depth, running requests and wait time per priority are exported in
+# Prometheus format (prometheus()).
+#
+#   set_scheduler(RequestScheduler())                       # from ollama_client
+#   node = prioritized("classify", classify_query)          # requests of the node get that priority
+
+NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))   # Requests per model Ollama runs at once
+PRIORITIES = {"classify": 0, "tools": 1, "process": 1, "check": 2,
+              "speculative": 2,       # Branches started before the classifier decided (speculative.py)
+              "background": 3}
+DEFAULT_PRIORITY = "process"
+AGING_SECONDS = 1.0          # Waiting this long is worth one priority level
+POLL_INTERVAL = 0.005        # Seconds between admission checks of async requests
+MAX_SESSIONS = 10_000        # Sessions whose last service time is remembered, per model
+
+_priority = contextvars.ContextVar("scheduler_priority", default=DEFAULT_PRIORITY)
+
+
+def prioritized(priority, func):
+    """Wrap a graph node (sync or async) so the model requests it makes get this priority."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"unknown priority {priority!r}")
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _priority.set(priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _priority.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _priority.set(priority)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _priority.reset(token)
+    return wrapper
+
+
+class _Ticket:
+    __slots__ = ("model", "priority", "session", "since")
+
+    def __init__(self, model):
+        self.model = model
+        self.priority = _priority.get()
+        self.session = current_session()
+        self.since = time.monotonic()
+
+
+class RequestScheduler:
+    """Per-model admission of Ollama requests: num_parallel at a time, by priority, fair across sessions."""
+
+    def __init__(self, num_parallel=NUM_PARALLEL, aging=AGING_SECONDS):
+        self.num_parallel = num_parallel
+        self.aging = aging
+        self.condition = threading.Condition()
+        self.active = Counter()                          # model -> requests submitted
+        self.waiting = defaultdict(list)                 # model -> [_Ticket]
+        self.last_served = defaultdict(OrderedDict)      # model -> session -> time its last request started
+        self.max_depth = Counter()
+        self.counters = {"requests": 0, "queued": 0, "promoted": 0}
+        self.wait_seconds = Histogram("ollama_scheduler_wait_seconds", "priority", SECONDS_BUCKETS,
+                                      "Time a request waited in the scheduler before being submitted")
+
+    def _rank(self, ticket, now):
+        level = PRIORITIES[ticket.priority] - (now - ticket.since) / self.aging
+        return level, self.last_served[ticket.model].get(ticket.session, 0.0), ticket.since
+
+    def _next(self, model):
+        now = time.monotonic()
+        return min(self.waiting[model], key=lambda ticket: self._rank(ticket, now))
+
+    def _may_run(self, ticket):
+        return self.active[ticket.model] < self.num_parallel and self._next(ticket.model) is ticket
+
+    def _enqueue(self, ticket):
+        queue = self.waiting[ticket.model]
+        queue.append(ticket)
+        self.max_depth[ticket.model] = max(self.max_depth[ticket.model], len(queue))
+
+    def _start(self, ticket):
+        now = time.monotonic()
+        model = ticket.model
+        waited = now - ticket.since
+        if waited > POLL_INTERVAL:
+            self.counters["queued"] += 1
+        if any(PRIORITIES[other.priority] < PRIORITIES[ticket.priority] for other in self.waiting[model]):
+            self.counters["promoted"] += 1     # Aging let it overtake a higher priority
+        self.waiting[model].remove(ticket)
+        self.active[model] += 1
+        self.counters["requests"] += 1
+        self.wait_seconds.observe(ticket.priority, waited)
+        served = self.last_served[model]
+        served[ticket.session] = now
+        served.move_to_end(ticket.session)
+        if len(served) > MAX_SESSIONS:
+            served.popitem(last=False)
+
+    def _finish(self, model):
+        with self.condition:
+            self.active[model] -= 1
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, model):
+        """Hold a sync request until it is its turn for this model."""
+        ticket = _Ticket(model)
+        with self.condition:
+            self._enqueue(ticket)
+            try:
+                while not self._may_run(ticket):
+                    check_cancelled(model)
+                    self.condition.wait(timeout=self.aging)    # Wake up to let aging re-rank
+            except OllamaCancelled:
+                self.waiting[model].remove(ticket)
+                self.condition.notify_all()
+                raise
+            self._start(ticket)
+        try:
+            yield
+        finally:
+            self._finish(model)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, model):
+        """Async twin of slot(); polls instead of blocking the event loop."""
+        ticket = _Ticket(model)
+        with self.condition:
+            self._enqueue(ticket)
+        try:
+            while True:
+                with self.condition:
+                    if self._may_run(ticket):
+                        self._start(ticket)
+                        break
+                await asyncio.sleep(POLL_INTERVAL)
+        except BaseException:
+            with self.condition:
+                self.waiting[model].remove(ticket)
+                self.condition.notify_all()
+            raise
+        try:
+            yield
+        finally:
+            self._finish(model)
+
+    def queue_depth(self):
+        with self.condition:
+            return {model: len(queue) for model, queue in self.waiting.items()}
+
+    def prometheus(self):
+        """Queue depth, running requests and wait times in Prometheus text format."""
+        with self.condition:
+            lines = ["# HELP ollama_scheduler_queue_depth Requests waiting in the scheduler",
+                     "# TYPE ollama_scheduler_queue_depth gauge"]
+            lines += [f'ollama_scheduler_queue_depth{{model="{model}"}} {len(queue)}'
+                      for model, queue in sorted(self.waiting.items())]
+            lines += ["# HELP ollama_scheduler_active Requests submitted to Ollama and not finished",
+                      "# TYPE ollama_scheduler_active gauge"]
+            lines += [f'ollama_scheduler_active{{model="{model}"}} {count}'
+                      for model, count in sorted(self.active.items())]
+            lines += self.wait_seconds.prometheus()
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counters,
+                        num_parallel=self.num_parallel,
+                        queue_depth={model: len(queue) for model, queue in self.waiting.items()},
+                        max_queue_depth=dict(self.max_depth),
+                        wait_s={priority: self.wait_seconds.summary(priority) for priority in self.wait_seconds.series})
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import threading
+from bootstrap import lazy_import
+from long_term_memory import session_tag
+
+np = lazy_import("numpy")     # Imported on the first lookup, not at agent startup
+
+# Semantic cache: answers near-duplicate queries ("what's a python class?" vs
+# "what is a class in Python") from earlier final responses, before the
+# classify -> process -> check pipeline runs.
+#
+# Query embeddings are unit-normalised float32 rows of one preallocated matrix,
+# so a lookup is a single matrix-vector product (cosine similarity) + argmax.
+# The saved index is only read on the first lookup, so it doesn't slow down startup.
+#
+# Entries belong to the session that produced them (session_tag, like the
+# long-term memory) and are only served back to that session, so one user's
+# answers never reach another's. Callers only look up and add queries asked
+# without earlier history: the embedding of a follow-up ("and in Python?")
+# says nothing about what it refers to.
+#
+# On disk (IA_assistant_history/semantic_cache/), append-only like the long-term memory:
+#   vectors-<generation>.f32     one float32 row per added entry, memory-mapped when loaded
+#   entries-<generation>.jsonl   the entry of every row (query, response, session, time)
+#   evicted-<generation>.i64     rows replaced by the LRU eviction (tombstones)
+#   meta.json                    generation, dimension and how much of each file is valid;
+#                                written after every add, anything past it (a crash) is cut off
+# Once the files hold COMPACT_FACTOR times max_entries rows, the live entries are
+# written to the next generation and meta.json switches to it.
+
+FOLDER_NAME = "IA_assistant_history"
+CACHE_FOLDER = os.path.join(FOLDER_NAME, "semantic_cache")
+
+EMBEDDING_MODEL = "nomic-embed-text"   # Local Ollama embedding model
+SIMILARITY_THRESHOLD = 0.92            # Cosine similarity needed to reuse an answer
+MAX_ENTRIES = 50_000                   # Bounded index; least recently used entries are replaced
+COMPACT_FACTOR = 2                     # Rows on disk (live + evicted) per entry before compacting
+DATA_FILES = ("vectors", "entries", "evicted")
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of (query embedding -> final response).
+    `embed(text)` must return a list/array of floats.
+    """
+
+    def __init__(self, embed, folder=CACHE_FOLDER, threshold=SIMILARITY_THRESHOLD, max_entries=MAX_ENTRIES):
+        self.embed = embed
+        self.folder = folder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        self.vectors = None          # (max_entries, dim) float32, allocated on first add
+        self.entries = []            # [{"query": ..., "response": ..., "session": tag}] aligned with the rows
+        self.sessions = None         # Session tag of every row
+        self.last_used = None
+        self.disk_rows = None        # Row of the data files every row was written to
+        self._meta = None            # Opened on first use
+        self._files = None           # Append handles of DATA_FILES
+
+        self.counters = {"hits": 0, "misses": 0, "evicted": 0, "compactions": 0}
+        self.lookup_seconds = 0.0
+
+    # ---------- persistence ----------
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _data_paths(self, generation):
+        suffixes = {"vectors": "f32", "entries": "jsonl", "evicted": "i64"}
+        return [self._path(f"{name}-{generation}.{suffixes[name]}") for name in DATA_FILES]
+
+    def _ensure_loaded(self):
+        """Open the files and read the saved index on first use (called with the lock held)."""
+        if self._meta is not None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        self.last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self.sessions = np.zeros(self.max_entries, dtype=np.int64)
+        self.disk_rows = np.zeros(self.max_entries, dtype=np.int64)
+        meta = {"generation": 0, "dim": None, "rows": 0, "entries_bytes": 0, "evicted": 0}
+        if os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json"), "r", encoding="utf-8") as file:
+                meta.update(json.load(file))
+        paths = self._data_paths(meta["generation"])
+        for name in os.listdir(self.folder):
+            # Other generations: leftovers of a compaction interrupted before or after its commit
+            if name.startswith(tuple(f"{prefix}-" for prefix in DATA_FILES)) and self._path(name) not in paths:
+                os.remove(self._path(name))
+        self._files = [open(path, "ab") for path in paths]
+        for file, size in zip(self._files, (meta["rows"] * (meta["dim"] or 0) * 4, meta["entries_bytes"],
+                                            meta["evicted"] * 8)):
+            file.truncate(size)
+        self._meta = meta
+        if meta["rows"]:
+            self._load(paths)
+
+    def _load(self, paths):
+        rows, dim = self._meta["rows"], self._meta["dim"]
+        evicted = set(np.fromfile(paths[2], dtype=np.int64, count=self._meta["evicted"]).tolist())
+        live = [row for row in range(rows) if row not in evicted][-self.max_entries:]
+        vectors = np.memmap(paths[0], dtype=np.float32, mode="r", shape=(rows, dim))
+        self.vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self.vectors[:len(live)] = vectors[live]
+        del vectors
+        with open(paths[1], "rb") as file:
+            lines = file.read(self._meta["entries_bytes"]).splitlines()
+        for slot, row in enumerate(live):
+            entry = json.loads(lines[row])
+            self.entries.append({"query": entry["query"], "response": entry["response"], "session": entry["session"]})
+            self.sessions[slot] = entry["session"]
+            self.last_used[slot] = entry["time"]
+            self.disk_rows[slot] = row
+
+    def _line(self, row):
+        entry = dict(self.entries[row], time=float(self.last_used[row]))
+        return json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def _append(self, row, evicted=None):
+        """Write row (and the tombstone of the disk row it replaced) and commit (lock held)."""
+        vectors, entries, tombstones = self._files
+        if evicted is not None:
+            tombstones.write(np.int64(evicted).tobytes())
+            self._meta["evicted"] += 1
+        line = self._line(row)
+        vectors.write(self.vectors[row].tobytes())
+        entries.write(line)
+        self.disk_rows[row] = self._meta["rows"]
+        self._meta["rows"] += 1
+        self._meta["entries_bytes"] += len(line)
+        self._commit()
+        if self._meta["rows"] >= COMPACT_FACTOR * self.max_entries:
+            self._compact()
+
+    def _commit(self):
+        """Flush the appends, then record how much of them is valid (the commit point)."""
+        for file in self._files:
+            file.flush()
+        temporary = self._path("meta.json.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(self._meta, file)
+        os.replace(temporary, self._path("meta.json"))
+
+    def _compact(self):
+        """Rewrite the live entries into the next generation of files, without the evicted rows."""
+        count = len(self.entries)
+        old_paths = self._data_paths(self._meta["generation"])
+        generation = self._meta["generation"] + 1
+        paths = self._data_paths(generation)
+        lines = b"".join(self._line(row) for row in range(count))
+        for path, data in zip(paths, (self.vectors[:count].tobytes(), lines, b"")):
+            with open(path, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+        for file in self._files:
+            file.close()
+        self._files = [open(path, "ab") for path in paths]
+        self.disk_rows[:count] = np.arange(count)
+        self._meta.update(generation=generation, rows=count, entries_bytes=len(lines), evicted=0)
+        self._commit()
+        for path in old_paths:
+            os.remove(path)
+        self.counters["compactions"] += 1
+
+    def save(self):
+        """Flush the pending appends (every add is already committed)."""
+        with self._lock:
+            if self._meta is not None:
+                self._commit()
+
+    # ---------- lookup / insert ----------
+
+    def vector(self, text):
+        """Unit-normalised embedding of text (what lookup() returns with a miss)."""
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, vector, tag=0):
+        """Return (row, similarity) of the nearest cached query of session tag, or (None, 0.0)."""
+        count = len(self.entries)
+        if not count:
+            return None, 0.0
+        scores = self.vectors[:count] @ vector
+        if self.sessions is not None:
+            scores = np.where(self.sessions[:count] == tag, scores, -np.inf)
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def lookup(self, query, session=None):
+        """
+        Return (response or None, query vector), from the entries of session.
+        The vector can be passed to add() so the query is only embedded once per turn.
+        """
+        vector = self.vector(query)
+        start = time.perf_counter()
+        with self._lock:
+            self._ensure_loaded()
+            row, similarity = self.search(vector, session_tag(session))
+            if row is not None and similarity >= self.threshold:
+                self.last_used[row] = time.time()
+                self.counters["hits"] += 1
+                response = self.entries[row]["response"]
+            else:
+                self.counters["misses"] += 1
+                response = None
+        self.lookup_seconds += time.perf_counter() - start
+        return response, vector
+
+    def add(self, query, response, vector=None, session=None):
+        if vector is None:
+            vector = self.vector(query)
+        with self._lock:
+            self._ensure_loaded()
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._meta["dim"] = int(vector.shape[0])
+            evicted = None
+            if len(self.entries) < self.max_entries:
+                row = len(self.entries)
+                self.entries.append(None)
+            else:
+                row = int(np.argmin(self.last_used))    # Replace the least recently used entry
+                evicted = int(self.disk_rows[row])
+                self.counters["evicted"] += 1
+            self.vectors[row] = vector
+            self.entries[row] = {"query": query, "response": response, "session": session_tag(session)}
+            self.sessions[row] = self.entries[row]["session"]
+            self.last_used[row] = time.time()
+            self._append(row, evicted)
+
+    def stats(self):
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return dict(self.counters,
+                    entries=len(self.entries),
+                    rows_on_disk=self._meta["rows"] if self._meta else 0,
+                    hit_ratio=self.counters["hits"] / lookups if lookups else 0.0,
+                    avg_lookup_ms=1000 * self.lookup_seconds / lookups if lookups else 0.0)
@@ -0,0 +1,247 @@
+import os
+import json
+import random
+import threading
+import contextlib
+import contextvars
+from ollama_client import get_model, add_observer
+from quality_gate import find_problems
+from prompts import system_prompt
+from tool_calling import tool, ToolExecutor, parse_tool_calls
+
+# Registry of specialist branches, and traffic shifting between their models.
+#
+# A config's [categories.<name>] tables describe one specialist each: what it
+# is for (the classifier sees the descriptions), its routing keywords, its
+# prompt and Ollama options, the tools it may call and its candidate models,
+# cheapest first. agent_builder turns the registry into one answer node per
+# category, reached through conditional edges from the classifier.
+#
+# Every answer is measured per (category, model): wall time, prompt and
+# generated tokens, and quality (no problems found by the quality gate, not
+# revised by the checker). Once every candidate has MIN_SAMPLES answers, a
+# category's traffic goes to the cheapest (fastest) candidate whose quality is
+# within QUALITY_TOLERANCE of the best one; EXPLORE_RATE of the traffic keeps
+# measuring the others. The stats are kept in STATS_PATH between runs.
+#
+#   [categories.sql]
+#   description = "SQL queries and database design"
+#   keywords = ["sql", "select", "join"]
+#   models = ["qwen2.5-coder:0.5b", "qwen2.5-coder:1.5b"]
+#   prompt = "You are an SQL expert..."
+
+FOLDER_NAME = "IA_assistant_history"
+STATS_PATH = os.path.join(FOLDER_NAME, "specialist_stats.json")
+
+MIN_SAMPLES = 5               # Answers per candidate before its stats are trusted
+EXPLORE_RATE = 0.1            # Share of traffic sent to a random candidate once warmed up
+QUALITY_TOLERANCE = 0.05      # "Equal quality": within this of the best candidate's quality
+
+_serving = contextvars.ContextVar("specialist_usage", default=None)
+
+
+# ---------- tools ----------
+
+@tool(pure=True)
+def multiply(a: float, b: float) -> float:
+    """Multiply two numbers."""
+    return a * b
+
+
+@tool(pure=True)
+def add(a: float, b: float) -> float:
+    """Add two numbers."""
+    return a + b
+
+
+@tool(pure=True)
+def subtract(a: float, b: float) -> float:
+    """Subtract b from a."""
+    return a - b
+
+
+@tool(pure=True)
+def divide(a: float, b: float) -> float:
+    """Divide a by b."""
+    return a / b
+
+
+@tool(pure=True)
+def power(a: float, b: float) -> float:
+    """Raise a to the power b."""
+    return a ** b
+
+
+TOOLS = {function.name: function for function in (multiply, add, subtract, divide, power)}
+
+
+# ---------- registry ----------
+
+class Specialist:
+    """One category: candidate models (cheapest first), prompt, keywords and tools."""
+
+    def __init__(self, name, table, settings):
+        self.name = name
+        self.description = table.get("description", name.replace("_", " "))
+        self.keywords = table.get("keywords", [])
+        self.prompt = system_prompt(table["prompt"]) if table.get("prompt") else None
+        self.models = [get_model(model, **settings) for model in table["models"]]
+        self.tools = ToolExecutor([TOOLS[name] for name in table["tools"]]) if table.get("tools") else None
+
+    def messages(self, history, question):
+        return ([self.prompt] if self.prompt else []) + list(history) + [question]
+
+    def call_tools(self, model, messages):
+        """(messages for the answer, answer or None): runs the tool calls of the model's first reply."""
+        message = model.chat(messages, tools=self.tools.specs())
+        calls = parse_tool_calls(message)
+        if not calls:
+            return messages, message.get("content", "")
+        return list(messages) + [message] + self.tools.run(calls), None
+
+    async def acall_tools(self, model, messages):
+        message = await model.achat(messages, tools=self.tools.specs())
+        calls = parse_tool_calls(message)
+        if not calls:
+            return messages, message.get("content", "")
+        return list(messages) + [message] + await self.tools.arun(calls), None
+
+
+class SpecialistRegistry:
+    """The [categories] of a config, in order; the last one (or the one marked default) is the fallback."""
+
+    def __init__(self, categories, defaults=None, model_settings=()):
+        self.specialists = {}
+        for name, table in categories.items():
+            settings = {key: value for key, value in (defaults or {}).items() if key in model_settings}
+            settings.update((key, value) for key, value in table.items() if key in model_settings)
+            self.specialists[name] = Specialist(name, table, settings)
+        marked = [name for name, table in categories.items() if table.get("default")]
+        self.default = marked[0] if marked else list(categories)[-1]
+
+    @property
+    def categories(self):
+        return tuple(self.specialists)
+
+    def __getitem__(self, category):
+        return self.specialists.get(category) or self.specialists[self.default]
+
+    def keywords(self):
+        return {name: specialist.keywords for name, specialist in self.specialists.items()}
+
+    def classifier_prompt(self):
+        """Classification prompt listing the categories and what each is for."""
+        lines = "\n".join(f"    - {name}: {specialist.description}" for name, specialist in self.specialists.items())
+        return system_prompt(f"""
+    You are a classifier. Reply with the category of the user's query:
+{lines}
+    If none fits, reply {self.default}.
+""")
+
+    def close(self):
+        for specialist in self.specialists.values():
+            if specialist.tools is not None:
+                specialist.tools.close()
+
+
+# ---------- traffic shifting ----------
+
+class TrafficShifter:
+    """Per (category, model) cost / latency / quality stats, and the candidate each answer should use."""
+
+    def __init__(self, path=STATS_PATH, min_samples=MIN_SAMPLES, explore_rate=EXPLORE_RATE,
+                 tolerance=QUALITY_TOLERANCE, seed=None):
+        self.path = path
+        self.min_samples = min_samples
+        self.explore_rate = explore_rate
+        self.tolerance = tolerance
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.records = {}      # "category|model" -> counters
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.records = json.load(file)
+        add_observer(self._observe)
+
+    @staticmethod
+    def _key(category, model):
+        return f"{category}|{model}"
+
+    def _record(self, category, model):
+        return self.records.setdefault(self._key(category, model), {
+            "answers": 0, "seconds": 0.0, "prompt_tokens": 0, "eval_tokens": 0, "problems": 0, "revised": 0})
+
+    def _observe(self, model, stats, seconds):
+        usage = _serving.get()
+        if usage is not None:
+            usage["prompt_tokens"] += stats.get("prompt_eval_count", 0)
+            usage["eval_tokens"] += stats.get("eval_count", 0)
+
+    def quality(self, record):
+        return 1.0 - (record["problems"] + record["revised"]) / record["answers"] if record["answers"] else 1.0
+
+    def choose(self, category, models):
+        """The candidate of models (cheapest first) the next answer of category should use."""
+        with self._lock:
+            records = [self.records.get(self._key(category, model.model)) for model in models]
+            answers = [record["answers"] if record else 0 for record in records]
+            if min(answers) < self.min_samples:
+                return models[answers.index(min(answers))]      # Warm-up: measure every candidate first
+            if len(models) > 1 and self.random.random() < self.explore_rate:
+                return self.random.choice(models)
+            best = max(self.quality(record) for record in records)
+            eligible = [index for index, record in enumerate(records) if self.quality(record) >= best - self.tolerance]
+            return models[min(eligible, key=lambda index: records[index]["seconds"] / records[index]["answers"])]
+
+    @contextlib.contextmanager
+    def measure(self, category, model):
+        """Count the tokens of the model calls made inside the block for (category, model)."""
+        usage = {"prompt_tokens": 0, "eval_tokens": 0}
+        token = _serving.set(usage)
+        try:
+            yield usage
+        finally:
+            _serving.reset(token)
+
+    def answered(self, category, model, usage, seconds, response):
+        with self._lock:
+            record = self._record(category, model)
+            record["answers"] += 1
+            record["seconds"] += seconds
+            record["prompt_tokens"] += usage["prompt_tokens"]
+            record["eval_tokens"] += usage["eval_tokens"]
+            record["problems"] += bool(find_problems(response))
+
+    def revised(self, category, model):
+        """The checker changed an answer of (category, model)."""
+        with self._lock:
+            self._record(category, model)["revised"] += 1
+
+    def stats(self):
+        """{category: {model: answers, traffic share, mean seconds, tokens per answer, quality}}."""
+        with self._lock:
+            totals = {}
+            for key, record in self.records.items():
+                totals[key.split("|", 1)[0]] = totals.get(key.split("|", 1)[0], 0) + record["answers"]
+            stats = {}
+            for key, record in sorted(self.records.items()):
+                category, model = key.split("|", 1)
+                answers = record["answers"] or 1
+                stats.setdefault(category, {})[model] = {
+                    "answers": record["answers"],
+                    "share": round(record["answers"] / (totals[category] or 1), 3),
+                    "mean_s": round(record["seconds"] / answers, 3),
+                    "tokens": round((record["prompt_tokens"] + record["eval_tokens"]) / answers, 1),
+                    "quality": round(self.quality(record), 3),
+                }
+            return stats
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            data = json.dumps(self.records, indent=1)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(self.path + ".tmp", self.path)
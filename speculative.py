@@ -0,0 +1,192 @@
+import time
+import asyncio
+import threading
+import contextvars
+from scheduler import prioritized
+from ollama_client import OllamaCancelled, cancellable, cancel_waiting
+
+# Speculative execution of the branch models while the classifier runs.
+#
+# The graph can't start process_query before classify_query has decided, but
+# there are only two branches. In speculative mode the branch generations start
+# together with the classifier (both of them, or only the one the cheap prior
+# favours), their tokens are buffered, and as soon as the category is known the
+# losing streams are cancelled: the HTTP stream is closed, which also stops the
+# generation on the Ollama server. The winner's buffer is replayed and the rest
+# streams live. If the prior guessed wrong, the right branch starts only then.
+# A losing branch still waiting for admission (residency manager, scheduler)
+# gives up there, before its request is sent: no prefill, no model load.
+#
+# Only worth it when the models fit in memory together: on a host that swaps
+# models the branches just wait for the classifier anyway.
+#
+# The branches run in the caller's context (trace turn and node, session,
+# scheduler priority), so their tokens count for the turn; the ones started
+# before the classifier decided queue at the "speculative" priority, below
+# real answers.
+
+BOTH = "both"          # Start every branch
+LIKELY = "likely"      # Start only the branch the prior favours
+
+
+class Speculator:
+    """Runs branch generations concurrently with classification and cancels the losers."""
+
+    def __init__(self, mode=BOTH):
+        if mode not in (BOTH, LIKELY):
+            raise ValueError(f"unknown speculation mode {mode!r}")
+        self.mode = mode
+        self._lock = threading.Lock()
+        # wasted_chunks: stream chunks the cancelled branches had produced (the tokens they cost
+        # are in the server's eval_count: a stream can carry several tokens per chunk)
+        self.counters = {"speculations": 0, "hits": 0, "misses": 0, "cancelled": 0,
+                         "wasted_chunks": 0, "wasted_seconds": 0.0, "head_start_seconds": 0.0}
+
+    def candidates(self, branches, prior):
+        """Branches to start right away; prior maps category -> probability (or None)."""
+        if self.mode == BOTH or not prior:
+            return list(branches)
+        return [max(branches, key=lambda category: prior.get(category, 0.0))]
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def _settle(self, category, started, classified_at, first_token_at):
+        self._count(speculations=1, hits=int(category in started), misses=int(category not in started))
+        if first_token_at is not None:
+            # Generation time that overlapped the classifier
+            self._count(head_start_seconds=max(0.0, classified_at - first_token_at))
+
+    # ---------- async ----------
+
+    async def arun(self, classify, branches, prior=None, on_token=None):
+        """
+        classify: coroutine function returning the category.
+        branches: {category: (model, messages)}; models need astream().
+        Returns (category, full text of the winning branch).
+        """
+        buffers = {category: [] for category in branches}
+        first_token = {}
+        winner = None
+
+        async def consume(category):
+            model, messages = branches[category]
+            async for chunk in model.astream(messages):
+                if category not in first_token:
+                    first_token[category] = time.perf_counter()
+                buffers[category].append(chunk)
+                if winner == category and on_token is not None:
+                    on_token(chunk)
+
+        start = time.perf_counter()
+        started = self.candidates(branches, prior)
+        speculate = prioritized("speculative", consume)    # Tasks copy the caller's context
+        tasks = {category: asyncio.create_task(speculate(category)) for category in started}
+        try:
+            winner = await classify()
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        classified_at = time.perf_counter()
+
+        for category, task in tasks.items():
+            if category != winner:
+                task.cancel()     # Closes the HTTP stream -> Ollama stops generating
+                self._count(cancelled=1, wasted_chunks=len(buffers[category]),
+                            wasted_seconds=classified_at - start)
+        if on_token is not None:
+            for chunk in buffers.get(winner, []):
+                on_token(chunk)   # Replay what the winner generated while classifying
+
+        if winner not in tasks:
+            tasks[winner] = asyncio.create_task(consume(winner))    # The prior guessed wrong
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        error = tasks[winner].exception()
+        if error is not None:
+            raise error
+        self._settle(winner, started, classified_at, first_token.get(winner))
+        return winner, "".join(buffers[winner])
+
+    # ---------- sync ----------
+
+    def run(self, classify, branches, prior=None, on_token=None):
+        """
+        Sync run(): branches stream in threads; a cancelled branch stops at its next chunk,
+        or before its request is sent if it is still waiting for admission.
+        """
+        buffers = {category: [] for category in branches}
+        first_token = {}
+        errors = {}
+        state = {"winner": None}
+        lock = threading.Lock()     # Orders buffer replay against live chunks of the winner
+        stops = {category: threading.Event() for category in branches}
+
+        def consume(category):
+            model, messages = branches[category]
+            with lock:
+                if state["winner"] not in (None, category):
+                    return      # Lost before the thread got going
+            try:
+                for chunk in model.stream(messages):
+                    with lock:
+                        winner = state["winner"]
+                        if winner is not None and winner != category:
+                            break     # Leaving the loop closes the stream and its connection
+                        first_token.setdefault(category, time.perf_counter())
+                        buffers[category].append(chunk)
+                        if winner == category and on_token is not None:
+                            on_token(chunk)
+            except OllamaCancelled:
+                pass            # Lost while waiting for admission: the request was never sent
+            except Exception as error:
+                errors[category] = error
+
+        def branch_thread(func, category):
+            # Threads start with an empty context: carry the turn, node, session and priority over
+            return threading.Thread(target=contextvars.copy_context().run, args=(func, category), daemon=True)
+
+        start = time.perf_counter()
+        started = self.candidates(branches, prior)
+        speculate = prioritized("speculative", consume)
+        threads = {category: branch_thread(cancellable(stops[category], speculate), category)
+                   for category in started}
+        for thread in threads.values():
+            thread.start()
+        try:
+            winner = classify()
+        except BaseException:
+            with lock:
+                state["winner"] = "\0failed"    # No branch wins: every one stops at its next chunk
+            for category in started:
+                cancel_waiting(stops[category])
+            raise
+        classified_at = time.perf_counter()
+        with lock:
+            state["winner"] = winner
+            if on_token is not None:
+                for chunk in buffers.get(winner, []):
+                    on_token(chunk)
+        for category in started:
+            if category != winner:
+                cancel_waiting(stops[category])     # Still queued for admission: give up there
+                self._count(cancelled=1, wasted_chunks=len(buffers[category]),
+                            wasted_seconds=classified_at - start)
+
+        if winner not in threads:
+            threads[winner] = branch_thread(consume, winner)     # At the node's own priority
+            threads[winner].start()
+        threads[winner].join()
+        if winner in errors:
+            raise errors[winner]
+        self._settle(winner, started, classified_at, first_token.get(winner))
+        return winner, "".join(buffers[winner])
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        runs = counters["speculations"]
+        counters["hit_ratio"] = counters["hits"] / runs if runs else 0.0
+        return counters
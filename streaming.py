@@ -0,0 +1,145 @@
+import time
+import asyncio
+import threading
+import contextvars
+from reasoning import strip_reasoning, visible_tokens
+
+# Streaming helpers for the classify -> process -> check graph.
+#
+# The nodes look for two callbacks in config["configurable"]:
+#   on_token(text)     - called for every token of the process_query draft
+#   on_revision(text)  - called when check_response changed the draft
+# When they are missing the nodes behave exactly as before (plain invoke).
+# A reasoning model's <think> block is neither streamed nor returned.
+
+
+class TurnTimer:
+    """Time-to-first-token and total latency of one turn."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def stop(self):
+        self.end = time.perf_counter()
+
+    def report(self):
+        return {
+            "ttft_s": None if self.first_token is None else round(self.first_token - self.start, 3),
+            "total_s": None if self.end is None else round(self.end - self.start, 3),
+        }
+
+
+def generate(model, messages, config=None):
+    """
+    Run a model inside a node: stream tokens to on_token when the graph is
+    being streamed, otherwise a normal invoke. Returns the full text.
+    """
+    on_token = ((config or {}).get("configurable") or {}).get("on_token")
+    if on_token is None:
+        return strip_reasoning(model.invoke(messages))
+
+    callback, parser = visible_tokens(on_token)
+    chunks = []
+    for chunk in model.stream(messages):
+        chunks.append(chunk)
+        callback(chunk)
+    parser.finish()
+    return strip_reasoning("".join(chunks))
+
+
+async def agenerate(model, messages, config=None):
+    """Async version of generate() for the async graph (ainvoke/astream)."""
+    on_token = ((config or {}).get("configurable") or {}).get("on_token")
+    if on_token is None:
+        return strip_reasoning(await model.ainvoke(messages))
+
+    callback, parser = visible_tokens(on_token)
+    chunks = []
+    async for chunk in model.astream(messages):
+        chunks.append(chunk)
+        callback(chunk)
+    parser.finish()
+    return strip_reasoning("".join(chunks))
+
+
+def report_revision(draft, checked, config=None):
+    """Tell the stream consumer that the checker changed an already shown draft."""
+    on_revision = ((config or {}).get("configurable") or {}).get("on_revision")
+    if on_revision is not None and " ".join(checked.split()) != " ".join(draft.split()):
+        on_revision(checked)
+
+
+def stream_turn(graph, state, prefix="\nAI Assistant Response: "):
+    """
+    Run one turn printing the draft token by token, then the checker's
+    revision (if any) clearly marked. Returns (final_state, timings).
+    """
+    timer = TurnTimer()
+
+    def on_token(text):
+        if timer.first_token is None:
+            print(prefix, end="", flush=True)
+        timer.token()
+        print(text, end="", flush=True)
+
+    def on_revision(text):
+        print(f"\n\n✏️ Revised by checker:\n{text}", flush=True)
+
+    final_state = graph.invoke(state, config={"configurable": {
+        "on_token": on_token,
+        "on_revision": on_revision,
+    }})
+    timer.stop()
+    if timer.first_token is None:
+        # Nothing was streamed (e.g. answered from a cache): show it in one piece
+        timer.first_token = timer.end
+        print(prefix + final_state["response"], end="")
+    print()
+    return final_state, timer.report()
+
+
+async def astream_turn(graph, state):
+    """
+    Async iterator over one turn. Yields ("token", text) while the draft is
+    generated, ("revision", text) if the checker changed it, and finally
+    ("done", {"state": final_state, "timings": {...}}).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    timer = TurnTimer()
+    finished = object()
+
+    def emit(kind, value):
+        loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+
+    def on_token(text):
+        timer.token()
+        emit("token", text)
+
+    def run():
+        try:
+            final_state = graph.invoke(state, config={"configurable": {
+                "on_token": on_token,
+                "on_revision": lambda text: emit("revision", text),
+            }})
+            emit(finished, final_state)
+        except BaseException as error:  # Re-raised in the consumer
+            emit(finished, error)
+
+    # Run in a copy of the caller's context, so the turn's trace / session tags reach the nodes
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+    while True:
+        kind, value = await queue.get()
+        if kind is finished:
+            if isinstance(value, BaseException):
+                raise value
+            timer.stop()
+            yield "done", {"state": value, "timings": timer.report()}
+            return
+        yield kind, value
@@ -0,0 +1,545 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Deterministic stand-in for a local Ollama server, for load tests and benchmarks.
+#
+# Implements the endpoints the agents use (/api/generate, /api/chat, /api/embed,
+# /api/embeddings, /api/tags, /api/ps) with a configurable token rate. Answers
+# are a function of the prompt, so repeated runs produce the same text.
+#
+# With max_loaded_models set, the stub also simulates model residency: a model
+# that is not loaded costs load_seconds before it answers (reported as
+# load_duration), loading evicts an idle model when memory is full, and
+# keep_alive is honoured like the real server.
+#
+# Prompt caching is simulated too: each model keeps NUM_PARALLEL cached prompts
+# and prompt_eval_count only counts what follows the longest cached prefix,
+# like Ollama's KV cache reuse (with prefill_tokens_per_second > 0 it also costs time).
+# With num_parallel set, each model runs that many requests at once and queues the rest.
+#
+# Chats that offer tools get native tool_calls back: one per offered tool the
+# user message writes as name(key=value, ...), and multiply(a, b) for every
+# "a*b". The turn after the tool results starts with the results.
+#
+# Reasoning models (names starting with deepseek-r1) open every answer with a
+# <think> block of think_tokens tokens, and explain their label after it.
+# options.num_predict cuts an answer short (done_reason "length").
+#
+# Classifier prompts are answered "code" when the user's message mentions
+# code (CODE_WORDS), "natural_language" otherwise; with label_explanation set,
+# plain models add an explanation that names the other label too, like a
+# chatty model. A `format` JSON schema with an enum (structured output) gets
+# exactly {"key": "<label>"} back (an enum label the query names, else as
+# above), without think block or explanation.
+#
+# For benchmarks and failure testing: tokens_per_second can differ per model,
+# chunk_tokens groups several tokens per streamed chunk, and error_rate /
+# disconnect_rate inject HTTP 500 answers and connections dropped halfway
+# through an answer (seeded, so a run can be repeated).
+#
+#   python stub_ollama.py [port] [--tokens-per-second 200] [--chunk-tokens 1] [--error-rate 0] ...
+
+DEFAULT_PORT = 11500
+TOKENS_PER_SECOND = 200.0     # Generation speed of the fake model (0 = instant)
+RESPONSE_TOKENS = 40          # Tokens in every answer
+EMBEDDING_DIM = 64
+NUM_PARALLEL = 4              # Cached prompts per model (Ollama's OLLAMA_NUM_PARALLEL slots)
+CHARS_PER_TOKEN = 4
+
+WORDS = ("the quick brown fox jumps over a lazy dog while the model writes "
+         "tokens at a steady pace for the benchmark").split()
+
+TOOL_CALL_TOKENS = 10        # Tokens counted per generated tool call
+CALL_PATTERN = re.compile(r"\b([A-Za-z_]\w*)\(([^()]*)\)")
+PRODUCT_PATTERN = re.compile(r"(\d+)\s*[*x×]\s*(\d+)")
+
+DEFAULT_KEEP_ALIVE = 300.0   # Seconds, like Ollama's "5m"
+
+REASONING_MODELS = ("deepseek-r1",)
+THINK_TOKENS = 200           # Tokens of a reasoning model's <think> block
+THINK_WORDS = ("the user asks about this so maybe it is code or natural language let me "
+               "think again about what the query really wants").split()
+EXPLANATION_TOKENS = 30      # Tokens a reasoning model writes after its label
+CODE_WORDS = ("code", "python", "function", "sql", "javascript", "bug", "script")
+
+
+class StubConfig:
+    def __init__(self, tokens_per_second=TOKENS_PER_SECOND, response_tokens=RESPONSE_TOKENS,
+                 max_loaded_models=None, load_seconds=1.0, prefill_tokens_per_second=0.0, num_parallel=None,
+                 think_tokens=THINK_TOKENS, label_explanation=0, chunk_tokens=1, error_rate=0.0,
+                 disconnect_rate=0.0, seed=None):
+        self.tokens_per_second = tokens_per_second   # Float, or {model: rate} ("*" for the rest)
+        self.response_tokens = response_tokens
+        self.think_tokens = think_tokens             # <think> block of reasoning models (0 = none)
+        self.label_explanation = label_explanation   # Tokens plain classifiers add after the label
+        self.prefill_tokens_per_second = prefill_tokens_per_second   # 0 = prompt evaluation is free
+        self.max_loaded_models = max_loaded_models   # None = unlimited memory, loads are free
+        self.load_seconds = load_seconds             # Float, or {model: seconds}
+        self.num_parallel = num_parallel             # Requests per model at once (None = no limit), rest queue
+        self.chunk_tokens = max(1, chunk_tokens)     # Tokens per streamed chunk
+        self.error_rate = error_rate                 # Share of requests answered with HTTP 500
+        self.disconnect_rate = disconnect_rate       # Share of requests whose connection drops mid-answer
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def load_cost(self, model):
+        if isinstance(self.load_seconds, dict):
+            return self.load_seconds.get(model, 1.0)
+        return self.load_seconds
+
+    def rate(self, model):
+        if isinstance(self.tokens_per_second, dict):
+            return self.tokens_per_second.get(model, self.tokens_per_second.get("*", TOKENS_PER_SECOND))
+        return self.tokens_per_second
+
+    def failure(self):
+        """None, "error" or "disconnect" for the next request."""
+        if not self.error_rate and not self.disconnect_rate:
+            return None
+        with self._lock:
+            draw = self.random.random()
+        if draw < self.error_rate:
+            return "error"
+        if draw < self.error_rate + self.disconnect_rate:
+            return "disconnect"
+        return None
+
+
+def parse_keep_alive(value):
+    """Ollama keep_alive ("5m", "30s", "1h", seconds, negative = forever) -> seconds."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    value = value.strip()
+    if value.startswith("-"):
+        return float("inf")
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1:] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+class ModelMemory:
+    """Which models are loaded on the fake server, and what loading them costs."""
+
+    def __init__(self, config):
+        self.config = config
+        self.loaded = {}        # model -> expiry time (monotonic), inf while in use
+        self.loading = set()
+        self.in_use = {}        # model -> requests running on it
+        self.condition = threading.Condition()
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.tokens_generated = 0   # Including tokens of streams the client hung up on
+        self.streams_cancelled = 0
+        self.failures = {"error": 0, "disconnect": 0}    # Injected
+        self._parallel = {}         # model -> semaphore of its OLLAMA_NUM_PARALLEL slots
+
+    def parallel_slot(self, model):
+        """Context manager taking one of the model's parallel slots (queues FIFO-ish when all are busy)."""
+        if self.config.num_parallel is None:
+            return contextlib.nullcontext()
+        with self.condition:
+            if model not in self._parallel:
+                self._parallel[model] = threading.Semaphore(self.config.num_parallel)
+            return self._parallel[model]
+
+    def _expire(self):
+        now = time.monotonic()
+        for model, expires in list(self.loaded.items()):
+            if expires <= now and not self.in_use.get(model):
+                del self.loaded[model]
+
+    def acquire(self, model):
+        """Block until the model is loaded for this request; returns the load time in seconds."""
+        if self.config.max_loaded_models is None:
+            return 0.0
+        with self.condition:
+            while True:
+                self._expire()
+                if model in self.loading:
+                    self.condition.wait()       # Another request is loading it
+                    continue
+                if model in self.loaded:
+                    self.in_use[model] = self.in_use.get(model, 0) + 1
+                    self.loaded[model] = float("inf")
+                    return 0.0
+                if len(self.loaded) + len(self.loading) < self.config.max_loaded_models:
+                    break
+                idle = [m for m in self.loaded if not self.in_use.get(m)]
+                if idle:
+                    del self.loaded[min(idle, key=self.loaded.get)]    # Evict the idle model expiring first
+                    break
+                self.condition.wait()           # Memory full of busy models
+            self.loading.add(model)
+
+        cost = self.config.load_cost(model)
+        time.sleep(cost)
+        with self.condition:
+            self.loading.discard(model)
+            self.loaded[model] = float("inf")
+            self.in_use[model] = self.in_use.get(model, 0) + 1
+            self.loads += 1
+            self.load_seconds += cost
+            self.condition.notify_all()
+        return cost
+
+    def release(self, model, keep_alive):
+        if self.config.max_loaded_models is None:
+            return
+        with self.condition:
+            self.in_use[model] -= 1
+            if not self.in_use[model]:
+                self.loaded[model] = time.monotonic() + parse_keep_alive(keep_alive)
+            self.condition.notify_all()
+
+    def running(self):
+        """{model: seconds until it is unloaded} for the loaded models."""
+        with self.condition:
+            self._expire()
+            now = time.monotonic()
+            return {model: expires - now for model, expires in self.loaded.items()}
+
+
+class PromptCache:
+    """Per-model KV cache slots: only the part of a prompt after the longest cached prefix is evaluated."""
+
+    def __init__(self, slots=NUM_PARALLEL):
+        self.slots = slots
+        self.cached = {}        # model -> [text], most recently used last
+        self.lock = threading.Lock()
+
+    def evaluate(self, model, text, answer):
+        """Tokens of text that must be evaluated; the slot then holds text + answer."""
+        with self.lock:
+            entries = self.cached.setdefault(model, [])
+            shared = [len(os.path.commonprefix([entry, text])) for entry in entries]
+            best = max(range(len(entries)), key=shared.__getitem__, default=None)
+            common = shared[best] if best is not None else 0
+            if best is not None and 2 * common >= len(entries[best]):
+                del entries[best]              # Mostly the same prompt: reuse this slot
+            elif len(entries) >= self.slots:
+                del entries[0]                 # Take the least recently used slot
+            entries.append(text + answer)
+        return max(1, -(-(len(text) - common) // CHARS_PER_TOKEN))
+
+    def clear(self, model):
+        with self.lock:
+            self.cached.pop(model, None)
+
+
+def render_prompt(request, chat):
+    """The text a chat template would produce, good enough to compare prefixes."""
+    if chat:
+        return "".join(f"<|{m.get('role')}|>{m.get('content', '')}" for m in request.get("messages", [])) + "<|assistant|>"
+    return f"<|system|>{request.get('system', '')}<|user|>{request.get('prompt', '')}<|assistant|>"
+
+
+def classifier_label(query):
+    return "code" if any(word in query.lower() for word in CODE_WORDS) else "natural_language"
+
+
+def schema_enum(schema):
+    """(key, labels) of a structured-output schema with one enum field, else None."""
+    if not isinstance(schema, dict):
+        return None
+    for key, field in (schema.get("properties") or {}).items():
+        if isinstance(field, dict) and field.get("enum"):
+            return key, field["enum"]
+    return None
+
+
+def answer_tokens(model, prompt, config, num_predict=None, query="", schema=None):
+    """Deterministic answer for a prompt: a label for classifier prompts, filler text otherwise."""
+    rng = random.Random(zlib.crc32(f"{model}\n{prompt}".encode("utf-8")))
+    enum = schema_enum(schema)
+    reasoning = model.startswith(REASONING_MODELS) and config.think_tokens and enum is None
+    tokens = []
+    if reasoning:
+        tokens = ["<think>"] + [rng.choice(THINK_WORDS) + " " for _ in range(config.think_tokens)] + ["</think>", "\n\n"]
+    if enum is not None:
+        key, labels = enum
+        named = [label for label in labels if label.replace("_", " ") in query.lower()]
+        label = named[0] if named else classifier_label(query)
+        tokens = ['{"', key, '":"', label if label in labels else labels[-1], '"}']
+    elif "classifier" in prompt.lower():
+        label = classifier_label(query)
+        tokens.append(label)
+        explanation = EXPLANATION_TOKENS if reasoning else config.label_explanation
+        if explanation:
+            other = "natural language" if label == "code" else "code"
+            tokens += [" because", " it", " is", " not", f" {other}"]
+            tokens += [" " + rng.choice(WORDS) for _ in range(max(0, explanation - 6))] + ["."]
+    else:
+        tokens += [rng.choice(WORDS) + " " for _ in range(config.response_tokens - 1)] + ["done."]
+    if num_predict is not None and num_predict >= 0:
+        tokens = tokens[:num_predict]
+    return tokens
+
+
+def tool_calls(request):
+    """Native tool calls for the last user message of a chat that offers tools."""
+    messages = request.get("messages") or []
+    if not request.get("tools") or not messages or messages[-1].get("role") != "user":
+        return []
+    offered = {tool.get("function", {}).get("name") for tool in request["tools"]}
+    text = str(messages[-1].get("content", ""))
+    calls = []
+    for name, arguments in CALL_PATTERN.findall(text):
+        if name in offered:
+            pairs = (part.split("=", 1) for part in arguments.split(",") if "=" in part)
+            calls.append({"function": {"name": name, "arguments": {key.strip(): value.strip() for key, value in pairs}}})
+    if "multiply" in offered:
+        for a, b in PRODUCT_PATTERN.findall(text):
+            calls.append({"function": {"name": "multiply", "arguments": {"a": int(a), "b": int(b)}}})
+    return calls
+
+
+def tool_results(messages):
+    """Contents of the tool messages at the end of a chat."""
+    results = []
+    for message in reversed(messages or []):
+        if message.get("role") != "tool":
+            break
+        results.insert(0, str(message.get("content", "")))
+    return results
+
+
+def embedding(text):
+    rng = random.Random(zlib.crc32(text.encode("utf-8")))
+    return [rng.uniform(-1, 1) for _ in range(EMBEDDING_DIM)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # Keep-alive, like the real server
+    config = StubConfig()
+    memory = ModelMemory(config)
+    prompt_cache = PromptCache()
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass    # The client closed its keep-alive connection (process exit, cancelled stream)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": []})
+        elif self.path == "/api/version":
+            self._send_json({"version": "stub"})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [
+                {"name": model, "model": model, "size": 0, "size_vram": 0,
+                 "expires_in_s": None if seconds == float("inf") else round(seconds, 3)}
+                for model, seconds in self.memory.running().items()
+            ]})
+        elif self.path == "/stub/stats":
+            self._send_json({"loads": self.memory.loads, "load_seconds": self.memory.load_seconds,
+                             "tokens_generated": self.memory.tokens_generated,
+                             "streams_cancelled": self.memory.streams_cancelled,
+                             "failures_injected": self.memory.failures})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path == "/api/embed":
+            inputs = request.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._send_json({"model": request.get("model"), "embeddings": [embedding(t) for t in inputs]})
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": embedding(request.get("prompt", ""))})
+        elif self.path in ("/api/generate", "/api/chat"):
+            self._generate(request, chat=self.path == "/api/chat")
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _generate(self, request, chat):
+        model = request.get("model", "")
+        if chat:
+            messages = request.get("messages", [])
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        else:
+            messages = None
+            prompt = f"{request.get('system', '')}\n{request.get('prompt', '')}"
+        # An empty prompt only loads the model, like the real server
+        load_only = not (messages if chat else request.get("prompt"))
+        calls = tool_calls(request) if chat else []
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if chat:
+            users = [str(m.get("content", "")) for m in messages if m.get("role") == "user"]
+            query = users[-1] if users else ""
+        else:
+            query = request.get("prompt", "")
+        tokens = [] if load_only or calls else answer_tokens(model, prompt, self.config, num_predict, query,
+                                                              request.get("format"))
+        truncated = num_predict is not None and 0 <= num_predict <= len(tokens) and not load_only
+        if chat and tool_results(messages):
+            tokens = [f"{result} " for result in tool_results(messages)] + tokens
+        rate = self.config.rate(model)
+        delay = 1.0 / rate if rate else 0.0
+        failure = None if load_only else self.config.failure()
+        if failure is not None:
+            with self.memory.condition:
+                self.memory.failures[failure] += 1
+            if failure == "error":
+                self._send_json({"error": "injected failure"}, 500)
+                return
+
+        start = time.perf_counter_ns()
+        load_seconds = self.memory.acquire(model)
+        try:
+            if load_seconds:
+                self.prompt_cache.clear(model)     # A freshly loaded model has an empty KV cache
+            with self.memory.parallel_slot(model):
+                prompt_tokens = 0 if load_only else self.prompt_cache.evaluate(model, render_prompt(request, chat), "".join(tokens))
+                prefill_seconds = 0.0
+                if self.config.prefill_tokens_per_second:
+                    prefill_seconds = prompt_tokens / self.config.prefill_tokens_per_second
+                    time.sleep(prefill_seconds)
+                self._answer(request, chat, model, prompt_tokens, prefill_seconds, tokens, delay, start, load_seconds,
+                             calls, truncated, disconnect=failure == "disconnect")
+        finally:
+            self.memory.release(model, request.get("keep_alive"))
+
+    def _answer(self, request, chat, model, prompt_tokens, prefill_seconds, tokens, delay, start, load_seconds,
+                calls=(), truncated=False, disconnect=False):
+        def chunk(text, done, with_calls=False):
+            payload = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+                if with_calls and calls:
+                    payload["message"]["tool_calls"] = calls
+            else:
+                payload["response"] = text
+            if done:
+                elapsed = time.perf_counter_ns() - start
+                load_ns = int(load_seconds * 1e9)
+                prefill_ns = int(prefill_seconds * 1e9)
+                payload.update({
+                    "done_reason": "load" if not tokens and not calls else "length" if truncated else "stop",
+                    "total_duration": elapsed,
+                    "load_duration": load_ns,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": prefill_ns,
+                    "eval_count": len(tokens) + TOOL_CALL_TOKENS * len(calls),
+                    "eval_duration": max(0, elapsed - load_ns - prefill_ns),
+                })
+            return payload
+
+        if not request.get("stream", True):
+            if disconnect:
+                time.sleep(delay * len(tokens) / 2)
+                self._count(len(tokens) // 2)
+                self.close_connection = True      # Hang up without an answer
+                return
+            time.sleep(delay * (len(tokens) + TOOL_CALL_TOKENS * len(calls)))
+            self._count(len(tokens) + TOOL_CALL_TOKENS * len(calls))
+            self._send_json(chunk("".join(tokens), True, with_calls=True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            if calls:
+                time.sleep(delay * TOOL_CALL_TOKENS * len(calls))
+                self._count(TOOL_CALL_TOKENS * len(calls))
+                self._write_chunk(chunk("", False, with_calls=True))    # Ollama sends the calls in one chunk
+            size = self.config.chunk_tokens
+            for index in range(0, len(tokens), size):
+                if disconnect and index >= len(tokens) // 2:
+                    self.close_connection = True  # Drop the stream halfway, without the final chunk
+                    return
+                group = tokens[index:index + size]
+                time.sleep(delay * len(group))
+                self._count(len(group))
+                self._write_chunk(chunk("".join(group), False))
+            self._write_chunk(chunk("", True))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self._count(0, cancelled=1)    # Client cancelled the stream: generation stops here
+
+    def _count(self, tokens, cancelled=0):
+        with self.memory.condition:
+            self.memory.tokens_generated += tokens
+            self.memory.streams_cancelled += cancelled
+
+
+def serve(port=DEFAULT_PORT, config=None, background=False):
+    """Start the stub server. With background=True it runs in a daemon thread and the server is returned."""
+    config = config or StubConfig()
+    handler = type("ConfiguredStubHandler", (StubHandler,),
+                   {"config": config, "memory": ModelMemory(config), "prompt_cache": PromptCache()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.memory = handler.memory
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"🧪 Stub Ollama listening on http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+def parse_rates(text):
+    """ "200" -> 200.0; "mistral:latest=100,*=300" -> {model: rate}."""
+    if "=" not in text:
+        return float(text)
+    return {model.strip(): float(rate) for model, rate in (part.rsplit("=", 1) for part in text.split(","))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deterministic stand-in for a local Ollama server")
+    parser.add_argument("port", type=int, nargs="?", default=DEFAULT_PORT)
+    parser.add_argument("--tokens-per-second", type=parse_rates, default=TOKENS_PER_SECOND,
+                        help='generation speed: a number, or per model like "phi:latest=300,*=150" (0 = instant)')
+    parser.add_argument("--response-tokens", type=int, default=RESPONSE_TOKENS)
+    parser.add_argument("--think-tokens", type=int, default=THINK_TOKENS, help="<think> block of deepseek-r1 models")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="tokens per streamed chunk")
+    parser.add_argument("--max-loaded-models", type=int, help="simulate model loading / eviction")
+    parser.add_argument("--load-seconds", type=float, default=1.0, help="cost of loading a model")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--num-parallel", type=int, help="requests per model at once")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="share of answers cut off halfway")
+    parser.add_argument("--seed", type=int, help="seed of the failure injection")
+    args = parser.parse_args(argv)
+    serve(args.port, StubConfig(
+        tokens_per_second=args.tokens_per_second, response_tokens=args.response_tokens,
+        max_loaded_models=args.max_loaded_models, load_seconds=args.load_seconds,
+        prefill_tokens_per_second=args.prefill_tokens_per_second, num_parallel=args.num_parallel,
+        think_tokens=args.think_tokens, chunk_tokens=args.chunk_tokens, error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import json
+import threading
+import chat_history_store
+from chat_history_store import ChatHistoryStore
+
+# Tests of the append-only chat history store, in a temporary folder: random
+# access, segment rollover, crash recovery, the legacy migration and concurrent appends.
+#
+#   python -m pytest -q test_chat_history_store.py
+
+
+def test_turns_read_back_across_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_history_store, "SEGMENT_SIZE", 3)
+    with ChatHistoryStore(folder=tmp_path) as store:
+        for n in range(8):
+            assert store.append({"user": f"q{n}"}) == n
+        assert store.get(4) == {"user": "q4"}
+        assert store[-1] == {"user": "q7"}
+        assert store.tail(2) == [{"user": "q6"}, {"user": "q7"}]
+    assert len(os.listdir(tmp_path / "chat_history")) == 6      # 3 segments, each with its index
+
+    with ChatHistoryStore(folder=tmp_path) as reopened:
+        assert len(reopened) == 8
+        assert [record["user"] for record in reopened] == [f"q{n}" for n in range(8)]
+        assert reopened.append({"user": "q8"}) == 8
+
+
+def test_torn_last_line_is_dropped_on_open(tmp_path):
+    with ChatHistoryStore(folder=tmp_path) as store:
+        for n in range(3):
+            store.append({"user": f"q{n}"})
+    data_path = tmp_path / "chat_history" / "segment-000000.jsonl"
+    with open(data_path, "ab") as data:
+        data.write(b'{"user": "half wri')            # A crash in the middle of an append
+
+    with ChatHistoryStore(folder=tmp_path) as store:
+        assert len(store) == 3
+        assert store.append({"user": "after"}) == 3
+        assert store.get(3) == {"user": "after"}
+        assert store.get(2) == {"user": "q2"}
+
+
+def test_missing_index_entries_are_rebuilt(tmp_path):
+    with ChatHistoryStore(folder=tmp_path) as store:
+        for n in range(4):
+            store.append({"user": f"q{n}"})
+    index_path = tmp_path / "chat_history" / "segment-000000.idx"
+    with open(index_path, "r+b") as index:
+        index.truncate(8)                           # Only the first offset reached the disk
+
+    with ChatHistoryStore(folder=tmp_path) as store:
+        assert len(store) == 4
+        assert store.get(3) == {"user": "q3"}
+
+
+def test_legacy_json_is_migrated_once(tmp_path):
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text(json.dumps([{"user": "old", "assistant": "turn"}, {"user": "q", "assistant": "a"}]))
+    with ChatHistoryStore(folder=tmp_path) as store:
+        assert list(store) == [{"user": "old", "assistant": "turn"}, {"user": "q", "assistant": "a"}]
+    assert not legacy.exists() and (tmp_path / "chat_history.json.migrated").exists()
+
+    with ChatHistoryStore(folder=tmp_path) as store:
+        assert len(store) == 2
+
+
+def test_interrupted_migration_resumes(tmp_path):
+    records = [{"user": f"q{n}"} for n in range(5)]
+    with ChatHistoryStore(folder=tmp_path) as store:     # A crash after two of the five turns were imported
+        store.append(records[0])
+        store.append(records[1])
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text(json.dumps(records))
+    (tmp_path / "chat_history" / "migrating").write_text(str(legacy))
+
+    with ChatHistoryStore(folder=tmp_path) as store:
+        assert list(store) == records
+    assert not (tmp_path / "chat_history" / "migrating").exists()
+
+
+def test_concurrent_appends_get_unique_turns_that_read_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_history_store, "SEGMENT_SIZE", 500)    # Threads also race across rollovers
+    store = ChatHistoryStore(folder=tmp_path)
+    threads, per_thread = 8, 400
+    numbers = [[] for _ in range(threads)]
+
+    def writer(t):
+        for i in range(per_thread):
+            numbers[t].append(store.append({"thread": t, "i": i}, sync=False))
+
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    turns = [n for thread_numbers in numbers for n in thread_numbers]
+    assert sorted(turns) == list(range(threads * per_thread))
+    for t, thread_numbers in enumerate(numbers):
+        assert [store.get(n) for n in thread_numbers] == [{"thread": t, "i": i} for i in range(per_thread)]
+    store.close()
+
+    reopened = ChatHistoryStore(folder=tmp_path)
+    assert len(reopened) == threads * per_thread
+    assert sum(1 for _ in reopened) == threads * per_thread
+    reopened.close()
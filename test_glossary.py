@@ -0,0 +1,71 @@
+import os
+from glossary import Automaton, Glossary, normalize_term
+
+# Tests of the glossary: Aho-Corasick matching on word boundaries, the SQLite
+# store with its cached automaton, reloads, and seeding only a new store.
+#
+#   python -m pytest -q test_glossary.py
+
+SEED = {"GAN": "Generative adversarial network.", "LLM": "Large language model.",
+        "machine learning": "Learning from data.", "C++": "A programming language."}
+
+
+def automaton(*terms):
+    return Automaton.build((term_id, normalize_term(term)) for term_id, term in enumerate(terms))
+
+
+def test_automaton_finds_overlapping_terms():
+    found = automaton("machine", "machine learning", "learning").find("machine learning")
+    assert found == [(0, 7, 0), (0, 16, 1), (8, 16, 2)]
+
+
+def test_matches_need_word_boundaries():
+    matcher = automaton("gan", "c++")
+    assert matcher.find("a gan began") == [(2, 5, 0)]
+    assert [term_id for _, _, term_id in matcher.find("c++ and c++11, not abc++")] == [1, 1]
+
+
+def test_find_is_case_and_whitespace_insensitive(tmp_path):
+    glossary = Glossary(str(tmp_path / "glossary.sqlite"), seed=SEED)
+    assert glossary.find("Is MACHINE   learning the same as an llm? Not a gan.") == [
+        ("machine learning", SEED["machine learning"]), ("LLM", SEED["LLM"]), ("GAN", SEED["GAN"])]
+    assert glossary.find("nothing to explain") == []
+    glossary.close()
+
+
+def test_automaton_is_cached_until_the_terms_change(tmp_path):
+    path = str(tmp_path / "glossary.sqlite")
+    glossary = Glossary(path, seed=SEED)
+    glossary.find("gan")
+    glossary.close()
+    assert os.path.exists(str(tmp_path / "glossary.automaton.npz"))
+
+    reopened = Glossary(path)
+    assert reopened.find("an LLM") == [("LLM", SEED["LLM"])]
+    assert (reopened.counters["cache_loads"], reopened.counters["builds"]) == (1, 0)
+    reopened.add("qubit", "The basic unit of quantum information.")
+    reopened.reload()
+    assert reopened.find("a qubit") == [("qubit", "The basic unit of quantum information.")]
+    assert reopened.counters["builds"] == 1
+    reopened.close()
+
+
+def test_updating_a_definition_needs_no_rebuild(tmp_path):
+    glossary = Glossary(str(tmp_path / "glossary.sqlite"), seed=SEED)
+    glossary.find("gan")
+    glossary.add("gan", "Two networks trained against each other.")
+    glossary.reload()
+    assert glossary.find("GAN") == [("gan", "Two networks trained against each other.")]
+    assert glossary.counters["builds"] == 1
+    glossary.close()
+
+
+def test_seed_fills_a_new_store_only(tmp_path):
+    path = str(tmp_path / "glossary.sqlite")
+    glossary = Glossary(path, seed=SEED)
+    assert glossary.remove("GAN") == 1
+    glossary.close()
+
+    reopened = Glossary(path, seed=SEED)      # Removed seed terms stay removed
+    assert reopened.find("a GAN and an LLM") == [("LLM", SEED["LLM"])]
+    reopened.close()
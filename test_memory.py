@@ -0,0 +1,98 @@
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from memory import ConversationMemory, estimate_tokens
+
+# Tests of the token-budgeted chat history: the sliding window, the pinned
+# block, summaries, and the budget holding for every way of editing the list.
+#
+#   python -m pytest -q test_memory.py
+
+BUDGET = 120
+
+
+def exchange(n, size=40):
+    return [HumanMessage(content=f"q{n} " + "x" * size), AIMessage(content=f"a{n} " + "y" * size)]
+
+
+def assert_consistent(history):
+    assert history.total_tokens == sum(estimate_tokens(message.content) for message in history)
+    assert history.total_tokens <= history.max_tokens
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, evicted, previous_summary):
+        self.calls.append([message.content[:2] for message in evicted])
+        return SystemMessage(content=f"summary {len(self.calls)}")
+
+
+def test_window_keeps_pinned_block_and_latest_exchange():
+    history = ConversationMemory(max_tokens=BUDGET)
+    history.append(SystemMessage(content="Be brief."))
+    for n in range(10):
+        history.extend(exchange(n))
+        assert_consistent(history)
+    assert history[0].content == "Be brief."
+    assert [message.content[:2] for message in history[1:3]] == ["q0", "a0"]     # First exchange is pinned
+    assert [message.content[:2] for message in history[-2:]] == ["q9", "a9"]
+    assert all(history[i].type == "human" for i in range(3, len(history), 2))    # Whole exchanges only
+
+
+def test_trim_to_leaves_room_for_the_next_turns():
+    history = ConversationMemory(max_tokens=BUDGET, trim_to=0.5)
+    for n in range(5):
+        history.extend(exchange(n))         # The fifth exchange goes over budget: down to half of it
+    trimmed = list(history)
+    assert history.total_tokens <= BUDGET // 2
+    for n in range(5, 7):
+        history.extend(exchange(n))
+    assert list(history[:len(trimmed)]) == trimmed      # Only appends: the cached prompt prefix survives
+    assert_consistent(history)
+
+
+def test_policy_folds_evicted_messages_into_one_summary():
+    summarize = FakeSummarizer()
+    history = ConversationMemory(max_tokens=BUDGET, policy=summarize)
+    for n in range(8):
+        history.extend(exchange(n))
+    summaries = [message for message in history if message.content.startswith("summary")]
+    assert len(summaries) == 1 and summaries[0].content == f"summary {len(summarize.calls)}"
+    assert_consistent(history)
+
+
+def test_iadd_insert_and_item_assignment_respect_the_budget():
+    history = ConversationMemory(max_tokens=BUDGET)
+    for n in range(6):
+        history += exchange(n)
+        assert_consistent(history)
+
+    history.insert(2, HumanMessage(content="z" * 200))
+    assert_consistent(history)
+    history[-1] = AIMessage(content="a5 " + "w" * 300)          # The latest exchange is never trimmed
+    assert history.total_tokens == sum(estimate_tokens(message.content) for message in history)
+    assert history[-1].content.startswith("a5")
+
+    history[-1:] = [AIMessage(content="short")]
+    assert_consistent(history)
+    history[2:2] = exchange(7) + exchange(8)
+    assert_consistent(history)
+
+
+def test_deletes_keep_the_count():
+    history = ConversationMemory(max_tokens=BUDGET)
+    for n in range(3):
+        history.extend(exchange(n, size=4))
+    del history[2:4]
+    history.pop()
+    history.remove(history[0])
+    assert_consistent(history)
+    history.clear()
+    assert history.total_tokens == 0 and len(history) == 0
+
+
+def test_prompt_building_still_sees_a_list():
+    history = ConversationMemory()
+    history.extend(exchange(0, size=4))
+    prompt = [SystemMessage(content="Be brief.")] + history + [HumanMessage(content="next")]
+    assert len(prompt) == 4 and isinstance(history, list)
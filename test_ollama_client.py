@@ -0,0 +1,154 @@
+import json
+import time
+import socket
+import asyncio
+import threading
+import urllib.request
+import pytest
+import stub_ollama
+from ollama_client import (OllamaTransport, AsyncOllamaTransport, OllamaError, OllamaConnectionError,
+                           get_model)
+
+# Tests of the pooled Ollama client against the stub server (stub_ollama.py),
+# started in this process on a free port: keep-alive reuse, retries before the
+# first byte only, cancelled streams dropping their connection, get_model dedup.
+#
+#   python -m pytest -q test_ollama_client.py
+
+MODEL = "phi:latest"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(port=0, **settings):
+    server = stub_ollama.serve(port, stub_ollama.StubConfig(**settings), background=True)
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def stub_stats(host):
+    with urllib.request.urlopen(f"{host}/stub/stats") as response:
+        return json.load(response)
+
+
+def generate(prompt, stream=False):
+    return {"model": MODEL, "prompt": prompt, "stream": stream}
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server, host = start_stub(tokens_per_second=0)
+    yield host
+    server.shutdown()
+
+
+def test_requests_reuse_one_keep_alive_connection(stub):
+    transport = OllamaTransport()
+    for n in range(3):
+        assert transport.request("POST", "/api/generate", generate(f"hello {n}"), host=stub)["done"]
+    stats = transport.stats()
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 2
+    assert stats["reuse_ratio"] == pytest.approx(2 / 3)
+    transport.close()
+
+
+def test_finished_streams_reuse_their_connection(stub):
+    transport = OllamaTransport()
+    for n in range(2):
+        chunks = list(transport.stream("POST", "/api/generate", generate(f"stream {n}", stream=True), host=stub))
+        assert chunks[-1]["done"]
+    assert transport.stats()["connections_opened"] == 1
+    transport.close()
+
+
+def test_async_requests_reuse_one_connection(stub):
+    async def run():
+        transport = AsyncOllamaTransport()
+        for n in range(3):
+            await transport.request("POST", "/api/generate", generate(f"async {n}"), host=stub)
+        return transport.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["connections_opened"], stats["connections_reused"]) == (1, 2)
+
+
+def test_connection_errors_are_retried_until_the_server_is_up():
+    port = free_port()
+    servers = []
+    timer = threading.Timer(0.3, lambda: servers.append(start_stub(port, tokens_per_second=0)[0]))
+    timer.start()
+    transport = OllamaTransport(retries=5)
+    try:
+        answer = transport.request("POST", "/api/generate", generate("are you up?"), host=f"127.0.0.1:{port}")
+    finally:
+        timer.join()
+        for server in servers:
+            server.shutdown()
+    assert answer["done"]
+    assert transport.stats()["retries"] >= 1
+    transport.close()
+
+
+def test_connection_errors_give_up_after_the_retries():
+    transport = OllamaTransport(retries=1)
+    with pytest.raises(OllamaConnectionError):
+        transport.request("POST", "/api/generate", generate("anyone?"), host=f"127.0.0.1:{free_port()}")
+    stats = transport.stats()
+    assert (stats["retries"], stats["errors"]) == (1, 1)
+
+
+def test_no_retry_once_the_server_answered():
+    server, host = start_stub(tokens_per_second=0, error_rate=1.0)
+    transport = OllamaTransport()
+    try:
+        with pytest.raises(OllamaError) as error:
+            transport.request("POST", "/api/generate", generate("fail"), host=host)
+        assert error.value.status == 500
+        assert transport.stats()["retries"] == 0
+        assert stub_stats(host)["failures_injected"]["error"] == 1
+    finally:
+        server.shutdown()
+    transport.close()
+
+
+def test_stream_cut_off_before_done_raises():
+    server, host = start_stub(tokens_per_second=0, disconnect_rate=1.0)
+    transport = OllamaTransport()
+    try:
+        with pytest.raises(OllamaConnectionError):
+            list(transport.stream("POST", "/api/generate", generate("cut", stream=True), host=host))
+        assert transport.stats()["retries"] == 0
+    finally:
+        server.shutdown()
+    transport.close()
+
+
+def test_cancelled_stream_drops_its_connection():
+    server, host = start_stub(tokens_per_second=200)
+    transport = OllamaTransport()
+    try:
+        stream = transport.stream("POST", "/api/generate", generate("long answer", stream=True), host=host)
+        assert not next(stream)["done"]
+        stream.close()
+        assert transport._idle.get(("127.0.0.1", server.server_address[1]), []) == []
+        transport.request("POST", "/api/generate", generate("next"), host=host)
+        assert transport.stats()["connections_opened"] == 2     # The cancelled one was not reused
+        deadline = time.monotonic() + 5
+        while stub_stats(host)["streams_cancelled"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert stub_stats(host)["streams_cancelled"] == 1      # The server stopped generating
+    finally:
+        server.shutdown()
+    transport.close()
+
+
+def test_get_model_returns_one_handle_per_model_and_settings():
+    handle = get_model("mistral:latest", temperature=0, num_ctx=4096)
+    assert get_model("mistral:latest", num_ctx=4096, temperature=0) is handle
+    assert get_model("mistral:latest", temperature=0.7, num_ctx=4096) is not handle
+    assert get_model("phi:latest", temperature=0, num_ctx=4096) is not handle
+    assert get_model("mistral:latest", temperature=0, num_ctx=4096, keep_alive="1h") is not handle
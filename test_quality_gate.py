@@ -0,0 +1,62 @@
+import pytest
+from quality_gate import QualityGate, find_problems
+
+# Tests of the local checks that decide whether a draft goes to the checker model.
+#
+#   python -m pytest -q test_quality_gate.py
+
+
+@pytest.mark.parametrize("response", [
+    "Paris is the capital of France.",
+    "Use **bold** for emphasis, like **this**",
+    "The docs are at https://example.com/docs/",
+    "```python\nprint('hi')\n```",
+    "Answer: 42",
+])
+def test_good_drafts_have_no_problems(response):
+    assert find_problems(response) == []
+
+
+@pytest.mark.parametrize("response, problem", [
+    ("", "empty"),
+    (" ", "empty"),
+    ("The main reason is the", "truncated"),
+    ("First, add the flour and", "truncated"),
+    ("The list is: apples, pears,", "truncated"),
+    ("Here is the code:\n```python\nprint(1)", "unbalanced_code_fence"),
+    ("```python\ndef f(:\n    pass\n```", "python_syntax_error"),
+])
+def test_bad_drafts_are_flagged(response, problem):
+    assert problem in find_problems(response)
+
+
+def test_long_drafts_are_flagged():
+    assert find_problems("word " * 100, max_chars=50) == ["too_long"]
+
+
+def test_gate_checks_problems_and_never_samples_at_zero_rate():
+    gate = QualityGate(sample_rate=0.0)
+    assert not gate.needs_check("A complete answer.")
+    assert gate.needs_check("An answer that stops with the")
+    assert gate.last_problems == ["truncated"]
+    metrics = gate.metrics()
+    assert (metrics["turns"], metrics["checker_calls"], metrics["checker_sampled"]) == (2, 1, 0)
+    assert metrics["problems"] == {"truncated": 1}
+
+
+def test_gate_samples_passing_drafts():
+    gate = QualityGate(sample_rate=1.0)
+    assert gate.needs_check("A complete answer.")
+    assert gate.last_problems == [] and gate.sampled == 1
+
+
+def test_prometheus_exports_the_counters():
+    gate = QualityGate(sample_rate=0.0)
+    gate.needs_check("")
+    with gate.timing():
+        pass
+    text = gate.prometheus()
+    assert "quality_gate_turns_total 1" in text
+    assert "quality_gate_checker_calls_total 1" in text
+    assert 'quality_gate_problems_total{problem="empty"} 1' in text
+    assert "# TYPE quality_gate_problems_total counter" in text
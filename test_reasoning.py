@@ -0,0 +1,78 @@
+from reasoning import ReasoningFilter, TokenSavings, find_label, strip_reasoning, stream_label
+
+# Tests of the reasoning-model post-processing: <think> blocks split across
+# chunks, stripping finished texts, and classification streams stopped at the label.
+#
+#   python -m pytest -q test_reasoning.py
+
+
+class FakeStreamingModel:
+    """stream() yields the given chunks and remembers whether it was closed early."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+
+    def stream(self, messages):
+        try:
+            for chunk in self.chunks:
+                self.sent += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+
+def feed_all(chunks):
+    """(parser, answer text the stream showed, plus what finish() flushed)."""
+    parser = ReasoningFilter()
+    shown = "".join(parser.feed(chunk) for chunk in chunks)
+    answer = parser.finish()
+    assert answer.startswith(shown)
+    return parser, answer
+
+
+def test_filter_handles_tags_split_across_chunks():
+    parser, answer = feed_all(["<th", "ink>let me ", "think</th", "ink>  The answer", " is 4."])
+    assert answer == "The answer is 4."
+    assert parser.thinking == "let me think"
+
+
+def test_filter_passes_text_without_reasoning_through():
+    parser, answer = feed_all(["Just ", "an answer"])
+    assert answer == "Just an answer"
+    assert parser.thinking == ""
+
+
+def test_unterminated_block_is_reasoning_only():
+    parser, answer = feed_all(["<think>still going", " and going"])
+    assert answer == ""
+    assert parser.thinking == "still going and going"
+
+
+def test_strip_reasoning_removes_blocks_and_counts_the_tokens():
+    savings = TokenSavings()
+    assert strip_reasoning("<think>a long chain of thought</think>\n\nParis.", savings) == "Paris."
+    assert savings.stats()["reasoning_tokens_stripped"] > 0
+    assert strip_reasoning("No reasoning here.", savings) == "No reasoning here."
+
+
+def test_find_label_takes_the_first_label_written():
+    assert find_label("It is natural language, not code") == "natural_language"
+    assert find_label("CODE. Definitely not natural-language") == "code"
+    assert find_label("Not sure yet") is None
+
+
+def test_stream_label_stops_the_stream_at_the_label():
+    model = FakeStreamingModel(["<think>hmm, code?</think>", "code", " because", " it asks", " for python"])
+    savings = TokenSavings()
+    assert stream_label(model, [], savings) == "code"
+    assert model.closed and model.sent == 2
+    assert savings.stats()["stopped_early"] == 1
+
+
+def test_stream_label_falls_back_to_the_reasoning_when_capped():
+    model = FakeStreamingModel(["<think>code? no, this is natural language", " after all"])
+    savings = TokenSavings()
+    assert stream_label(model, [], savings) == "natural_language"
+    assert savings.stats()["capped_before_label"] == 1
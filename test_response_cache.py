@@ -0,0 +1,105 @@
+import os
+import asyncio
+import response_cache
+from langchain_core.messages import HumanMessage, SystemMessage
+from response_cache import ResponseCache, CachedLLM, cache_key, normalize_messages
+
+# Tests of the response cache: key normalisation, memory / disk levels, TTL and
+# size eviction, and CachedLLM only caching deterministic requests.
+#
+#   python -m pytest -q test_response_cache.py
+
+
+class FakeLLM:
+    def __init__(self, temperature=0.0, model="phi:latest"):
+        self.model = model
+        self.temperature = temperature
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+    def stream(self, messages, **kwargs):
+        self.calls += 1
+        yield from ["answer ", str(self.calls)]
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages)
+
+
+def test_keys_ignore_surrounding_whitespace_and_line_endings_only():
+    key = lambda text: cache_key("phi", None, text, {"temperature": 0})
+    assert key("  hello\r\nworld \n") == key("hello\nworld")
+    assert key("def f():\n    return 1") != key("def f():\n  return 1")     # Indentation is meaning
+    assert key("a  b") != key("a b")
+
+
+def test_normalize_messages_accepts_strings_dicts_and_messages():
+    expected = [("system", "Be brief."), ("user", "Hi")]
+    assert normalize_messages([SystemMessage(content="Be brief. "), HumanMessage(content="Hi")]) == expected
+    assert normalize_messages([{"role": "system", "content": "Be brief."}, {"content": "Hi"}]) == expected
+    assert normalize_messages(" Hi ") == [("user", "Hi")]
+
+
+def test_disk_level_survives_a_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    assert not os.path.exists(path)        # Opened on first use
+    cache.put("k", "value")
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert reopened.get("k") == "value"
+    assert reopened.get("k") == "value"
+    assert (reopened.counters["disk_hits"], reopened.counters["memory_hits"]) == (1, 1)
+    assert reopened.get("missing") is None
+    reopened.close()
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=60)
+    cache.put("k", "value")
+    now[0] += 61
+    assert cache.get("k") is None
+    cache.close()
+
+
+def test_size_bound_evicts_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), memory_entries=0, max_bytes=350)
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 100)
+        now[0] += 1
+    assert cache.get("a") is not None      # "b" is now the least recently used
+    now[0] += 1
+    cache.put("d", "x" * 100)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+    assert cache.stats()["bytes_stored"] <= 350
+    cache.close()
+
+
+def test_cached_llm_answers_deterministic_requests_once(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    llm = FakeLLM(temperature=0.0)
+    model = CachedLLM(llm, cache)
+    assert model.invoke("What is 2 + 2?") == "answer 1"
+    assert model.invoke("What is 2 + 2?  ") == "answer 1"
+    assert "".join(model.stream("What is 2 + 2?")) == "answer 1"
+    assert asyncio.run(model.ainvoke("What is 2 + 2?")) == "answer 1"
+    assert llm.calls == 1 and model.model == "phi:latest"
+    cache.close()
+
+
+def test_cached_llm_bypasses_sampled_requests(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    llm = FakeLLM(temperature=0.7)
+    model = CachedLLM(llm, cache)
+    assert model.invoke("Tell me a story") == "answer 1"
+    assert model.invoke("Tell me a story") == "answer 2"
+    assert cache.counters["bypassed"] == 2
+    cache.close()
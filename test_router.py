@@ -0,0 +1,100 @@
+import json
+import asyncio
+import pytest
+from router import QueryRouter, CategoryRouter, NGramScorer, compile_keywords, normalize_label, train_from_log
+
+# Tests of the tiered query router: keywords, the trained n-gram scorer, the
+# classifier LLM fallback and the classifications it logs as training data.
+#
+#   python -m pytest -q test_router.py
+
+CODE_QUERIES = ["how do I reverse a linked list", "fix this segfault in my pointer code",
+                "what does this stack trace mean", "write a recursive fibonacci"]
+TEXT_QUERIES = ["tell me about the roman empire", "what is a good pasta recipe",
+                "who painted the mona lisa", "suggest a holiday in the mountains"]
+
+
+class FakeClassifier:
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        return self.answer
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)    # No trained weights from the repo's history folder
+
+
+def test_keywords_match_whole_words_including_symbols():
+    pattern = compile_keywords(["java", "javascript", "c++", "c#"])
+    assert pattern.search("Help with JavaScript promises").group(0) == "JavaScript"
+    assert pattern.search("a c++ template question")
+    assert pattern.search("my C# class")
+    assert not pattern.search("a cup of javanese coffee")
+
+
+def test_normalize_label():
+    assert normalize_label("  Natural Language.") == "natural_language"
+    assert normalize_label("CODE") == "code"
+    assert normalize_label("no idea") == "natural_language"
+
+
+def test_keyword_tier_skips_the_classifier(tmp_path):
+    classifier = FakeClassifier("natural_language")
+    router = QueryRouter(classifier, log_path=str(tmp_path / "log.jsonl"))
+    assert router.route("Write a python function") == "code"
+    assert router.last_tier == "keywords"
+    assert classifier.calls == []
+
+
+def test_classifier_fallback_is_logged(tmp_path):
+    log_path = tmp_path / "log.jsonl"
+    router = QueryRouter(FakeClassifier(" Natural language"), log_path=str(log_path))
+    assert router.route("tell me about rome") == "natural_language"
+    assert router.last_tier == "llm"
+    assert [json.loads(line) for line in log_path.read_text().splitlines()] == [
+        {"query": "tell me about rome", "category": "natural_language"}]
+
+
+def test_aroute_uses_the_async_classifier_and_logs(tmp_path):
+    log_path = tmp_path / "log.jsonl"
+
+    async def allm_classify(query):
+        return "code"
+
+    router = QueryRouter(FakeClassifier("natural_language"), log_path=str(log_path), allm_classify=allm_classify)
+    assert asyncio.run(router.aroute("what does this stack trace mean")) == "code"
+    assert json.loads(log_path.read_text())["category"] == "code"
+    assert router.stats()["llm"]["count"] == 1
+
+
+def test_trained_scorer_decides_without_the_classifier(tmp_path):
+    log_path = tmp_path / "log.jsonl"
+    with open(log_path, "w", encoding="utf-8") as file:
+        for _ in range(20):
+            for query in CODE_QUERIES:
+                file.write(json.dumps({"query": query, "category": "code"}) + "\n")
+            for query in TEXT_QUERIES:
+                file.write(json.dumps({"query": query, "category": "natural_language"}) + "\n")
+    scorer = train_from_log(str(log_path), str(tmp_path / "weights.bin"))
+    assert NGramScorer.load(str(tmp_path / "weights.bin")).probability(CODE_QUERIES[0]) == scorer.probability(
+        CODE_QUERIES[0])
+
+    classifier = FakeClassifier("code")
+    router = QueryRouter(classifier, threshold=0.8, scorer=scorer, log_path=None)
+    assert router.route("how do I reverse a linked list") == "code"
+    assert router.route("who painted the mona lisa") == "natural_language"
+    assert router.counters["scorer"] == 2 and classifier.calls == []
+
+
+def test_category_router_goes_to_the_classifier_on_ties():
+    classifier = FakeClassifier("math")
+    router = CategoryRouter(["math", "cooking"], {"math": ["integral"], "cooking": ["recipe"]}, classifier)
+    assert router.route("an integral of x") == "math"
+    assert router.route("a recipe for an integral") == "math"     # One hit each: the classifier decides
+    assert classifier.calls == ["a recipe for an integral"]
+    assert router.stats()["keywords"]["count"] == 1
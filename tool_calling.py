@@ -0,0 +1,250 @@
+import json
+import time
+import asyncio
+import inspect
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Native Ollama tool calling for the agents.
+#
+# The model gets the tool schemas in the "tools" field of /api/chat and answers
+# with message.tool_calls. The calls of one answer are independent, so they
+# run concurrently (thread pool, or asyncio for the async graph), their results
+# go back as "tool" messages and the model writes the final answer in a single
+# follow-up turn. Pure tools (same arguments -> same result, like multiply)
+# are memoised, and repeated calls inside one answer run once.
+#
+#   @tool(pure=True)
+#   def multiply(a: int, b: int) -> int:
+#       """Multiply two integers."""
+#       return a * b
+#
+#   executor = ToolExecutor([multiply])
+#   followup = executor.round(model, messages)   # None when the model called no tool
+#   followup, answer = executor.call(model, messages)   # Or keep the answer it gave instead
+
+TOOL_WORKERS = 8              # Tool calls running at the same time
+MEMO_ENTRIES = 1024           # Results kept per pure tool
+
+JSON_TYPES = {int: "integer", float: "number", str: "string", bool: "boolean", list: "array", dict: "object"}
+
+
+class Tool:
+    """A Python function the model can call; its signature and docstring become the schema."""
+
+    def __init__(self, func, pure=False):
+        self.func = func
+        self.name = func.__name__
+        self.description = inspect.cleandoc(func.__doc__ or self.name)
+        self.pure = pure
+        self.parameters = inspect.signature(func).parameters
+        self.is_async = inspect.iscoroutinefunction(func)
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "memo_hits": 0, "errors": 0}
+
+    def spec(self):
+        """Ollama / OpenAI function schema."""
+        properties = {name: {"type": JSON_TYPES.get(parameter.annotation, "string")}
+                      for name, parameter in self.parameters.items()}
+        required = [name for name, parameter in self.parameters.items() if parameter.default is parameter.empty]
+        return {"type": "function", "function": {
+            "name": self.name,
+            "description": self.description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        }}
+
+    def coerce(self, arguments):
+        """Arguments as the annotations want them (models often send numbers as strings)."""
+        coerced = {}
+        for name, value in (arguments or {}).items():
+            parameter = self.parameters.get(name)
+            if parameter is None:
+                continue    # Hallucinated argument
+            kind = parameter.annotation
+            if kind in (int, float) and isinstance(value, str):
+                value = kind(value.strip())
+            elif kind is bool and isinstance(value, str):
+                value = value.strip().lower() in ("true", "1", "yes")
+            coerced[name] = value
+        return coerced
+
+    def memo_key(self, arguments):
+        return json.dumps(arguments, sort_keys=True, default=str)
+
+    def cached(self, key):
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.counters["memo_hits"] += 1
+                return True, self._memo[key]
+        return False, None
+
+    def remember(self, key, result):
+        with self._lock:
+            self._memo[key] = result
+            while len(self._memo) > MEMO_ENTRIES:
+                self._memo.popitem(last=False)
+
+    def __call__(self, **arguments):
+        return self.func(**arguments)
+
+
+def tool(func=None, *, pure=False):
+    """Decorator: @tool or @tool(pure=True)."""
+    if func is None:
+        return lambda func: Tool(func, pure=pure)
+    return Tool(func, pure=pure)
+
+
+def parse_tool_calls(message):
+    """[(name, arguments)] from an assistant message's native tool_calls."""
+    calls = []
+    for call in message.get("tool_calls") or []:
+        function = call.get("function", {})
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                arguments = {}
+        calls.append((function.get("name"), arguments))
+    return calls
+
+
+class ToolExecutor:
+    """Runs the tool calls of a model answer, concurrently unless parallel=False."""
+
+    def __init__(self, tools, parallel=True, max_workers=TOOL_WORKERS):
+        self.tools = {tool.name: tool for tool in tools}
+        self.parallel = parallel
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool") if parallel else None
+        self.counters = {"rounds": 0, "calls": 0, "deduplicated": 0}
+        self.seconds = 0.0
+
+    def specs(self):
+        return [tool.spec() for tool in self.tools.values()]
+
+    def _plan(self, calls):
+        """[(tool, arguments, memo key)] of the distinct calls, plus each call's index in it."""
+        plan, index, order = [], {}, []
+        for name, arguments in calls:
+            tool = self.tools.get(name)
+            try:
+                arguments = tool.coerce(arguments) if tool is not None else arguments
+            except (TypeError, ValueError):
+                pass    # Reported by the call itself
+            key = (name, json.dumps(arguments, sort_keys=True, default=str))
+            if tool is None or not tool.pure or key not in index:
+                index[key] = len(plan)
+                plan.append((tool, name, arguments))
+            else:
+                self.counters["deduplicated"] += 1
+            order.append(index[key])
+        return plan, order
+
+    def _call(self, tool, name, arguments):
+        """Run one call; errors go back to the model as the result, like a real tool would report them."""
+        if tool is None:
+            return f"Error: there is no tool called {name!r}."
+        tool.counters["calls"] += 1
+        key = tool.memo_key(arguments) if tool.pure else None
+        if key is not None:
+            hit, result = tool.cached(key)
+            if hit:
+                return result
+        try:
+            result = tool(**arguments)
+            if tool.is_async:
+                result = asyncio.run(result)
+        except Exception as error:
+            tool.counters["errors"] += 1
+            return f"Error: {error}"
+        result = result if isinstance(result, str) else json.dumps(result, default=str)
+        if key is not None:
+            tool.remember(key, result)
+        return result
+
+    async def _acall(self, tool, name, arguments):
+        if tool is not None and tool.is_async:
+            tool.counters["calls"] += 1
+            key = tool.memo_key(arguments) if tool.pure else None
+            if key is not None:
+                hit, result = tool.cached(key)
+                if hit:
+                    return result
+            try:
+                result = await tool(**arguments)
+            except Exception as error:
+                tool.counters["errors"] += 1
+                return f"Error: {error}"
+            result = result if isinstance(result, str) else json.dumps(result, default=str)
+            if key is not None:
+                tool.remember(key, result)
+            return result
+        return await asyncio.to_thread(self._call, tool, name, arguments)
+
+    def _messages(self, plan, order, results):
+        return [{"role": "tool", "tool_name": plan[index][1], "content": results[index]} for index in order]
+
+    def run(self, calls):
+        """Tool messages with the results of [(name, arguments)], in call order."""
+        start = time.perf_counter()
+        plan, order = self._plan(calls)
+        if self._pool is not None and len(plan) > 1:
+            results = list(self._pool.map(lambda step: self._call(*step), plan))
+        else:
+            results = [self._call(*step) for step in plan]
+        self._account(calls, start)
+        return self._messages(plan, order, results)
+
+    async def arun(self, calls):
+        start = time.perf_counter()
+        plan, order = self._plan(calls)
+        if self.parallel:
+            results = await asyncio.gather(*(self._acall(*step) for step in plan))
+        else:
+            results = [await self._acall(*step) for step in plan]
+        self._account(calls, start)
+        return self._messages(plan, order, results)
+
+    def _account(self, calls, start):
+        self.counters["rounds"] += 1
+        self.counters["calls"] += len(calls)
+        self.seconds += time.perf_counter() - start
+
+    def round(self, model, messages):
+        """
+        Offer the tools to the model. If it calls any, run them and return the
+        messages for the follow-up turn (prompt + its tool calls + the results);
+        None when it answered without tools.
+        """
+        return self.call(model, messages)[0]
+
+    async def around(self, model, messages):
+        return (await self.acall(model, messages))[0]
+
+    def call(self, model, messages):
+        """(follow-up messages, None) when the model called tools, else (None, the answer it gave)."""
+        message = model.chat(messages, tools=self.specs())
+        calls = parse_tool_calls(message)
+        if not calls:
+            return None, message.get("content", "")
+        return list(messages) + [message] + self.run(calls), None
+
+    async def acall(self, model, messages):
+        message = await model.achat(messages, tools=self.specs())
+        calls = parse_tool_calls(message)
+        if not calls:
+            return None, message.get("content", "")
+        return list(messages) + [message] + await self.arun(calls), None
+
+    def stats(self):
+        return dict(self.counters,
+                    seconds=round(self.seconds, 3),
+                    tools={name: dict(tool.counters) for name, tool in self.tools.items()})
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
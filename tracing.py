@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+import functools
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from ollama_client import add_observer
+
+# Per-node and per-model instrumentation of the agent graph.
+#
+# Every graph node wrapped with tracer.node() and every Ollama chat call (through
+# the ollama_client observer hook) is recorded with its wall time; model calls
+# also keep what Ollama reports: prompt / eval token counts, prompt_eval, eval
+# and load durations, and tokens per second.
+#
+# Two outputs:
+#   - Prometheus text (tracer.prometheus()): per-node and per-model histograms
+#   - a JSON trace per turn (tracer.turn()), appended to traces.jsonl by a
+#     background writer so a turn ending on the event loop never waits on the disk
+#
+# AGENT_TRACING=0 turns it off: node() returns the function itself and no
+# observer is registered, so a disabled tracer costs nothing per call.
+
+FOLDER_NAME = "IA_assistant_history"
+TRACE_PATH = os.path.join(FOLDER_NAME, "traces.jsonl")
+TRACING = os.environ.get("AGENT_TRACING", "1") != "0"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320)
+
+_turn = contextvars.ContextVar("trace_turn", default=None)
+_node = contextvars.ContextVar("trace_node", default=None)
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per label value."""
+
+    def __init__(self, name, label, buckets, help_text=""):
+        self.name = name
+        self.label = label
+        self.buckets = buckets
+        self.help_text = help_text
+        self.series = {}      # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, label_value, value):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def summary(self, label_value):
+        series = self.series.get(label_value)
+        if series is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": sum(series[:-1]), "sum": series[-1]}
+
+    def prometheus(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, series in sorted(self.series.items()):
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Tracer:
+    """Records node and model spans into histograms and per-turn JSON traces."""
+
+    def __init__(self, enabled=TRACING, path=TRACE_PATH):
+        self.enabled = enabled
+        self.path = path
+        self.last_trace = None
+        self._lock = threading.Lock()
+
+        self.node_seconds = Histogram("agent_node_seconds", "node", SECONDS_BUCKETS,
+                                      "Wall time of each graph node")
+        self.turn_seconds = Histogram("agent_turn_seconds", "agent", SECONDS_BUCKETS,
+                                      "Wall time of a whole turn")
+        self.model_seconds = Histogram("ollama_request_seconds", "model", SECONDS_BUCKETS,
+                                       "Wall time of a chat request, seen by the client")
+        self.load_seconds = Histogram("ollama_load_seconds", "model", SECONDS_BUCKETS,
+                                      "Model load time reported by Ollama")
+        self.prompt_eval_seconds = Histogram("ollama_prompt_eval_seconds", "model", SECONDS_BUCKETS,
+                                             "Prompt evaluation time reported by Ollama")
+        self.eval_seconds = Histogram("ollama_eval_seconds", "model", SECONDS_BUCKETS,
+                                      "Generation time reported by Ollama")
+        self.tokens_per_second = Histogram("ollama_eval_tokens_per_second", "model", TOKENS_PER_SECOND_BUCKETS,
+                                           "Generation speed reported by Ollama")
+        self.prompt_tokens = {}
+        self.eval_tokens = {}
+
+        self._writer = None
+        if enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tracer")  # Keeps the file order
+            add_observer(self._on_model_call)
+
+    # ---------- recording ----------
+
+    def node(self, name, func):
+        """Wrap a graph node (sync or async) so its wall time is recorded under name."""
+        if not self.enabled:
+            return func
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def traced(*args, **kwargs):
+                token = _node.set(name)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self._record_node(name, start)
+                    _node.reset(token)
+        else:
+            @functools.wraps(func)
+            def traced(*args, **kwargs):
+                token = _node.set(name)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record_node(name, start)
+                    _node.reset(token)
+        return traced
+
+    def _record_node(self, name, start):
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.node_seconds.observe(name, seconds)
+        trace = _turn.get()
+        if trace is not None:
+            trace["spans"].append({"node": name, "start_s": round(start - trace["start"], 6),
+                                   "seconds": round(seconds, 6)})
+
+    def _on_model_call(self, model, stats, seconds):
+        load = stats.get("load_duration", 0) / 1e9
+        prompt_eval = stats.get("prompt_eval_duration", 0) / 1e9
+        evaluation = stats.get("eval_duration", 0) / 1e9
+        prompt_tokens = stats.get("prompt_eval_count", 0)
+        eval_tokens = stats.get("eval_count", 0)
+        speed = eval_tokens / evaluation if evaluation else 0.0
+
+        with self._lock:
+            self.model_seconds.observe(model, seconds)
+            self.load_seconds.observe(model, load)
+            self.prompt_eval_seconds.observe(model, prompt_eval)
+            self.eval_seconds.observe(model, evaluation)
+            if speed:
+                self.tokens_per_second.observe(model, speed)
+            self.prompt_tokens[model] = self.prompt_tokens.get(model, 0) + prompt_tokens
+            self.eval_tokens[model] = self.eval_tokens.get(model, 0) + eval_tokens
+
+        trace = _turn.get()
+        if trace is not None:
+            trace["spans"].append({
+                "model": model,
+                "node": _node.get(),
+                "start_s": round(time.perf_counter() - seconds - trace["start"], 6),
+                "seconds": round(seconds, 6),
+                "load_s": round(load, 6),
+                "prompt_tokens": prompt_tokens,
+                "prompt_eval_s": round(prompt_eval, 6),
+                "eval_tokens": eval_tokens,
+                "eval_s": round(evaluation, 6),
+                "tokens_per_s": round(speed, 2),
+            })
+
+    @contextlib.contextmanager
+    def turn(self, agent="agent", **attributes):
+        """Collect the spans of one turn; the trace is saved when the block ends."""
+        if not self.enabled:
+            yield None
+            return
+        trace = {"time": time.time(), "start": time.perf_counter(), "agent": agent, **attributes, "spans": []}
+        token = _turn.set(trace)
+        try:
+            yield trace
+        finally:
+            _turn.reset(token)
+            trace["seconds"] = round(time.perf_counter() - trace.pop("start"), 6)
+            trace["spans"].sort(key=lambda span: span["start_s"])
+            with self._lock:
+                self.turn_seconds.observe(agent, trace["seconds"])
+            self._writer.submit(self._write, json.dumps(trace, ensure_ascii=False) + "\n")
+            self.last_trace = trace
+
+    def _write(self, line):
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as error:
+            print(f"⚠️ Trace not saved: {error}")
+
+    def flush(self):
+        """Wait until the traces of finished turns are on disk."""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+
+    # ---------- reporting ----------
+
+    def breakdown(self, trace=None):
+        """One line saying where the seconds of a turn went."""
+        trace = trace or self.last_trace
+        if not trace:
+            return ""
+        parts = []
+        for span in trace["spans"]:
+            if "model" not in span:
+                details = []
+                for call in trace["spans"]:
+                    if "model" in call and call["node"] == span["node"]:
+                        load = f"load {call['load_s']:.2f}s, " if call["load_s"] >= 0.01 else ""
+                        details.append(f"{call['model']}: {load}prompt {call['prompt_tokens']} tok, "
+                                       f"{call['eval_tokens']} tok @ {call['tokens_per_s']:.0f} tok/s")
+                parts.append(f"{span['node']} {span['seconds']:.2f}s" + (f" ({'; '.join(details)})" if details else ""))
+            elif span["node"] is None:
+                parts.append(f"{span['model']} {span['seconds']:.2f}s")
+        return f"turn {trace['seconds']:.2f}s: " + " · ".join(parts)
+
+    def prometheus(self):
+        """Metrics in Prometheus text format."""
+        with self._lock:
+            lines = []
+            for histogram in (self.turn_seconds, self.node_seconds, self.model_seconds, self.load_seconds,
+                              self.prompt_eval_seconds, self.eval_seconds, self.tokens_per_second):
+                lines += histogram.prometheus()
+            lines.append("# TYPE ollama_prompt_tokens_total counter")
+            for model, count in sorted(self.prompt_tokens.items()):
+                lines.append(f'ollama_prompt_tokens_total{{model="{model}"}} {count}')
+            lines.append("# TYPE ollama_eval_tokens_total counter")
+            for model, count in sorted(self.eval_tokens.items()):
+                lines.append(f'ollama_eval_tokens_total{{model="{model}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def stats(self):
+        """Total seconds and calls per node and per model."""
+        with self._lock:
+            return {
+                "nodes": {node: self.node_seconds.summary(node) for node in self.node_seconds.series},
+                "models": {model: dict(self.model_seconds.summary(model),
+                                       load_s=self.load_seconds.summary(model)["sum"],
+                                       prompt_tokens=self.prompt_tokens.get(model, 0),
+                                       eval_tokens=self.eval_tokens.get(model, 0))
+                           for model in self.model_seconds.series},
+            }
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Process-wide tracer (enabled unless AGENT_TRACING=0)."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
@@ -0,0 +1,28 @@
+import os
+
+# Pictures of the agent graphs. An optional extra: it needs the graphviz Python
+# package (pip install graphviz) and the Graphviz binaries, and nothing imports
+# it unless a picture is asked for (e.g. python ollama_agent2.py --draw graph.png).
+
+
+def draw_graph(graph, path="state_graph.png"):
+    """Render a compiled LangGraph graph; the image format comes from the file extension."""
+    try:
+        from graphviz import Digraph
+    except ImportError:
+        raise SystemExit("❌ Drawing the graph needs graphviz: pip install graphviz")
+    drawable = graph.get_graph()
+    dot = Digraph()
+    for node_id in drawable.nodes:
+        dot.node(node_id, node_id.strip("_").replace("_", " ").capitalize())
+    for edge in drawable.edges:
+        dot.edge(edge.source, edge.target, style="dashed" if edge.conditional else "solid")
+    base, extension = os.path.splitext(path)
+    dot.render(base, format=extension.lstrip(".") or "png", cleanup=True)
+    return path
+
+
+def show(path):
+    """Display an image inside Jupyter (IPython is only imported here)."""
+    from IPython.display import Image, display
+    display(Image(filename=path))